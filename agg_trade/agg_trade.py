@@ -1,29 +1,56 @@
 import datetime
 import logging
 from apscheduler.schedulers.background import BlockingScheduler
-import pandas as pd
 from pytz import utc
-from binance.client import Client
 from settings import settings
 from dataclasses import dataclass
 from psycopg2._psycopg import cursor as cursor_type
 from binance.error import ServerError
-from db_back import connect_db
+from db_back import connect_pool
+from clients import ClientRegistry
+from db_writer import BatchWriter
+from metrics import configure_logging, metrics, serve_metrics
+from pipeline import Pipeline, Stage
+from rate_limit import AGG_TRADES_WEIGHT, Priority, WeightScheduler
+from rollups import Rollups
+from trade_cursor import AggTradeCursor
+from trade_stats import side_totals
+import numpy as np
+from functools import partial
 from datetime import timezone
 
 scheduler = BlockingScheduler(timezone=utc)
 
+# buy_recent_qty / sell_recent_qty are left empty, every row's trades are already summed in buy_sum / sell_sum
+AGG_COLUMNS = ('time', 'pair', 'buy_sum', 'sell_sum', 'buy_recent_count', 'sell_recent_count')
+
 logger = logging.getLogger("agg_trade")
 
+rollups = Rollups(AGG_COLUMNS, settings.agg_rollup_levels)
+
+clients = ClientRegistry(
+    settings.binance_api_key,
+    settings.binance_api_secret,
+    pool_connections=settings.binance_pool_connections,
+    pool_maxsize=settings.binance_pool_maxsize,
+)
+# Lowest priority of the Binance collectors, missed trades are fetched on the next run
+weight_scheduler = WeightScheduler(
+    limit=settings.binance_weight_limit,
+    reserve=settings.binance_weight_reserve,
+    burst=settings.binance_weight_burst,
+    headroom=settings.binance_weight_headroom,
+    retries=settings.binance_retries,
+    backoff=settings.binance_backoff,
+)
+
 
 @dataclass
 class Agg:
-    time: int
+    time: datetime.datetime
     pair: str
     buy_sum: float
     sell_sum: float
-    buy_recent_qty: float
-    sell_recent_qty: float
     buy_recent_count: int
     sell_recent_count: int
 
@@ -31,70 +58,55 @@ class Agg:
 
 
 def agg_main(db_connection) -> None:
-    for pair in settings.pairs_depth:
-        try:
-            data = load_agg_trade(pair)
-        except ServerError:
-            logger.warning(f"Binance server error for {pair=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading data")
-            continue
-        try:
-            recent_trades = load_recent_trades(pair)
-        except ServerError:
-            logger.warning(f"Binance server error for {pair=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading recent trades")
-            continue
-        try:
-            agg_data = parse_agg_trade(data, recent_trades, pair)
-        except Exception as e:
-            logger.exception(f"Error occurred at processing  {pair=}")
-            continue
-        try:
-            if agg_data:
-                agg_data.db_id = save_to_db(db_connection, agg_data)
-        except Exception as e:
-            logger.exception(f"Error occurred at saving {agg_data=} to DB")
-
-
-def load_agg_trade(pair: str) -> dict:
-    client = Client(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    trades = client.get_aggregate_trades(symbol=pair)
-    return trades
-
-
-def load_recent_trades(pair: str) -> dict:
-    client = Client(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    recent_trades = client.get_historical_trades(symbol=pair, limit=1000)
-    return recent_trades
-
-
-def parse_agg_trade(trades: dict, recent_trades: dict, pair: str) -> Agg | None:
-    time = datetime.datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-    df_trades = pd.DataFrame(trades)
-    df_trades['T'] = pd.to_datetime(df_trades['T'], unit='ms')
-    df_trades['q'] = df_trades['q'].astype(float)
-    agg_df = df_trades.groupby('m')['q'].sum().round(2)
-    sell = agg_df.loc[True]
-    buy = agg_df.loc[False]
-    df_recent = pd.DataFrame(recent_trades)
-    df_recent['time'] = pd.to_datetime(df_recent['time'], unit='ms')
-    df_recent[['price', 'qty']] = df_recent[['price', 'qty']].astype(float)
-    df_recent['time'] = df_recent['time'].dt.floor('15s')
-    tmp_recent = df_recent.groupby(['time', 'isBuyerMaker']).agg({'id': 'count', 'qty': 'sum'})
-    all_categories = tmp_recent.index.get_level_values(0)
-    all_subcategories = [True, False]
-    full_index = pd.MultiIndex.from_product([all_categories, all_subcategories], names=['time', 'isBuyerMaker'])
-    rsl_recent = tmp_recent.reindex(full_index, fill_value=0)[:2]
-    buy_recent_qty = rsl_recent.iloc[1, 1].round(3).astype(float)
-    sell_recent_qty = rsl_recent.iloc[0, 1].round(3).astype(float)
-    buy_recent_count = int(rsl_recent.iloc[1, 0])
-    sell_recent_count = int(rsl_recent.iloc[0, 0])
-    signal_kwargs = dict(time=time, pair=pair, buy_sum=buy, sell_sum=sell, buy_recent_qty=buy_recent_qty,
-                         sell_recent_qty=sell_recent_qty, buy_recent_count=buy_recent_count,
+    with (
+        metrics.run('agg_trade'),
+        BatchWriter(db_connection, 'agg_trade', AGG_COLUMNS, flush_size=settings.db_flush_size,
+                    flush_interval=settings.db_flush_interval, on_flush=rollups.apply,
+                    on_timing=metrics.recorder('agg_trade', 'flush')) as writer,
+    ):
+        stages = [
+            Stage('fetch', lambda pair, _: load_agg_trade(pair), workers=settings.fetch_workers, on_error=_fetch_error),
+            Stage('parse', lambda pair, trades: parse_agg_trade(trades, pair), workers=settings.compute_workers),
+            # A single writer for the one connection
+            Stage('persist', lambda pair, agg_data: writer.add(agg_values(agg_data),
+                                                               on_saved=partial(setattr, agg_data, 'db_id'))),
+        ]
+        Pipeline('agg_trade', stages, queue_size=settings.pipeline_queue_size,
+                 timer=partial(metrics.stage, 'agg_trade')).run(settings.pairs_depth)
+
+    logger.info(f"Binance connections: {clients.stats()}")
+
+
+def _fetch_error(pair: str, error: Exception) -> None:
+    if isinstance(error, ServerError):
+        logger.warning(f"Binance server error for {pair=}")
+    else:
+        logger.error(f"Error occurred at loading data for {pair=}", exc_info=error)
+
+
+def load_agg_trade(pair: str) -> list:
+    """Aggregate trades since the previous call for ``pair``, the last ``agg_window_seconds`` on the first one."""
+    since = int(datetime.datetime.now(timezone.utc).timestamp() * 1000) - settings.agg_window_seconds * 1000
+    return trade_cursor.fetch(pair, since)
+
+
+def load_agg_page(pair: str, from_id: int | None, limit: int) -> list:
+    kwargs = {} if from_id is None else {'fromId': from_id}
+    response = weight_scheduler.request(AGG_TRADES_WEIGHT, Priority.LOW, clients.spot().agg_trades, pair, limit=limit,
+                                        **kwargs)
+    return response['data']
+
+
+trade_cursor = AggTradeCursor(load_agg_page, limit=settings.agg_page_limit, max_pages=settings.agg_max_pages)
+
+
+def parse_agg_trade(trades: list, pair: str) -> Agg | None:
+    """Taker buy / sell volume and trade counts of ``trades``, the window since the previous run."""
+    time = datetime.datetime.now(timezone.utc)
+    buy_qty, sell_qty, buy_recent_count, sell_recent_count = side_totals(trades)
+    sell = float(np.round(sell_qty, 2))
+    buy = float(np.round(buy_qty, 2))
+    signal_kwargs = dict(time=time, pair=pair, buy_sum=buy, sell_sum=sell, buy_recent_count=buy_recent_count,
                          sell_recent_count=sell_recent_count)
     data = Agg(**signal_kwargs)
 
@@ -103,26 +115,33 @@ def parse_agg_trade(trades: dict, recent_trades: dict, pair: str) -> Agg | None:
 
 def save_to_db(db_connection, data: Agg) -> int:
     query = """
-    INSERT INTO agg_trade (time, pair, buy_sum, sell_sum, buy_recent_qty, sell_recent_qty, buy_recent_count, 
-    sell_recent_count)
-    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+    INSERT INTO agg_trade (time, pair, buy_sum, sell_sum, buy_recent_count, sell_recent_count)
+    VALUES (%s, %s, %s, %s, %s, %s)
     RETURNING id;
     """
 
-    values = (data.time, data.pair, data.buy_sum, data.sell_sum, data.buy_recent_qty, data.sell_recent_qty,
-              data.buy_recent_count, data.sell_recent_count)
-
     with db_connection.cursor() as cursor:  # type: cursor_type
-        cursor.execute(query, values)
+        cursor.execute(query, agg_values(data))
         db_connection.commit()
         row = cursor.fetchone()
 
         return row[0]
 
 
-with connect_db() as db_connection:
-    job_h = scheduler.add_job(agg_main, 'cron', hour='*', minute='*', second='*/15', args=[db_connection], max_instances=3)
-    scheduler.start()
+def agg_values(data: Agg) -> tuple:
+    return data.time, data.pair, data.buy_sum, data.sell_sum, data.buy_recent_count, data.sell_recent_count
+
+
+if __name__ == '__main__':
+    configure_logging(settings.log_level, settings.log_format)
+    if settings.metrics_port:
+        serve_metrics(metrics, settings.metrics_host, settings.metrics_port)
+
+    with connect_pool() as pool:
+        with pool.connection() as db_connection:
+            rollups.create_tables(db_connection)
+        job_h = scheduler.add_job(pool.job(agg_main), 'cron', hour='*', minute='*', second='*/15', max_instances=3)
+        scheduler.start()
 
 
 
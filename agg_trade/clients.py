@@ -0,0 +1,80 @@
+import threading
+
+import requests
+from binance.client import Client
+from binance.spot import Spot
+from requests.adapters import HTTPAdapter
+
+__all__ = ["ClientRegistry", "mount_pool", "connection_stats"]
+
+
+def mount_pool(session: requests.Session, pool_connections: int, pool_maxsize: int) -> requests.Session:
+    """Replace the default adapters of ``session`` with a keep-alive pool of the given size."""
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+
+    return session
+
+
+def connection_stats(session: requests.Session) -> dict[str, int]:
+    """Count TCP/TLS connections opened by ``session`` and requests sent over them."""
+    opened = sent = 0
+    for adapter in {id(adapter): adapter for adapter in session.adapters.values()}.values():
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            opened += pool.num_connections
+            sent += pool.num_requests
+
+    return {"opened": opened, "requests": sent, "reused": max(sent - opened, 0)}
+
+
+class ClientRegistry:
+    """Process-wide Binance clients sharing keep-alive HTTP connections.
+
+    Both clients are created lazily on first use and then reused by every
+    caller, so steady-state requests go over already open connections
+    instead of doing a TLS handshake per pair.
+    """
+
+    def __init__(self, api_key: str, api_secret: str, pool_connections: int = 4, pool_maxsize: int = 10) -> None:
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._spot: Spot | None = None
+        self._client: Client | None = None
+        self._lock = threading.Lock()
+
+    def spot(self) -> Spot:
+        """binance-connector client, responses are wrapped as ``{"limit_usage": ..., "data": ...}``."""
+        with self._lock:
+            if self._spot is None:
+                spot = Spot(api_key=self.api_key, api_secret=self.api_secret, show_limit_usage=True)
+                mount_pool(spot.session, self.pool_connections, self.pool_maxsize)
+                self._spot = spot
+
+            return self._spot
+
+    def client(self) -> Client:
+        """python-binance client."""
+        with self._lock:
+            if self._client is None:
+                client = Client(api_key=self.api_key, api_secret=self.api_secret)
+                mount_pool(client.session, self.pool_connections, self.pool_maxsize)
+                self._client = client
+
+            return self._client
+
+    def stats(self) -> dict[str, int]:
+        total = {"opened": 0, "requests": 0, "reused": 0}
+        for client in (self._spot, self._client):
+            if client is None:
+                continue
+            for key, value in connection_stats(client.session).items():
+                total[key] += value
+
+        return total
@@ -0,0 +1,113 @@
+import logging
+import time
+from typing import Callable, Sequence
+
+from psycopg2._psycopg import connection, cursor as cursor_type
+from psycopg2.extras import execute_values
+
+__all__ = ["BatchWriter"]
+
+logger = logging.getLogger("db_writer")
+
+
+class BatchWriter:
+    """Collects rows for one table and inserts them with one multi-row INSERT per flush.
+
+    A flush happens when ``flush_size`` rows are pending, when ``flush_interval``
+    seconds passed since the previous one, or when the writer is closed. If the
+    batch fails, every row is retried in its own transaction, so one bad row
+    only loses itself. ``on_flush(cursor, rows, ids)`` runs in the insert's
+    transaction, to keep derived tables exactly in step with the inserted rows.
+    ``on_timing(seconds, rows, ok)`` gets the duration of every flush, ``ok`` is
+    False when the batch had to be retried row by row.
+    """
+
+    def __init__(
+        self,
+        db_connection: connection,
+        table: str,
+        columns: Sequence[str],
+        flush_size: int = 100,
+        flush_interval: float = 5.0,
+        returning: str | None = "id",
+        on_flush: Callable[[cursor_type, list[tuple], list[int | None]], None] | None = None,
+        on_timing: Callable[[float, int, bool], None] | None = None,
+    ) -> None:
+        self.db_connection = db_connection
+        self.table = table
+        self.columns = list(columns)
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.returning = returning
+        self.on_flush = on_flush
+        self.on_timing = on_timing
+        self._pending: list[tuple[tuple, Callable[[int], None] | None]] = []
+        self._flushed_at = time.monotonic()
+
+        returning_sql = f" RETURNING {returning}" if returning else ""
+        self._batch_query = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES %s{returning_sql}"
+        placeholders = ", ".join(["%s"] * len(self.columns))
+        self._row_query = f"INSERT INTO {table} ({', '.join(self.columns)}) VALUES ({placeholders}){returning_sql}"
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def add(self, values: tuple, on_saved: Callable[[int], None] | None = None) -> None:
+        """Queue a row, ``on_saved`` gets the returned id once the row is in the database."""
+        self._pending.append((values, on_saved))
+
+        if len(self._pending) >= self.flush_size or time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> list[int | None]:
+        """Write pending rows, returns their ids in order (None for rows that failed)."""
+        rows, self._pending = self._pending, []
+        self._flushed_at = time.monotonic()
+        if not rows:
+            return []
+
+        started = time.perf_counter()
+        ok = True
+        try:
+            ids = self._insert_batch([values for values, _ in rows])
+        except Exception:
+            ok = False
+            self.db_connection.rollback()
+            logger.exception(f"Batch insert of {len(rows)} rows into {self.table} failed, retrying row by row")
+            ids = [self._insert_row(values) for values, _ in rows]
+        if self.on_timing:
+            self.on_timing(time.perf_counter() - started, len(rows), ok)
+
+        for (values, on_saved), db_id in zip(rows, ids):
+            if on_saved and db_id is not None:
+                on_saved(db_id)
+
+        return ids
+
+    def _insert_batch(self, rows: list[tuple]) -> list[int | None]:
+        with self.db_connection.cursor() as cursor:  # type: cursor_type
+            result = execute_values(cursor, self._batch_query, rows, page_size=len(rows), fetch=bool(self.returning))
+            ids = [row[0] for row in result] if self.returning else [None] * len(rows)
+            if self.on_flush:
+                self.on_flush(cursor, rows, ids)
+        self.db_connection.commit()
+
+        return ids
+
+    def _insert_row(self, values: tuple) -> int | None:
+        try:
+            with self.db_connection.cursor() as cursor:  # type: cursor_type
+                cursor.execute(self._row_query, values)
+                row = cursor.fetchone() if self.returning else None
+                if self.on_flush:
+                    self.on_flush(cursor, [values], [row[0] if row else None])
+            self.db_connection.commit()
+        except Exception:
+            self.db_connection.rollback()
+            logger.exception(f"Error occurred at saving {values=} to {self.table}")
+            return None
+
+        return row[0] if row else None
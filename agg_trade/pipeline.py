@@ -0,0 +1,120 @@
+import logging
+import queue
+import threading
+from contextlib import nullcontext
+from dataclasses import dataclass
+from typing import Any, Callable, ContextManager, Hashable, Iterable, Mapping, Sequence
+
+__all__ = ["Pipeline", "Stage"]
+
+logger = logging.getLogger("pipeline")
+
+# Sent once per worker of a stage after its last item
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    """One step of a ``Pipeline``.
+
+    ``func(key, value)`` returns the value for the next stage, None ends the item
+    there. An exception is passed to ``on_error(key, error)``, or logged without
+    it, and drops only that item.
+    """
+
+    name: str
+    func: Callable[[Hashable, Any], Any]
+    workers: int = 1
+    on_error: Callable[[Hashable, Exception], None] | None = None
+
+
+class Pipeline:
+    """Runs items through ``stages``, every stage with its own worker threads.
+
+    Stages are connected by queues of ``queue_size`` items. A full queue blocks the
+    stage in front of it, so a slow database write or Telegram call holds up only
+    the items behind it and fetching stays at most ``queue_size`` items ahead. A
+    run takes about as long as its slowest stage instead of the sum of all of them.
+    Stages that must not run concurrently, like writes over one connection, keep
+    one worker. ``timer(stage, key)`` wraps every call, e.g. ``partial(metrics.stage, job)``.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        stages: Sequence[Stage],
+        queue_size: int = 100,
+        timer: Callable[[str, str], ContextManager] | None = None,
+    ) -> None:
+        self.name = name
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.timer = timer
+
+    def run(self, keys: Iterable[Hashable], values: Mapping | None = None) -> dict:
+        """Push every key through the stages, the first stage gets ``values[key]`` or None without ``values``.
+
+        Returns the last stage's value per key, for the items that passed every stage.
+        """
+        queues = [queue.Queue(maxsize=self.queue_size) for _ in self.stages]
+        running = [stage.workers for stage in self.stages]
+        lock = threading.Lock()
+        results = {}
+        threads = [
+            threading.Thread(target=self._work, args=(index, queues, running, lock, results),
+                             name=f"{self.name}-{stage.name}-{number}", daemon=True)
+            for index, stage in enumerate(self.stages)
+            for number in range(stage.workers)
+        ]
+        for thread in threads:
+            thread.start()
+
+        try:
+            for key in keys:
+                queues[0].put((key, values[key] if values is not None else None))
+        finally:
+            for _ in range(self.stages[0].workers):
+                queues[0].put(_DONE)
+            for thread in threads:
+                thread.join()
+
+        return results
+
+    def _work(self, index: int, queues: list[queue.Queue], running: list[int], lock: threading.Lock,
+              results: dict) -> None:
+        stage = self.stages[index]
+        inbox = queues[index]
+        outbox = queues[index + 1] if index + 1 < len(queues) else None
+        try:
+            while (item := inbox.get()) is not _DONE:
+                key, value = item
+                value = self._call(stage, key, value)
+                if value is None:
+                    continue
+                if outbox is None:
+                    results[key] = value
+                else:
+                    outbox.put((key, value))
+        finally:
+            with lock:
+                running[index] -= 1
+                last = running[index] == 0
+            # The next stage ends after every item of this one
+            if last and outbox is not None:
+                for _ in range(self.stages[index + 1].workers):
+                    outbox.put(_DONE)
+
+    def _call(self, stage: Stage, key: Hashable, value: Any) -> Any:
+        try:
+            with self.timer(stage.name, str(key)) if self.timer else nullcontext():
+                return stage.func(key, value)
+        except Exception as e:
+            if stage.on_error is None:
+                logger.exception(f"Error occurred at {stage.name} of {key} in {self.name}")
+                return None
+            try:
+                stage.on_error(key, e)
+            except Exception:
+                logger.exception(f"Error handler of {stage.name} failed for {key} in {self.name}")
+
+            return None
@@ -0,0 +1,106 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from typing import Sequence
+
+from psycopg2._psycopg import connection, cursor as cursor_type
+from psycopg2.extras import execute_values
+
+__all__ = ["ROLLUP_LEVELS", "ROLLUP_COLUMNS", "Rollups", "rollup_table"]
+
+logger = logging.getLogger("rollups")
+
+# Level name and bucket width in seconds
+ROLLUP_LEVELS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+# Summed agg_trade columns
+ROLLUP_COLUMNS = ("buy_sum", "sell_sum", "buy_recent_count", "sell_recent_count")
+
+
+def rollup_table(level: str) -> str:
+    return f"agg_trade_{level}"
+
+
+def _bucket(time: datetime, width: int) -> datetime:
+    seconds = int(time.timestamp())
+    return datetime.fromtimestamp(seconds - seconds % width, timezone.utc)
+
+
+class Rollups:
+    """Keeps ``agg_trade_<level>`` tables of per-bucket sums of the collector's rows.
+
+    ``apply`` is a ``BatchWriter`` ``on_flush`` hook: the rows of a flush are summed
+    per (pair, bucket) and added to the stored buckets in the insert's transaction, so
+    a rollup never misses or double-counts a row. ``rows`` counts the collector samples
+    in a bucket and ``last_id`` is the newest ``agg_trade`` id folded in, readers use it
+    to tell whether a bucket changed.
+    """
+
+    def __init__(self, columns: Sequence[str], levels: Sequence[str] = tuple(ROLLUP_LEVELS)) -> None:
+        unknown = set(levels) - set(ROLLUP_LEVELS)
+        if unknown:
+            raise ValueError(f"Unknown rollup levels {sorted(unknown)}, expected some of {list(ROLLUP_LEVELS)}")
+
+        self.levels = list(levels)
+        self._time = columns.index("time")
+        self._pair = columns.index("pair")
+        self._values = [columns.index(column) for column in ROLLUP_COLUMNS]
+        summed = ", ".join(f"{column} = rollup.{column} + excluded.{column}" for column in ROLLUP_COLUMNS)
+        self._upserts = {
+            level: f"""
+            INSERT INTO {rollup_table(level)} AS rollup (pair, time, rows, {', '.join(ROLLUP_COLUMNS)}, last_id)
+            VALUES %s
+            ON CONFLICT (pair, time) DO UPDATE SET rows = rollup.rows + excluded.rows, {summed},
+                last_id = greatest(rollup.last_id, excluded.last_id)
+            """
+            for level in self.levels
+        }
+
+    def create_tables(self, db_connection: connection) -> None:
+        """Create missing rollup tables and fill new ones from the rows already in ``agg_trade``."""
+        sums = ", ".join(f"sum({column})" for column in ROLLUP_COLUMNS)
+        with db_connection.cursor() as cursor:  # type: cursor_type
+            missing = []
+            for level in self.levels:
+                cursor.execute("SELECT to_regclass(%s)", (rollup_table(level),))
+                if cursor.fetchone()[0] is None:
+                    missing.append(level)
+            if missing:
+                # No rows are inserted while the new tables are filled from agg_trade
+                cursor.execute("LOCK TABLE agg_trade IN SHARE MODE")
+
+            for level in missing:
+                table = rollup_table(level)
+                cursor.execute(f"""
+                CREATE TABLE IF NOT EXISTS {table} (
+                    pair              VARCHAR(16) NOT NULL,
+                    time              TIMESTAMPTZ NOT NULL,
+                    rows              INTEGER     NOT NULL,
+                    buy_sum           FLOAT,
+                    sell_sum          FLOAT,
+                    buy_recent_count  BIGINT,
+                    sell_recent_count BIGINT,
+                    last_id           BIGINT      NOT NULL,
+                    PRIMARY KEY (pair, time)
+                )""")
+                cursor.execute(f"""
+                INSERT INTO {table} (pair, time, rows, {', '.join(ROLLUP_COLUMNS)}, last_id)
+                SELECT pair, to_timestamp(floor(extract(epoch FROM time) / %s) * %s), count(*), {sums}, max(id)
+                FROM agg_trade
+                GROUP BY 1, 2""", (ROLLUP_LEVELS[level], ROLLUP_LEVELS[level]))
+                logger.info(f"Created {table} with {cursor.rowcount} buckets")
+        db_connection.commit()
+
+    def apply(self, cursor: cursor_type, rows: list[tuple], ids: list[int | None]) -> None:
+        for level in self.levels:
+            width = ROLLUP_LEVELS[level]
+            buckets: dict[tuple[str, datetime], list] = defaultdict(lambda: [0, *[0] * len(self._values), 0])
+            for row, db_id in zip(rows, ids):
+                bucket = buckets[row[self._pair], _bucket(row[self._time], width)]
+                bucket[0] += 1
+                for position, index in enumerate(self._values, start=1):
+                    bucket[position] += row[index] or 0
+                bucket[-1] = max(bucket[-1], db_id or 0)
+
+            # Sorted, so concurrent flushes lock the shared buckets in the same order
+            execute_values(cursor, self._upserts[level], [(pair, time, *bucket)
+                                                          for (pair, time), bucket in sorted(buckets.items())])
@@ -54,8 +54,37 @@ class Settings(BaseSettings):
 
     log_level: str = "INFO"
     log_format: LogFormatEnum = LogFormatEnum.json
+    # Stage timings on http://<metrics_host>:<metrics_port>/metrics, not served without a port
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int | None = None
 
     db_dsn: str = 'dbname=main user=analyzer password=analyzer host=pg port=5432'
+    db_flush_size: int = 100
+    db_flush_interval: float = 5.0
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 5
+    db_pool_timeout: float = 30.0
+    db_health_check_interval: float = 30.0
+
+    binance_pool_connections: int = 4
+    binance_pool_maxsize: int = 10
+    binance_weight_limit: int = 6000
+    binance_weight_reserve: int = 1000
+    # Weight sent at once, the rest is spread over the minute
+    binance_weight_burst: int = 1000
+    # Weight the HIGH, NORMAL and LOW priority requests leave to the ones before them
+    binance_weight_headroom: list[int] = [0, 500, 1500]
+    binance_retries: int = 3
+    binance_backoff: float = 1.0
+    fetch_workers: int = 4
+    # Parse workers of the pipeline, fetching and parsing of different pairs overlap
+    compute_workers: int = 2
+    # Items a pipeline stage may be ahead of the next one
+    pipeline_queue_size: int = 100
+    agg_window_seconds: int = 15
+    agg_page_limit: int = 1000
+    agg_max_pages: int = 10
+    agg_rollup_levels: list[str] = ["1m", "15m", "1h"]
 
     moex_pairs: list[str] = ['ABIO', 'ABRD', 'AFKS', 'AFLT', 'AGRO', 'AKRN', 'ALRS', 'AMEZ', 'APTK', 'AQUA', 'ARSA',
                              'ASSB', 'ASTR', 'AVAN', 'BANE', 'BANEP', 'BELU', 'BISVP', 'BLNG', 'BRZL', 'BSPB', 'BSPBP',
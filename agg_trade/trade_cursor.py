@@ -0,0 +1,54 @@
+import logging
+import threading
+from typing import Callable
+
+__all__ = ["AggTradeCursor"]
+
+logger = logging.getLogger("agg_trade")
+
+
+class AggTradeCursor:
+    """Per-pair ``fromId`` cursor over ``/api/v3/aggTrades``.
+
+    ``fetch`` pages forward from the last seen aggregate trade id until a page
+    comes back short, so every trade is returned exactly once. The first call
+    for a pair has no cursor yet: it takes the latest page and keeps the trades
+    from ``since`` (ms) on. ``load_page(pair, from_id, limit)`` does the request,
+    ``from_id`` is None for the latest trades.
+    """
+
+    def __init__(self, load_page: Callable[[str, int | None, int], list], limit: int = 1000,
+                 max_pages: int = 10) -> None:
+        self.load_page = load_page
+        self.limit = limit
+        self.max_pages = max_pages
+        self.from_ids: dict[str, int] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def fetch(self, pair: str, since: int) -> list[dict]:
+        with self._guard:
+            lock = self._locks.setdefault(pair, threading.Lock())
+
+        with lock:
+            from_id = self.from_ids.get(pair)
+            if from_id is None:
+                page = self.load_page(pair, None, self.limit)
+                if page:
+                    self.from_ids[pair] = page[-1]["a"] + 1
+                return [trade for trade in page if trade["T"] >= since]
+
+            trades = []
+            for _ in range(self.max_pages):
+                page = self.load_page(pair, from_id, self.limit)
+                trades.extend(page)
+                if page:
+                    from_id = page[-1]["a"] + 1
+                if len(page) < self.limit:
+                    break
+            else:
+                logger.warning(f"{pair} is still behind after {self.max_pages} pages, continuing from {from_id}")
+
+            self.from_ids[pair] = from_id
+
+            return trades
@@ -0,0 +1,24 @@
+import numpy as np
+
+__all__ = ["side_totals"]
+
+
+def side_totals(trades: list[dict]) -> tuple[float, float, int, int]:
+    """Buy quantity, sell quantity, buy trade count and sell trade count of aggregate trades.
+
+    Uses ``q`` (quantity), ``f`` / ``l`` (first / last trade id) and ``m`` (buyer is
+    the maker, i.e. a taker sell). A side without trades gives zeros.
+    """
+    size = len(trades)
+    if not size:
+        return 0.0, 0.0, 0, 0
+
+    qty = np.array([trade["q"] for trade in trades], dtype=float)
+    is_sell = np.fromiter((trade["m"] for trade in trades), dtype=bool, count=size)
+    count = np.fromiter((trade["l"] - trade["f"] + 1 for trade in trades), dtype=np.int64, count=size)
+
+    sell_qty = qty[is_sell].sum()
+    buy_qty = qty[~is_sell].sum()
+    buy_count, sell_count = np.bincount(is_sell, weights=count, minlength=2)
+
+    return float(buy_qty), float(sell_qty), int(buy_count), int(sell_count)
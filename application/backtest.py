@@ -0,0 +1,204 @@
+import logging
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from typing import Callable
+
+import numpy as np
+
+from application.batch import KlineBatch, compute_indicators, rule_masks
+from application.candle_store import TIME_FRAME_MS
+
+__all__ = ["HISTORY_COLUMNS", "RULES", "RuleStats", "PairResult", "fetch_history", "backtest_pair", "run_backtest",
+           "rolling_normalized_delta"]
+
+logger = logging.getLogger("backtest")
+
+# Open time (ms), open, high, low, close, volume, taker buy base asset volume
+HISTORY_COLUMNS = ("open_time", "open", "high", "low", "close", "volume", "buy_volume")
+RULES = ("flat", "vsa", "increased_volume")
+PAGE_LIMIT = 1000
+
+
+def _history_array(lines: list) -> np.ndarray:
+    if not lines:
+        return np.empty((0, len(HISTORY_COLUMNS)))
+    return np.array([(line[0], line[1], line[2], line[3], line[4], line[5], line[9]) for line in lines],
+                    dtype=np.float64)
+
+
+def fetch_history(
+    pair: str,
+    time_frame: str,
+    start_ms: int,
+    end_ms: int,
+    load_page: Callable[..., list],
+    directory: str | None = None,
+) -> np.ndarray:
+    """Closed klines of ``pair`` from ``start_ms`` to ``end_ms`` as a (candles x ``HISTORY_COLUMNS``) array.
+
+    ``load_page(pair, time_frame, limit=..., start_time=...)`` requests one page. With
+    ``directory`` the history is kept in ``<directory>/<pair>_<time_frame>.npy`` and only
+    candles after the stored ones are downloaded.
+    """
+    path = os.path.join(directory, f"{pair}_{time_frame}.npy") if directory else None
+    history = np.load(path) if path and os.path.exists(path) else _history_array([])
+    if len(history) and history[0, 0] > start_ms:
+        # The stored history starts too late, it is downloaded again
+        history = _history_array([])
+
+    interval = TIME_FRAME_MS[time_frame]
+    cursor = int(history[-1, 0]) + interval if len(history) else start_ms
+    pages = [history]
+    while cursor + interval <= end_ms:
+        page = _history_array(load_page(pair, time_frame, limit=PAGE_LIMIT, start_time=cursor))
+        if not len(page):
+            break
+        pages.append(page)
+        cursor = int(page[-1, 0]) + interval
+        if len(page) < PAGE_LIMIT:
+            break
+
+    history = np.concatenate(pages)
+    # The last candle of the newest page may be unfinished
+    history = history[history[:, 0] + interval <= end_ms]
+    if path:
+        os.makedirs(directory, exist_ok=True)
+        np.save(path, history)
+
+    return history[history[:, 0] >= start_ms]
+
+
+def rolling_normalized_delta(volume: np.ndarray, buy_volume: np.ndarray, window: int) -> np.ndarray:
+    """Taker delta standardized over the ``window`` candles ending at each candle, as ``parse_data`` sees it."""
+    delta = buy_volume - (volume - buy_volume)
+    result = np.full_like(delta, np.nan)
+    if len(delta) < window:
+        return result
+
+    total = np.concatenate(([0.0], np.cumsum(delta)))
+    squares = np.concatenate(([0.0], np.cumsum(delta * delta)))
+    window_sum = total[window:] - total[:-window]
+    mean = window_sum / window
+    variance = (squares[window:] - squares[:-window] - window_sum * mean) / (window - 1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result[window - 1:] = (delta[window - 1:] - mean) / np.sqrt(np.maximum(variance, 0.0))
+
+    return result
+
+
+@dataclass
+class RuleStats:
+    signals: int = 0
+    # Per horizon: sum of forward returns (%), count of returns and of positive ones
+    return_sum: dict[int, float] = field(default_factory=dict)
+    return_count: dict[int, int] = field(default_factory=dict)
+    positive: dict[int, int] = field(default_factory=dict)
+
+    def add(self, other: "RuleStats") -> None:
+        self.signals += other.signals
+        for horizon in other.return_count:
+            self.return_sum[horizon] = self.return_sum.get(horizon, 0.0) + other.return_sum[horizon]
+            self.return_count[horizon] = self.return_count.get(horizon, 0) + other.return_count[horizon]
+            self.positive[horizon] = self.positive.get(horizon, 0) + other.positive[horizon]
+
+    def report(self) -> dict:
+        return {
+            "signals": self.signals,
+            "forward_returns": {
+                horizon: {
+                    "mean_pct": round(self.return_sum[horizon] / count, 4) if count else None,
+                    "hit_rate": round(self.positive[horizon] / count, 4) if count else None,
+                    "count": count,
+                }
+                for horizon, count in sorted(self.return_count.items())
+            },
+        }
+
+
+@dataclass
+class PairResult:
+    pair: str
+    bars: int
+    rules: dict[str, RuleStats]
+    seconds: float
+
+
+def backtest_pair(pair: str, history: np.ndarray, lookback: int, horizons: tuple[int, ...]) -> PairResult:
+    """Evaluate the ``parse_data`` rules at every closed candle of ``history``.
+
+    Indicators run over the whole history, their EMAs are warmed up after ``lookback``
+    candles like in the live window. The normalized delta is standardized over the
+    ``lookback`` candles ending at each candle, as the live window does. Candles before
+    the first full window are skipped. A signal's forward return over ``h`` candles is
+    the close ``h`` candles later against its close.
+    """
+    started = time.perf_counter()
+    columns = dict(zip(HISTORY_COLUMNS, history.T))
+    batch = KlineBatch(
+        pairs=[pair],
+        open_time=columns["open_time"].astype(np.int64)[None],
+        open=columns["open"][None],
+        high=columns["high"][None],
+        low=columns["low"][None],
+        close=columns["close"][None],
+        # parse_data truncates the volume with astype(int)
+        volume=np.trunc(columns["volume"])[None],
+        buy_volume=columns["buy_volume"][None],
+    )
+    rules = {rule: RuleStats() for rule in RULES}
+    bars = history.shape[0]
+    if bars <= lookback:
+        return PairResult(pair, bars, rules, time.perf_counter() - started)
+
+    indicators = compute_indicators(batch)
+    indicators.normalized_delta = rolling_normalized_delta(batch.volume[0], batch.buy_volume[0], lookback)[None]
+    masks = rule_masks(indicators)
+
+    close = batch.close[0]
+    for rule in RULES:
+        mask = masks[rule][0].copy()
+        mask[:lookback - 1] = False
+        signal_bars = np.flatnonzero(mask)
+        stats = rules[rule]
+        stats.signals = int(signal_bars.size)
+        for horizon in horizons:
+            bars_with_future = signal_bars[signal_bars + horizon < bars]
+            forward = (close[bars_with_future + horizon] / close[bars_with_future] - 1) * 100
+            stats.return_sum[horizon] = float(forward.sum())
+            stats.return_count[horizon] = int(forward.size)
+            stats.positive[horizon] = int((forward > 0).sum())
+
+    return PairResult(pair, bars, rules, time.perf_counter() - started)
+
+
+def run_backtest(histories: dict[str, np.ndarray], lookback: int, horizons: tuple[int, ...],
+                 workers: int | None = None) -> dict:
+    """Backtest every pair in a process pool, returns per-rule and per-pair reports and the throughput."""
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {pair: executor.submit(backtest_pair, pair, history, lookback, horizons)
+                   for pair, history in histories.items()}
+        results = []
+        for pair, future in futures.items():
+            try:
+                results.append(future.result())
+            except Exception:
+                logger.exception(f"Backtest of {pair} failed")
+    elapsed = time.perf_counter() - started
+
+    total = {rule: RuleStats() for rule in RULES}
+    for result in results:
+        for rule, stats in result.rules.items():
+            total[rule].add(stats)
+    bars = sum(result.bars for result in results)
+
+    return {
+        "bars": bars,
+        "seconds": round(elapsed, 3),
+        "bars_per_minute": round(bars / elapsed * 60) if elapsed else None,
+        "rules": {rule: stats.report() for rule, stats in total.items()},
+        "pairs": {result.pair: {"bars": result.bars, **{rule: stats.signals for rule, stats in result.rules.items()}}
+                  for result in results},
+    }
@@ -0,0 +1,189 @@
+import sys
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+
+from application.vsa import range_deviation
+
+__all__ = ["KlineBatch", "BatchIndicators", "compute_indicators", "rule_masks", "MIN_CANDLES"]
+
+# pandas_ta.smi returns nothing for shorter series
+MIN_CANDLES = 20
+NORM_LOOKBACK = 14
+SMI_WINDOW = 12
+
+
+@dataclass
+class KlineBatch:
+    """Klines of several pairs stacked into (pairs x time) arrays."""
+
+    pairs: list[str]
+    open_time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+    volume: np.ndarray
+    buy_volume: np.ndarray
+
+    @classmethod
+    def from_lines(cls, lines_by_pair: dict[str, list]) -> "KlineBatch":
+        """All line lists must have the same length."""
+        pairs = list(lines_by_pair)
+        # Open time, open, high, low, close, volume, taker buy base asset volume
+        values = np.array(
+            [[(line[0], line[1], line[2], line[3], line[4], line[5], line[9]) for line in lines]
+             for lines in lines_by_pair.values()],
+            dtype=object,
+        )
+        prices = values[..., 1:].astype(float)
+
+        return cls(
+            pairs=pairs,
+            open_time=values[..., 0].astype(np.int64),
+            open=prices[..., 0],
+            high=prices[..., 1],
+            low=prices[..., 2],
+            close=prices[..., 3],
+            # parse_data truncates the volume with astype(int)
+            volume=np.trunc(prices[..., 4]),
+            buy_volume=prices[..., 5],
+        )
+
+
+@dataclass
+class BatchIndicators:
+    """``parse_data`` columns for every pair, each array is (pairs x time)."""
+
+    vo: np.ndarray
+    smi: np.ndarray
+    normalized_delta: np.ndarray
+    atr: np.ndarray
+    norm_range: np.ndarray
+    range_dev: np.ndarray
+    percent_change: np.ndarray
+
+
+def _ema(x: np.ndarray, span: int) -> np.ndarray:
+    # Series.ewm(span=span, adjust=False).mean() along the time axis
+    alpha = 2.0 / (span + 1.0)
+    y = np.empty_like(x)
+    y[:, 0] = x[:, 0]
+    y[:, 1:], _ = lfilter([alpha], [1.0, alpha - 1.0], x[:, 1:], axis=1, zi=(1.0 - alpha) * x[:, :1])
+
+    return y
+
+
+def _pta_ema(x: np.ndarray, length: int) -> np.ndarray:
+    # pandas_ta.ema: EMA seeded with the mean of the first `length` positions.
+    # NaN positions are the same in every row, they come from the warm-up of the input.
+    result = np.full_like(x, np.nan)
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", RuntimeWarning)
+        seed = np.nanmean(x[:, :length], axis=1)
+
+    start = length - 1
+    if np.isnan(seed).all():
+        valid = np.flatnonzero(~np.isnan(x[0, length:]))
+        if not valid.size:
+            return result
+        start = length + valid[0]
+        seed = x[:, start]
+
+    series = x[:, start:].copy()
+    series[:, 0] = seed
+    result[:, start:] = _ema(series, length)
+
+    return result
+
+
+def _rma(x: np.ndarray, length: int, skip: int) -> np.ndarray:
+    # pandas_ta.rma: Series.ewm(alpha=1 / length, min_periods=length).mean(), after `skip` leading NaN columns
+    decay = 1.0 - 1.0 / length
+    result = np.full_like(x, np.nan)
+    numerator, _ = lfilter([1.0], [1.0, -decay], x[:, skip:], axis=1, zi=np.zeros((x.shape[0], 1)))
+    denominator = lfilter([1.0], [1.0, -decay], np.ones(x.shape[1] - skip))
+    result[:, skip:] = numerator / denominator
+    result[:, :skip + length - 1] = np.nan
+
+    return result
+
+
+def _atr(high: np.ndarray, low: np.ndarray, close: np.ndarray, length: int) -> np.ndarray:
+    high_low = high - low
+    # pandas_ta.non_zero_range shifts the whole series when any range is zero
+    high_low = high_low + sys.float_info.epsilon * (high_low == 0).any(axis=1, keepdims=True)
+    prev_close = np.roll(close, 1, axis=1)
+    true_range = np.maximum.reduce([np.abs(high_low), np.abs(high - prev_close), np.abs(prev_close - low)])
+    true_range[:, 0] = np.nan
+
+    return _rma(true_range, length, skip=1)
+
+
+def _smi(close: np.ndarray, fast: int = 5, slow: int = 20, signal: int = 5) -> np.ndarray:
+    diff = np.full_like(close, np.nan)
+    diff[:, 1:] = np.diff(close, axis=1)
+
+    fast_slow = _pta_ema(_pta_ema(diff, slow), fast)
+    abs_fast_slow = _pta_ema(_pta_ema(np.abs(diff), slow), fast)
+    tsi = fast_slow / abs_fast_slow
+
+    return tsi - _pta_ema(tsi, signal)
+
+
+def compute_indicators(batch: KlineBatch) -> BatchIndicators:
+    """VO, SMI, normalized delta, VSA range deviation and % change for all pairs in one pass."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ema_5 = _ema(batch.volume, 5)
+        ema_10 = _ema(batch.volume, 10)
+        vo = (ema_5 - ema_10) / ema_10 * 100
+
+        delta = batch.buy_volume - (batch.volume - batch.buy_volume)
+        normalized_delta = (delta - delta.mean(axis=1, keepdims=True)) / delta.std(axis=1, ddof=1, keepdims=True)
+
+        atr = _atr(batch.high, batch.low, batch.close, NORM_LOOKBACK)
+        volume_median = np.full_like(batch.volume, np.nan)
+        volume_median[:, NORM_LOOKBACK - 1:] = np.median(
+            sliding_window_view(batch.volume, NORM_LOOKBACK, axis=1), axis=-1
+        )
+        norm_range = (batch.high - batch.low) / atr
+        norm_volume = batch.volume / volume_median
+
+        percent_change = (batch.close - batch.open) / batch.close * 100
+
+    return BatchIndicators(
+        vo=vo,
+        smi=_smi(batch.close),
+        normalized_delta=normalized_delta,
+        atr=atr,
+        norm_range=norm_range,
+        range_dev=range_deviation(norm_volume, norm_range, NORM_LOOKBACK),
+        percent_change=percent_change,
+    )
+
+
+def rule_masks(indicators: BatchIndicators) -> dict[str, np.ndarray]:
+    """``parse_data`` rules evaluated at every candle, each mask is (pairs x time).
+
+    Values are rounded the way ``parse_data`` rounds them before comparing. The
+    flat SMI window of a candle is the ``SMI_WINDOW`` candles before it.
+    """
+    vo = np.round(indicators.vo, 2)
+    vsa = np.round(indicators.range_dev, 2)
+    delta = np.round(indicators.normalized_delta, 2)
+
+    in_band = ((indicators.smi < 0.065) & (indicators.smi > -0.065)).astype(np.int64)
+    in_band_total = np.zeros((in_band.shape[0], in_band.shape[1] + 1), dtype=np.int64)
+    np.cumsum(in_band, axis=1, out=in_band_total[:, 1:])
+    flat_count = np.zeros_like(in_band)
+    flat_count[:, SMI_WINDOW:] = in_band_total[:, SMI_WINDOW:-1] - in_band_total[:, :-SMI_WINDOW - 1]
+
+    with np.errstate(invalid="ignore"):
+        return {
+            "flat": (flat_count == SMI_WINDOW) & (vo > 10),
+            "vsa": ((vsa >= 0.5) | (vsa <= -0.5)) & (vo > 20),
+            "increased_volume": (vo > 20) & ((delta > 2.8) | (delta < -2.8)),
+        }
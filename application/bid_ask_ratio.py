@@ -3,15 +3,24 @@ import logging
 from apscheduler.schedulers.background import BlockingScheduler
 import pandas as pd
 from pytz import utc
-from binance.client import Client
 from settings import settings
 from dataclasses import dataclass
 from psycopg2._psycopg import cursor as cursor_type
 from binance.error import ServerError
-from db_back import connect_db
+from candle_store import CLOSE_TIME, OPEN_TIME, TIME_FRAME_MS, CandleStore
+from db_back import connect_pool
 import numpy as np
-from binance.spot import Spot
 import constants
+from clients import ClientRegistry
+from db_writer import BatchWriter
+from depth import BookSides, band_ratios, level_bands, price_bands
+from depth_archive import DepthArchive, read_archive
+from metrics import configure_logging, metrics, serve_metrics
+from typing import Iterator
+from order_book import DepthBooks, OrderBookGap
+from pipeline import Pipeline, Stage
+from rate_limit import KLINES_WEIGHT, Priority, WeightScheduler, depth_weight
+from functools import partial
 from datetime import timezone
 from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 
@@ -26,11 +35,40 @@ from apscheduler.executors.pool import ThreadPoolExecutor, ProcessPoolExecutor
 
 scheduler = BlockingScheduler(timezone=utc)
 
+DEPTH_COLUMNS = ('time', 'pair', 'bid_ask_ratio_total', 'bid_ask_ratio_50', 'bid_ask_ratio_20', 'bid_ask_ratio_8',
+                 'bid_ask_ratio_5', 'bid_ask_ratio_3', 'limit_density', 'total_orders', 'sell_buy_ratio',
+                 'buy_sell_ratio', 'delta')
+
+# Bands behind the bid_ask_ratio_<N> columns
+COLUMN_BANDS = level_bands({'50': 0.5, '20': 0.2, '8': 0.08, '5': 0.05, '3': 0.03})
+EXTRA_BANDS = level_bands(settings.depth_level_bands) + price_bands(settings.depth_price_bands)
+
 logger = logging.getLogger("main")
 
+clients = ClientRegistry(
+    settings.binance_api_key,
+    settings.binance_api_secret,
+    pool_connections=settings.binance_pool_connections,
+    pool_maxsize=settings.binance_pool_maxsize,
+)
+# Klines of the signal jobs go first, depth snapshots before aggregate trades
+weight_scheduler = WeightScheduler(
+    limit=settings.binance_weight_limit,
+    reserve=settings.binance_weight_reserve,
+    burst=settings.binance_weight_burst,
+    headroom=settings.binance_weight_headroom,
+    retries=settings.binance_retries,
+    backoff=settings.binance_backoff,
+)
+depth_books: DepthBooks | None = None
+# 1m klines of the taker flow, kept between samples until the next candle opens
+MARKET_KLINES = 50
+market_candles = CandleStore(capacity=MARKET_KLINES)
+depth_archive = DepthArchive(settings.depth_archive_dir) if settings.depth_archive_dir else None
+
 @dataclass
 class Signal:
-    time: int
+    time: datetime.datetime
     pair: str
     bid_ask_ratio_total: float
     bid_ask_ratio_50: float
@@ -64,6 +102,7 @@ class Signal:
 
 
     db_id: int | None = None
+    bands: dict | None = None
 
     # @property
     # def message(self) -> str:
@@ -86,35 +125,23 @@ class Signal:
 
 
 def depth_main(db_connection) -> None:
-    for pair in settings.pairs_depth:
-        try:
-            data = load_depth_data(pair)
-        except ServerError:
-            logger.warning(f"Binance server error for {pair=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading data")
-            continue
-        try:
-            market_data = load_market_data(pair)
-        except ServerError:
-            logger.warning(f"Binance server error for {pair=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading data")
-            continue
-
-        try:
-            signal = parse_depth_data(data, market_data, pair)
-        except Exception as e:
-            logger.exception(f"Error occurred at processing  {pair=}")
-            continue
-
-        try:
-            if signal:
-                signal.db_id = save_to_db(db_connection, signal)
-        except Exception as e:
-            logger.exception(f"Error occurred at saving {signal=} to DB")
+    with (
+        metrics.run('depth'),
+        BatchWriter(db_connection, 'bid_ask_ratio', DEPTH_COLUMNS, flush_size=settings.db_flush_size,
+                    flush_interval=settings.db_flush_interval,
+                    on_timing=metrics.recorder('depth', 'flush')) as writer,
+    ):
+        stages = [
+            Stage('fetch', _fetch_depth, workers=settings.fetch_workers, on_error=_fetch_error),
+            Stage('fetch_klines', lambda pair, data: (data, load_market_data(pair)), workers=settings.fetch_workers,
+                  on_error=_fetch_error),
+            Stage('parse', lambda pair, loaded: parse_depth_data(*loaded, pair), workers=settings.compute_workers),
+            # A single writer for the one connection
+            Stage('persist', lambda pair, signal: writer.add(signal_values(signal),
+                                                             on_saved=partial(setattr, signal, 'db_id'))),
+        ]
+        Pipeline('depth', stages, queue_size=settings.pipeline_queue_size,
+                 timer=partial(metrics.stage, 'depth')).run(settings.pairs_depth)
 
         # try:
         #     if signal:
@@ -122,49 +149,91 @@ def depth_main(db_connection) -> None:
         # except Exception as e:
         #     logger.exception(f"Error occurred at sending {signal=}")
 
+    logger.info(f"Binance connections: {clients.stats()}")
+
+
+def _fetch_depth(pair: str, _) -> dict:
+    data = load_depth_data(pair)
+    try:
+        if depth_archive:
+            with metrics.stage('depth', 'archive', pair):
+                depth_archive.write(pair, int(datetime.datetime.now(timezone.utc).timestamp() * 1000), data)
+    except Exception as e:
+        logger.exception(f"Error occurred at archiving {pair=} depth")
 
-def load_depth_data(pair: str) -> dict:
-    client = Client(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    data = client.get_order_book(symbol=pair, limit=5000)
     return data
 
 
+def _fetch_error(pair: str, error: Exception) -> None:
+    if isinstance(error, ServerError):
+        logger.warning(f"Binance server error for {pair=}")
+    elif isinstance(error, OrderBookGap):
+        logger.warning(f"Order book of {pair=} is not synced yet")
+    else:
+        logger.error(f"Error occurred at loading data for {pair=}", exc_info=error)
+
+
+def load_depth_data(pair: str) -> dict:
+    if depth_books is not None:
+        data = depth_books.book(pair, settings.depth_limit)
+        if data is None:
+            raise OrderBookGap(f"{pair} has no snapshot")
+        return data
+
+    return load_depth_snapshot(pair)
+
+
+def load_depth_snapshot(pair: str) -> dict:
+    response = weight_scheduler.request(depth_weight(settings.depth_limit), Priority.NORMAL, clients.spot().depth, pair,
+                                        limit=settings.depth_limit)
+    return response['data']
+
+
 def load_market_data(pair: str) -> list:
-    client = Spot(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    market_data = client.klines(symbol=pair, interval='1m', limit=50)
-    return market_data
-
-
-def parse_depth_data(data: dict, market_data: list, pair: str) -> Signal | None:
-    bids = data['bids']
-    asks = data['asks']
-    df_bids = pd.DataFrame(bids)
-    df_asks = pd.DataFrame(asks)
-    df = pd.concat([df_bids, df_asks], axis=1)
-    df.columns = ['price_bid', 'amount_bid', 'price_ask', 'amount_ask']
-    df = df.dropna()
-    df[['price_bid', 'amount_bid', 'price_ask', 'amount_ask']] = df[
-        ['price_bid', 'amount_bid', 'price_ask', 'amount_ask']].astype(float)
-    price = df['price_bid'].iloc[0]
-    depth_50 = round(len(df) * 0.5)
-    depth_20 = round(len(df) * 0.2)
-    depth_8 = round(len(df) * 0.08)
-    depth_5 = round(len(df) * 0.05)
-    depth_3 = round(len(df) * 0.03)
-    time = datetime.datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-    bid_ask_ratio_total = ((df['amount_bid'].sum() - df['amount_ask'].sum()) / (
-            df['amount_bid'].sum() + df['amount_ask'].sum())).round(2)
-    bid_ask_ratio_50 = ((df['amount_bid'][:depth_50].sum() - df['amount_ask'][:depth_50].sum()) / (
-            df['amount_bid'][:depth_50].sum() + df['amount_ask'][:depth_50].sum())).round(2)
-    bid_ask_ratio_20 = ((df['amount_bid'][:depth_20].sum() - df['amount_ask'][:depth_20].sum()) / (
-            df['amount_bid'][:depth_20].sum() + df['amount_ask'][:depth_20].sum())).round(2)
-    bid_ask_ratio_8 = ((df['amount_bid'][:depth_8].sum() - df['amount_ask'][:depth_8].sum()) / (
-            df['amount_bid'][:depth_8].sum() + df['amount_ask'][:depth_8].sum())).round(2)
-    bid_ask_ratio_5 = ((df['amount_bid'][:depth_5].sum() - df['amount_ask'][:depth_5].sum()) / (
-            df['amount_bid'][:depth_5].sum() + df['amount_ask'][:depth_5].sum())).round(2)
-    bid_ask_ratio_3 = ((df['amount_bid'][:depth_3].sum() - df['amount_ask'][:depth_3].sum()) / (
-            df['amount_bid'][:depth_3].sum() + df['amount_ask'][:depth_3].sum())).round(2)
-    total_orders = (df['amount_bid'].sum() + df['amount_ask'].sum()).round(2)
+    """Last 1m klines, requested again only once the newest stored candle has closed.
+
+    The newest stored line is the candle that was still open when it was fetched, the
+    request starts at its open time so the previous minute is complete.
+    """
+    now = int(datetime.datetime.now(timezone.utc).timestamp() * 1000)
+
+    with market_candles.lock(pair, '1m'):
+        lines = market_candles.window(pair, '1m', MARKET_KLINES)
+        if lines and now <= lines[-1][CLOSE_TIME]:
+            return lines
+
+        if lines and now - lines[-1][OPEN_TIME] < MARKET_KLINES * TIME_FRAME_MS['1m']:
+            market_candles.merge(pair, '1m', request_market_klines(pair, start_time=lines[-1][OPEN_TIME]))
+        else:
+            market_candles.replace(pair, '1m', request_market_klines(pair))
+
+        return market_candles.window(pair, '1m', MARKET_KLINES)
+
+
+def request_market_klines(pair: str, start_time: int | None = None) -> list:
+    market_data = weight_scheduler.request(KLINES_WEIGHT, Priority.NORMAL, clients.spot().klines, symbol=pair,
+                                           interval='1m', limit=MARKET_KLINES, startTime=start_time)
+    return market_data['data']
+
+
+def parse_depth_data(data: dict, market_data: list | None, pair: str, time_ms: int | None = None) -> Signal | None:
+    """Ratios of a depth snapshot, taker flow of the previous minute comes from ``market_data`` klines.
+
+    Replayed snapshots have no klines, pass ``None`` and the snapshot's ``time_ms``.
+    """
+    sides = BookSides.from_depth(data)
+    ratios = band_ratios(sides, COLUMN_BANDS + EXTRA_BANDS)
+    price = sides.bid_price[0]
+    depth_50, depth_20, depth_8, depth_5, depth_3 = (sides.level_count(band) for band in COLUMN_BANDS)
+    time = datetime.datetime.now(timezone.utc) if time_ms is None else \
+        datetime.datetime.fromtimestamp(time_ms / 1000, timezone.utc)
+    bid_ask_ratio_total = ratios['total']
+    bid_ask_ratio_50 = ratios['50']
+    bid_ask_ratio_20 = ratios['20']
+    bid_ask_ratio_8 = ratios['8']
+    bid_ask_ratio_5 = ratios['5']
+    bid_ask_ratio_3 = ratios['3']
+    total_orders = float(np.round(sum(sides.sums()), 2))
     # #mean density
     # bid_density_total = df['amount_bid'].mean().round(2)
     # ask_density_total = df['amount_ask'].mean().round(2)
@@ -179,17 +248,19 @@ def parse_depth_data(data: dict, market_data: list, pair: str) -> Signal | None:
     # bid_density_3 = df['amount_bid'][:depth_3].mean().round(2)
     # ask_density_3 = df['amount_ask'][:depth_3].mean().round(2)
 
-    market_df = pd.DataFrame(market_data, columns=constants.BINANCE_REQUIRE_COLUMNS)
-    market_df[["Open price", "High price", "Low price", "Close price", "Volume", 'Taker buy base asset volume']] = \
-    market_df[["Open price", "High price", "Low price", "Close price", "Volume", 'Taker buy base asset volume']
-    ].astype(float)
-    market_df['Taker sell base asset volume'] = market_df['Volume'] - market_df['Taker buy base asset volume']
-    market_df['Sell_buy_ratio'] = market_df['Taker sell base asset volume'] / market_df['Taker buy base asset volume']
-    market_df['Buy_sell_ratio'] = market_df['Taker buy base asset volume'] / market_df['Taker sell base asset volume']
-    market_df['Delta'] = market_df['Taker buy base asset volume'] - market_df['Taker sell base asset volume']
-    sell_buy_ratio = market_df['Sell_buy_ratio'].iloc[-2].round(2)
-    buy_sell_ratio = market_df['Buy_sell_ratio'].iloc[-2].round(2)
-    delta = market_df['Delta'].iloc[-2].round(2)
+    sell_buy_ratio = buy_sell_ratio = delta = None
+    if market_data is not None:
+        market_df = pd.DataFrame(market_data, columns=constants.BINANCE_REQUIRE_COLUMNS)
+        market_df[["Open price", "High price", "Low price", "Close price", "Volume", 'Taker buy base asset volume']] = \
+        market_df[["Open price", "High price", "Low price", "Close price", "Volume", 'Taker buy base asset volume']
+        ].astype(float)
+        market_df['Taker sell base asset volume'] = market_df['Volume'] - market_df['Taker buy base asset volume']
+        market_df['Sell_buy_ratio'] = market_df['Taker sell base asset volume'] / market_df['Taker buy base asset volume']
+        market_df['Buy_sell_ratio'] = market_df['Taker buy base asset volume'] / market_df['Taker sell base asset volume']
+        market_df['Delta'] = market_df['Taker buy base asset volume'] - market_df['Taker sell base asset volume']
+        sell_buy_ratio = market_df['Sell_buy_ratio'].iloc[-2].round(2)
+        buy_sell_ratio = market_df['Buy_sell_ratio'].iloc[-2].round(2)
+        delta = market_df['Delta'].iloc[-2].round(2)
 
     limit_density = None
     # if pair == 'BTCUSDT':
@@ -209,7 +280,8 @@ def parse_depth_data(data: dict, market_data: list, pair: str) -> Signal | None:
                          bid_ask_ratio_5=bid_ask_ratio_5, bid_ask_ratio_3=bid_ask_ratio_3, price=price,
                          depth_50=depth_50, depth_20=depth_20, depth_8=depth_8, depth_5=depth_5, depth_3=depth_3,
                          limit_density=limit_density, total_orders=total_orders, sell_buy_ratio=sell_buy_ratio,
-                         buy_sell_ratio=buy_sell_ratio, delta=delta)
+                         buy_sell_ratio=buy_sell_ratio, delta=delta,
+                         bands={band.name: ratios[band.name] for band in EXTRA_BANDS})
                          # bid_density_total=bid_density_total,
                          # ask_density_total=ask_density_total, bid_density_50=bid_density_50, ask_density_50=ask_density_50,
                          # bid_density_20=bid_density_20, ask_density_20=ask_density_20, bid_density_8=bid_density_8,
@@ -230,19 +302,27 @@ def save_to_db(db_connection, signal: Signal) -> int:
     RETURNING id;
     """
 
-    values = (signal.time, signal.pair, signal.bid_ask_ratio_total, signal.bid_ask_ratio_50,
-              signal.bid_ask_ratio_20, signal.bid_ask_ratio_8,
-              signal.bid_ask_ratio_5, signal.bid_ask_ratio_3, signal.limit_density,
-              signal.total_orders, signal.sell_buy_ratio, signal.buy_sell_ratio, signal.delta)
-
     with db_connection.cursor() as cursor:  # type: cursor_type
-        cursor.execute(query, values)
+        cursor.execute(query, signal_values(signal))
         db_connection.commit()
         row = cursor.fetchone()
 
         return row[0]
 
 
+def signal_values(signal: Signal) -> tuple:
+    return (signal.time, signal.pair, signal.bid_ask_ratio_total, signal.bid_ask_ratio_50,
+            signal.bid_ask_ratio_20, signal.bid_ask_ratio_8,
+            signal.bid_ask_ratio_5, signal.bid_ask_ratio_3, signal.limit_density,
+            signal.total_orders, signal.sell_buy_ratio, signal.buy_sell_ratio, signal.delta)
+
+
+def replay_depth(path: str, pair: str) -> Iterator[Signal]:
+    """Signals of every snapshot in a ``DepthArchive`` day file."""
+    for time_ms, data in read_archive(path):
+        yield parse_depth_data(data, None, pair, time_ms)
+
+
 # def send_signal_depth(signal: Signal) -> None:
 #     bot = telebot.TeleBot(settings.bot_token_depth)
 #     if signal.message:
@@ -253,6 +333,18 @@ def save_to_db(db_connection, signal: Signal) -> int:
 #                 logger.exception(f"Error occurred at sending {signal.message=} to {chat_id=}")
 
 
-with connect_db() as db_connection:
-    job_h = scheduler.add_job(depth_main, 'cron', hour='*', minute='*', second='1', args=[db_connection], max_instances=3)
-    scheduler.start()
+if __name__ == '__main__':
+    configure_logging(settings.log_level, settings.log_format)
+    if settings.metrics_port:
+        serve_metrics(metrics, settings.metrics_host, settings.metrics_port)
+
+    second = '1'
+    if settings.depth_stream:
+        # One snapshot per pair, then the books follow the diff stream and can be sampled every few seconds
+        depth_books = DepthBooks(settings.pairs_depth, load_depth_snapshot, max_levels=settings.depth_limit)
+        depth_books.start()
+        second = f'*/{settings.depth_sample_seconds}'
+
+    with connect_pool() as pool:
+        job_h = scheduler.add_job(pool.job(depth_main), 'cron', hour='*', minute='*', second=second, max_instances=3)
+        scheduler.start()
@@ -0,0 +1,99 @@
+import json
+import os
+import threading
+from collections import deque
+
+__all__ = ["CandleStore", "TIME_FRAME_MS"]
+
+# Open time and Kline Close time positions in a Binance kline line
+OPEN_TIME = 0
+CLOSE_TIME = 6
+
+TIME_FRAME_MS = {
+    "1m": 60_000,
+    "3m": 3 * 60_000,
+    "5m": 5 * 60_000,
+    "15m": 15 * 60_000,
+    "30m": 30 * 60_000,
+    "1h": 3_600_000,
+    "2h": 2 * 3_600_000,
+    "4h": 4 * 3_600_000,
+    "6h": 6 * 3_600_000,
+    "8h": 8 * 3_600_000,
+    "12h": 12 * 3_600_000,
+    "1d": 86_400_000,
+    "3d": 3 * 86_400_000,
+    "1w": 7 * 86_400_000,
+}
+
+
+class CandleStore:
+    """Per (pair, time frame) ring buffer of Binance kline lines.
+
+    Lines are kept exactly as the API returns them. When ``directory`` is set
+    every buffer is also written to ``<directory>/<pair>_<time_frame>.json`` and
+    read back on first access, so a restart doesn't need the full history again.
+    """
+
+    def __init__(self, directory: str | None = None, capacity: int = 1000) -> None:
+        self.directory = directory
+        self.capacity = capacity
+        self._buffers: dict[tuple[str, str], deque] = {}
+        self._locks: dict[tuple[str, str], threading.Lock] = {}
+        self._guard = threading.Lock()
+
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def lock(self, pair: str, time_frame: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault((pair, time_frame), threading.Lock())
+
+    def _path(self, pair: str, time_frame: str) -> str:
+        return os.path.join(self.directory, f"{pair}_{time_frame}.json")
+
+    def _buffer(self, pair: str, time_frame: str) -> deque:
+        key = (pair, time_frame)
+        if key not in self._buffers:
+            lines = []
+            if self.directory and os.path.exists(self._path(pair, time_frame)):
+                with open(self._path(pair, time_frame)) as file:
+                    lines = json.load(file)
+            self._buffers[key] = deque(lines, maxlen=self.capacity)
+
+        return self._buffers[key]
+
+    def last_close_time(self, pair: str, time_frame: str, now: int) -> int | None:
+        """``Kline Close time`` of the newest candle that was already closed at ``now`` (ms)."""
+        for line in reversed(self._buffer(pair, time_frame)):
+            if line[CLOSE_TIME] < now:
+                return line[CLOSE_TIME]
+
+        return None
+
+    def merge(self, pair: str, time_frame: str, lines: list) -> None:
+        """Add fresh lines, replacing stored ones with the same or a later open time."""
+        if not lines:
+            return
+
+        buffer = self._buffer(pair, time_frame)
+        first_open_time = lines[0][OPEN_TIME]
+        while buffer and buffer[-1][OPEN_TIME] >= first_open_time:
+            buffer.pop()
+        buffer.extend(lines)
+
+        if self.directory:
+            self._dump(pair, time_frame, buffer)
+
+    def replace(self, pair: str, time_frame: str, lines: list) -> None:
+        self._buffer(pair, time_frame).clear()
+        self.merge(pair, time_frame, lines)
+
+    def window(self, pair: str, time_frame: str, size: int) -> list:
+        return list(self._buffer(pair, time_frame))[-size:]
+
+    def _dump(self, pair: str, time_frame: str, buffer: deque) -> None:
+        path = self._path(pair, time_frame)
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(list(buffer), file)
+        os.replace(f"{path}.tmp", path)
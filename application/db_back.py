@@ -1,18 +1,178 @@
+import functools
+import logging
+import threading
+import time
 from contextlib import contextmanager
-from typing import Iterator
+from typing import Callable, Iterator
 
 import psycopg2
-from psycopg2._psycopg import connection
+from psycopg2 import extensions
+from psycopg2._psycopg import connection, cursor as cursor_type
+from psycopg2.pool import ThreadedConnectionPool
 
 from settings import settings
 
-__all__ = ["connect_db"]
+__all__ = ["connect_db", "connect_pool", "ConnectionPool", "PoolTimeout"]
+
+logger = logging.getLogger("db")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """Thread-safe psycopg2 pool, every scheduler job checks out its own connection.
+
+    ``connection()`` waits up to ``timeout`` seconds for a free slot. A connection
+    idle for more than ``health_check_interval`` seconds is pinged before it is
+    handed out, dead ones are dropped and replaced by a fresh connection. A
+    connection that broke while in use is closed instead of returned to the pool.
+    """
+
+    def __init__(
+        self,
+        db_dsn: str,
+        min_size: int = 1,
+        max_size: int = 5,
+        timeout: float = 30.0,
+        health_check_interval: float = 30.0,
+    ) -> None:
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._pool = ThreadedConnectionPool(min_size, max_size, db_dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._lock = threading.Lock()
+        self._used_at: dict[int, float] = {}
+        self._in_use = 0
+        self._checkouts = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._timeouts = 0
+        self._reconnects = 0
+
+    @contextmanager
+    def connection(self) -> Iterator[connection]:
+        started = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self._timeouts += 1
+            raise PoolTimeout(f"No free DB connection after {self.timeout}s")
+        waited = time.monotonic() - started
+
+        broken = True
+        try:
+            db_connection = self._checkout()
+            with self._lock:
+                self._in_use += 1
+                self._checkouts += 1
+                self._wait_total += waited
+                self._wait_max = max(self._wait_max, waited)
+
+            try:
+                yield db_connection
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
+            except Exception:
+                broken = bool(db_connection.closed)
+                raise
+            else:
+                broken = bool(db_connection.closed)
+            finally:
+                with self._lock:
+                    self._in_use -= 1
+                self._checkin(db_connection, broken)
+        finally:
+            self._slots.release()
+
+    def job(self, func: Callable) -> Callable:
+        """Wrap a ``func(db_connection, *args)`` scheduler job to run on a pooled connection."""
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                with self.connection() as db_connection:
+                    return func(db_connection, *args, **kwargs)
+            finally:
+                logger.info(f"DB pool: {self.stats()}")
+
+        return wrapper
+
+    def stats(self) -> dict[str, float]:
+        with self._lock:
+            return {
+                "in_use": self._in_use,
+                "checkouts": self._checkouts,
+                "wait_avg": self._wait_total / self._checkouts if self._checkouts else 0.0,
+                "wait_max": self._wait_max,
+                "timeouts": self._timeouts,
+                "reconnects": self._reconnects,
+            }
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+    def _checkout(self) -> connection:
+        db_connection = self._pool.getconn()
+        if time.monotonic() - self._used_at.get(id(db_connection), 0.0) < self.health_check_interval:
+            return db_connection
+
+        if self._is_alive(db_connection):
+            return db_connection
+
+        logger.warning("Dropping dead DB connection, reconnecting")
+        with self._lock:
+            self._reconnects += 1
+        self._pool.putconn(db_connection, close=True)
+        self._used_at.pop(id(db_connection), None)
+
+        return self._pool.getconn()
+
+    def _checkin(self, db_connection: connection, broken: bool) -> None:
+        if not broken and db_connection.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
+            try:
+                db_connection.rollback()
+            except psycopg2.Error:
+                broken = True
+
+        if broken:
+            self._used_at.pop(id(db_connection), None)
+        else:
+            self._used_at[id(db_connection)] = time.monotonic()
+        self._pool.putconn(db_connection, close=broken)
+
+    @staticmethod
+    def _is_alive(db_connection: connection) -> bool:
+        if db_connection.closed:
+            return False
+        try:
+            with db_connection.cursor() as cursor:  # type: cursor_type
+                cursor.execute("SELECT 1")
+            db_connection.rollback()
+        except psycopg2.Error:
+            return False
+
+        return True
 
 
 @contextmanager
 def connect_db(db_dsn: str = None) -> Iterator[connection]:
-    db_connection: connection = psycopg2.connect(settings.db_dsn)
+    db_connection: connection = psycopg2.connect(db_dsn or settings.db_dsn)
     try:
         yield db_connection
     finally:
         db_connection.close()
+
+
+@contextmanager
+def connect_pool(db_dsn: str = None) -> Iterator[ConnectionPool]:
+    pool = ConnectionPool(
+        db_dsn or settings.db_dsn,
+        min_size=settings.db_pool_min_size,
+        max_size=settings.db_pool_max_size,
+        timeout=settings.db_pool_timeout,
+        health_check_interval=settings.db_health_check_interval,
+    )
+    try:
+        yield pool
+    finally:
+        pool.close()
@@ -0,0 +1,85 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+__all__ = ["DepthBand", "BookSides", "band_ratios", "level_bands", "price_bands"]
+
+
+@dataclass(frozen=True)
+class DepthBand:
+    """Part of the book near the top, by share of levels or by distance from the mid price.
+
+    ``fraction`` takes ``round(levels * fraction)`` levels of each side, where
+    ``levels`` is the length of the deeper side. ``distance`` takes the levels
+    within ``mid * distance`` of the mid price, e.g. 0.01 for +-1%.
+    """
+
+    name: str
+    fraction: float | None = None
+    distance: float | None = None
+
+
+def level_bands(fractions: dict[str, float]) -> list[DepthBand]:
+    return [DepthBand(name, fraction=fraction) for name, fraction in fractions.items()]
+
+
+def price_bands(distances: dict[str, float]) -> list[DepthBand]:
+    return [DepthBand(name, distance=distance) for name, distance in distances.items()]
+
+
+def _levels(levels: list) -> tuple[np.ndarray, np.ndarray]:
+    array = np.asarray(levels, dtype=float).reshape(-1, 2)
+    return array[:, 0], array[:, 1]
+
+
+class BookSides:
+    """Bids (best first, descending) and asks (ascending) as float arrays with prefix sums of the amounts."""
+
+    def __init__(self, bids: list, asks: list) -> None:
+        self.bid_price, bid_amount = _levels(bids)
+        self.ask_price, ask_amount = _levels(asks)
+        self.bid_total = np.concatenate(([0.0], np.cumsum(bid_amount)))
+        self.ask_total = np.concatenate(([0.0], np.cumsum(ask_amount)))
+
+    @classmethod
+    def from_depth(cls, data: dict) -> "BookSides":
+        return cls(data["bids"], data["asks"])
+
+    @property
+    def levels(self) -> int:
+        return max(len(self.bid_price), len(self.ask_price))
+
+    @property
+    def mid(self) -> float:
+        return (self.bid_price[0] + self.ask_price[0]) / 2
+
+    def sums(self, band: DepthBand | None = None) -> tuple[float, float]:
+        """Bid and ask amounts inside ``band``, the whole book for None."""
+        if band is None:
+            return self.bid_total[-1], self.ask_total[-1]
+
+        if band.fraction is not None:
+            count = round(self.levels * band.fraction)
+            bid_count, ask_count = count, count
+        else:
+            mid = self.mid
+            # Bids are descending, search the negated prices
+            bid_count = np.searchsorted(-self.bid_price, -(mid - mid * band.distance), side="right")
+            ask_count = np.searchsorted(self.ask_price, mid + mid * band.distance, side="right")
+
+        return (self.bid_total[min(bid_count, len(self.bid_total) - 1)],
+                self.ask_total[min(ask_count, len(self.ask_total) - 1)])
+
+    def level_count(self, band: DepthBand) -> int:
+        return round(self.levels * band.fraction)
+
+
+def band_ratios(sides: BookSides, bands: list[DepthBand]) -> dict[str, float]:
+    """``(bids - asks) / (bids + asks)`` for the whole book (``"total"``) and each band, rounded to 2 digits."""
+    ratios = {}
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for name, band in [("total", None), *((band.name, band) for band in bands)]:
+            bid, ask = sides.sums(band)
+            ratios[name] = float(np.round(np.float64(bid - ask) / (bid + ask), 2))
+
+    return ratios
@@ -0,0 +1,159 @@
+import mmap
+import os
+import struct
+import threading
+import zlib
+from datetime import datetime, timezone
+from typing import Iterator
+
+import numpy as np
+
+__all__ = ["DepthArchive", "read_archive", "archive_path"]
+
+MAGIC = b"DEPTHv1\n"
+# time (ms), bid levels, ask levels, keyframe flag, compressed payload length
+RECORD = struct.Struct("<qIIBI")
+
+
+def archive_path(directory: str, pair: str, time_ms: int) -> str:
+    day = datetime.fromtimestamp(time_ms / 1000, timezone.utc).strftime("%Y-%m-%d")
+    return os.path.join(directory, pair, f"{day}.depth")
+
+
+def _columns(levels) -> tuple[np.ndarray, np.ndarray]:
+    array = np.asarray(levels, dtype=np.float32).reshape(-1, 2)
+    return np.ascontiguousarray(array[:, 0]).view(np.uint32), np.ascontiguousarray(array[:, 1]).view(np.uint32)
+
+
+def _complete_size(path: str) -> int:
+    """Size of ``path`` up to the end of its last complete record, 0 when even the header is cut short."""
+    size = os.path.getsize(path)
+    if size < len(MAGIC):
+        return 0
+
+    with open(path, "rb") as file:
+        if file.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a depth archive")
+        offset = len(MAGIC)
+        while offset + RECORD.size <= size:
+            file.seek(offset)
+            length = RECORD.unpack(file.read(RECORD.size))[-1]
+            if offset + RECORD.size + length > size:
+                break
+            offset += RECORD.size + length
+
+    return offset
+
+
+def _xor(current: np.ndarray, previous: np.ndarray | None) -> np.ndarray:
+    if previous is None:
+        return current
+    result = current.copy()
+    size = min(len(current), len(previous))
+    result[:size] ^= previous[:size]
+
+    return result
+
+
+class DepthArchive:
+    """Appends raw depth snapshots to ``<directory>/<pair>/<YYYY-MM-DD>.depth`` (UTC days).
+
+    A record stores bid and ask prices and amounts as float32 columns. Their bits
+    are XORed with the previous snapshot of the pair, so unchanged levels become
+    zeros, and the record is zlib-compressed. Every ``keyframe_interval``-th
+    record, and the first one of each file, is stored without the delta.
+    """
+
+    def __init__(self, directory: str, keyframe_interval: int = 100, compression: int = 6) -> None:
+        self.directory = directory
+        self.keyframe_interval = keyframe_interval
+        self.compression = compression
+        self._files: dict[str, tuple[str, object]] = {}
+        self._previous: dict[str, list[np.ndarray]] = {}
+        self._count: dict[str, int] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    def write(self, pair: str, time_ms: int, data: dict) -> None:
+        with self._guard:
+            lock = self._locks.setdefault(pair, threading.Lock())
+
+        with lock:
+            file = self._file(pair, time_ms)
+            bid_price, bid_amount = _columns(data["bids"])
+            ask_price, ask_amount = _columns(data["asks"])
+            columns = [bid_price, bid_amount, ask_price, ask_amount]
+
+            keyframe = self._count[pair] % self.keyframe_interval == 0
+            previous = [None] * 4 if keyframe else self._previous[pair]
+            payload = zlib.compress(
+                b"".join(_xor(column, prev).tobytes() for column, prev in zip(columns, previous)), self.compression
+            )
+
+            file.write(RECORD.pack(time_ms, len(bid_price), len(ask_price), keyframe, len(payload)))
+            file.write(payload)
+            file.flush()
+
+            self._previous[pair] = columns
+            self._count[pair] += 1
+
+    def close(self) -> None:
+        with self._guard:
+            for _, file in self._files.values():
+                file.close()
+            self._files.clear()
+
+    def _file(self, pair: str, time_ms: int):
+        path = archive_path(self.directory, pair, time_ms)
+        current = self._files.get(pair)
+        if current and current[0] == path:
+            return current[1]
+
+        if current:
+            current[1].close()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # A record cut short by a crash would otherwise be read across the records appended after it
+            os.truncate(path, _complete_size(path))
+        file = open(path, "ab")
+        if file.tell() == 0:
+            file.write(MAGIC)
+        self._files[pair] = (path, file)
+        # A new file or a restart, the next record can't depend on anything before it
+        self._count[pair] = 0
+
+        return file
+
+
+def read_archive(path: str) -> Iterator[tuple[int, dict]]:
+    """Replays a ``.depth`` file as ``(time ms, {"bids": (n, 2) float32, "asks": ...})``.
+
+    The file is memory-mapped, a record cut short by a crash ends the replay.
+    """
+    with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as view:
+        if view[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a depth archive")
+
+        offset = len(MAGIC)
+        previous = [None] * 4
+        while offset + RECORD.size <= len(view):
+            time_ms, bids, asks, keyframe, length = RECORD.unpack_from(view, offset)
+            offset += RECORD.size
+            if offset + length > len(view):
+                break
+
+            raw = np.frombuffer(zlib.decompress(view[offset:offset + length]), dtype=np.uint32)
+            offset += length
+            if keyframe:
+                previous = [None] * 4
+
+            columns = []
+            start = 0
+            for size, prev in zip((bids, bids, asks, asks), previous):
+                columns.append(_xor(raw[start:start + size], prev))
+                start += size
+            previous = columns
+
+            bid_price, bid_amount, ask_price, ask_amount = (column.view(np.float32) for column in columns)
+            yield time_ms, {"bids": np.column_stack((bid_price, bid_amount)),
+                            "asks": np.column_stack((ask_price, ask_amount))}
@@ -0,0 +1,233 @@
+import copy
+import math
+from collections import deque
+
+import numpy as np
+
+from application.vsa import rolling_linregress
+
+__all__ = ["EMA", "PtaEMA", "RMA", "ATR", "SMI", "RollingMedian", "RollingZScore", "IndicatorState"]
+
+NAN = float("nan")
+
+
+class EMA:
+    """``Series.ewm(span=span, adjust=False).mean()`` advanced one value at a time."""
+
+    def __init__(self, span: int) -> None:
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = NAN
+
+    def update(self, x: float) -> float:
+        if math.isnan(x):
+            return self.value
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value = self.alpha * x + (1.0 - self.alpha) * self.value
+
+        return self.value
+
+
+class PtaEMA(EMA):
+    """``pandas_ta.ema``: an EMA seeded with the SMA of the first ``length`` positions.
+
+    Positions before the seed are NaN. When the first ``length`` inputs are all
+    NaN the seed is NaN too, and the average starts from the next valid input.
+    """
+
+    def __init__(self, length: int) -> None:
+        super().__init__(length)
+        self.length = length
+        self._position = 0
+        self._seed_sum = 0.0
+        self._seed_count = 0
+
+    def update(self, x: float) -> float:
+        self._position += 1
+        if self._position <= self.length:
+            if not math.isnan(x):
+                self._seed_sum += x
+                self._seed_count += 1
+            if self._position < self.length:
+                return NAN
+            self.value = self._seed_sum / self._seed_count if self._seed_count else NAN
+            return self.value
+
+        return super().update(x)
+
+
+class RMA:
+    """``pandas_ta.rma``: ``Series.ewm(alpha=1 / length, min_periods=length).mean()``."""
+
+    def __init__(self, length: int) -> None:
+        self.length = length
+        self.decay = 1.0 - 1.0 / length
+        self._numerator = 0.0
+        self._denominator = 0.0
+        self._count = 0
+
+    @property
+    def value(self) -> float:
+        if self._count < self.length:
+            return NAN
+        return self._numerator / self._denominator
+
+    def update(self, x: float) -> float:
+        if self._count == 0 and math.isnan(x):
+            return NAN
+        self._numerator *= self.decay
+        self._denominator *= self.decay
+        if not math.isnan(x):
+            self._numerator += x
+            self._denominator += 1.0
+            self._count += 1
+
+        return self.value
+
+
+class ATR:
+    """``pandas_ta.atr(high, low, close, length)`` with the default RMA smoothing."""
+
+    def __init__(self, length: int = 14) -> None:
+        self.rma = RMA(length)
+        self._prev_close = NAN
+
+    def update(self, high: float, low: float, close: float) -> float:
+        prev_close, self._prev_close = self._prev_close, close
+        if math.isnan(prev_close):
+            return self.rma.update(NAN)
+
+        true_range = max(abs(high - low), abs(high - prev_close), abs(prev_close - low))
+        return self.rma.update(true_range)
+
+
+class SMI:
+    """Oscillator column of ``pandas_ta.smi(close, fast, slow, signal)``, ``SMIo_<fast>_<slow>_<signal>``."""
+
+    def __init__(self, fast: int = 5, slow: int = 20, signal: int = 5) -> None:
+        self.slow_ema = PtaEMA(slow)
+        self.fast_slow_ema = PtaEMA(fast)
+        self.abs_slow_ema = PtaEMA(slow)
+        self.abs_fast_slow_ema = PtaEMA(fast)
+        self.signal_ema = PtaEMA(signal)
+        self._prev_close = NAN
+
+    def update(self, close: float) -> float:
+        diff = close - self._prev_close
+        self._prev_close = close
+
+        fast_slow = self.fast_slow_ema.update(self.slow_ema.update(diff))
+        abs_fast_slow = self.abs_fast_slow_ema.update(self.abs_slow_ema.update(abs(diff)))
+        tsi = fast_slow / abs_fast_slow if abs_fast_slow else NAN
+        signal = self.signal_ema.update(tsi)
+
+        return tsi - signal
+
+
+class RollingMedian:
+    """``Series.rolling(window).median()``."""
+
+    def __init__(self, window: int) -> None:
+        self.window = deque(maxlen=window)
+
+    def update(self, x: float) -> float:
+        self.window.append(x)
+        if len(self.window) < self.window.maxlen:
+            return NAN
+
+        return np.median(self.window)
+
+
+class RollingZScore:
+    """Z-score against the mean and sample std of the last ``window`` values."""
+
+    def __init__(self, window: int) -> None:
+        self.window = deque(maxlen=window)
+
+    def update(self, x: float) -> None:
+        self.window.append(x)
+
+    def normalize(self, x: float) -> float:
+        values = np.fromiter(self.window, dtype=float, count=len(self.window))
+        if values.size < 2:
+            return NAN
+
+        return float((x - values.mean()) / values.std(ddof=1))
+
+
+class IndicatorState:
+    """Everything ``parse_data`` computes for one instrument, advanced one candle at a time.
+
+    ``update`` costs the same whatever the history length. Fed the same candles,
+    it gives the values of the pandas / pandas_ta pipeline; the last ``history``
+    results are kept in ``history``. Normalized delta is relative to the last
+    ``delta_window`` candles, the span of the DataFrame in the batch mode.
+    """
+
+    def __init__(self, history: int = 20, delta_window: int = 50, norm_lookback: int = 14) -> None:
+        self.params = dict(history=history, delta_window=delta_window, norm_lookback=norm_lookback)
+        self.norm_lookback = norm_lookback
+        self.ema_5 = EMA(5)
+        self.ema_10 = EMA(10)
+        self.smi = SMI(fast=5, slow=20, signal=5)
+        self.atr = ATR(norm_lookback)
+        self.volume_median = RollingMedian(norm_lookback)
+        self.delta = RollingZScore(delta_window)
+        self.norm_volumes = deque(maxlen=norm_lookback)
+        self.norm_ranges = deque(maxlen=norm_lookback)
+        self.history = deque(maxlen=history)
+        self.count = 0
+        self.last_time = None
+
+    def update(
+        self, time, open_price: float, high: float, low: float, close: float, volume: float,
+        buy_volume: float | None = None,
+    ) -> dict:
+        # numpy scalars give inf/NaN on a zero ATR, median or EMA like pandas does
+        open_price, high, low, close = np.float64(open_price), np.float64(high), np.float64(low), np.float64(close)
+        volume = np.float64(volume)
+
+        ema_5 = self.ema_5.update(volume)
+        ema_10 = self.ema_10.update(volume)
+        smi = self.smi.update(close)
+
+        delta = NAN
+        if buy_volume is not None:
+            delta = buy_volume - (volume - buy_volume)
+            self.delta.update(delta)
+
+        atr = self.atr.update(high, low, close)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            norm_range = (high - low) / atr
+            norm_volume = volume / self.volume_median.update(volume)
+            vo = (ema_5 - ema_10) / ema_10 * 100
+        self.norm_volumes.append(norm_volume)
+        self.norm_ranges.append(norm_range)
+
+        vsa = NAN
+        if self.count >= self.norm_lookback * 2:
+            slope, intercept, r = (
+                value[-1] for value in rolling_linregress(self.norm_volumes, self.norm_ranges, self.norm_lookback)
+            )
+            if slope <= 0.0 or r < 0.2:
+                vsa = 0.0
+            else:
+                vsa = norm_range - (intercept + slope * norm_volume)
+
+        self.count += 1
+        self.last_time = time
+        values = dict(time=time, open=open_price, close=close, vo=vo, smi=smi, delta=delta, vsa=vsa)
+        self.history.append(values)
+
+        return values
+
+    def reset(self) -> None:
+        self.__init__(**self.params)
+
+    def preview(self, *candle, **kwargs) -> "IndicatorState":
+        """Copy of the state advanced by an unfinished candle, ``self`` is left as it is."""
+        state = copy.deepcopy(self)
+        state.update(*candle, **kwargs)
+
+        return state
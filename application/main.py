@@ -1,26 +1,66 @@
 import json
 import logging
 from dataclasses import dataclass
+from functools import partial
+import time
 from datetime import datetime
 from enum import Enum
+from typing import Callable
 
-import pandas as pd
 import numpy as np
-from scipy import stats
+import pandas as pd
 import pandas_ta as ta  # noqa
-import telebot
 from binance.error import ServerError
-from binance.spot import Spot
 from psycopg2._psycopg import cursor as cursor_type
 
 from application import constants
+from application.batch import MIN_CANDLES, KlineBatch, compute_indicators, rule_masks
+from application.candle_store import CandleStore, TIME_FRAME_MS
+from application.clients import ClientRegistry
+from application.db_writer import BatchWriter
 from application.exceptions import LowLinesCountException
+from application.indicators import IndicatorState
+from application.metrics import metrics
+from application.notifier import MessageBatch, TelegramNotifier
+from application.pipeline import Pipeline, Stage
+from application.rate_limit import KLINES_WEIGHT, Priority, WeightScheduler
 from application.settings import settings
+from application.vsa import range_deviation
+
+__all__ = ["main", 'Signal', 'SignalType', 'save_to_db', 'signal_values', 'signal_writer', 'send_signal', 'notifier',
+           'request_klines', 'job_pipeline', 'signal_stages']
 
-__all__ = ["main", 'Signal', 'SignalType', 'save_to_db', 'send_signal']
+MOEX_TIMEZONE = 'Europe/Moscow'
+SIGNAL_COLUMNS = ("type", "time_frame", "instrument", "time", "volume", "extra", "delta", "exchange", "percent_change")
 
 logger = logging.getLogger("crypto")
 
+weight_scheduler = WeightScheduler(
+    limit=settings.binance_weight_limit,
+    reserve=settings.binance_weight_reserve,
+    burst=settings.binance_weight_burst,
+    headroom=settings.binance_weight_headroom,
+    retries=settings.binance_retries,
+    backoff=settings.binance_backoff,
+)
+clients = ClientRegistry(
+    settings.binance_api_key,
+    settings.binance_api_secret,
+    pool_connections=settings.binance_pool_connections,
+    pool_maxsize=settings.binance_pool_maxsize,
+)
+notifier = TelegramNotifier(
+    settings.bot_token,
+    settings.chat_ids,
+    queue_size=settings.telegram_queue_size,
+    chat_interval=settings.telegram_chat_interval,
+    retries=settings.telegram_retries,
+    backoff=settings.telegram_backoff,
+    on_timing=metrics.recorder("binance", "telegram"),
+)
+candle_store = CandleStore(settings.candle_store_dir, capacity=settings.candle_store_capacity)
+indicator_states: dict[tuple[str, str], IndicatorState] = {}
+
 
 class SignalType(str, Enum):
     INCREASED_VOLUME = "INCREASED_VOLUME"
@@ -69,49 +109,109 @@ class Signal:
 
 
 def main(db_connection, time_frame: str) -> None:
-    for pair in settings.pairs:
-        try:
-            lines = load_data(time_frame, pair)
-        except ServerError:
-            logger.warning(f"Binance server error for {time_frame=} {pair=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading data")
-            continue
+    # Klines are fetched and parsed by worker threads, saving has one worker because
+    # `db_connection` must not be used by two threads at once
+    job = f"binance_{time_frame}"
+    with (
+        metrics.run(job),
+        signal_writer(db_connection, on_timing=metrics.recorder(job, "flush")) as writer,
+        notifier.batch() as messages,
+    ):
+        fetch = Stage("fetch", lambda pair, _: load_data(time_frame, pair), workers=settings.fetch_workers,
+                      on_error=partial(_fetch_error, time_frame))
+        if settings.batch_indicators:
+            lines_by_pair = job_pipeline(job, [fetch]).run(settings.pairs)
+            with metrics.stage(job, "parse_batch"):
+                batch_signals = parse_batch(time_frame, lines_by_pair)
+            stages = [_parse_stage(time_frame, batch_signals), *signal_stages(writer, messages)]
+            job_pipeline(job, stages).run(lines_by_pair, lines_by_pair)
+        else:
+            stages = [fetch, _parse_stage(time_frame, {}), *signal_stages(writer, messages)]
+            job_pipeline(job, stages).run(settings.pairs)
 
-        try:
-            signal = parse_data(time_frame, pair, lines)
-        except LowLinesCountException:
-            logger.warning(f"Got only one line for {time_frame=} {pair=}")
-            continue
-        except Exception as e:
-            logger.exception(f"Error occurred at processing")
-            continue
+    logger.info(f"Binance connections for {time_frame=}: {clients.stats()}")
 
-        try:
-            if signal:
-                signal.db_id = save_to_db(db_connection, signal)
-        except Exception as e:
-            logger.exception(f"Error occurred at saving {signal=} to DB")
 
-        try:
-            if signal:
-                send_signal(signal)
-        except Exception as e:
-            logger.exception(f"Error occurred at sending {signal=}")
+def job_pipeline(job: str, stages: list[Stage]) -> Pipeline:
+    return Pipeline(job, stages, queue_size=settings.pipeline_queue_size, timer=partial(metrics.stage, job))
+
+
+def signal_stages(writer: BatchWriter, messages: MessageBatch, exchange: str = 'Binance') -> list[Stage]:
+    """Persist and notify stages of the signal jobs, a signal that failed to save is still sent."""
+    return [Stage("persist", partial(_save_signal, writer, exchange)),
+            Stage("notify", lambda _, signal: messages.add(signal.message))]
+
+
+def _save_signal(writer: BatchWriter, exchange: str, pair: str, signal: Signal) -> Signal:
+    try:
+        writer.add(signal_values(signal, exchange), on_saved=partial(setattr, signal, "db_id"))
+    except Exception:
+        logger.exception(f"Error occurred at saving {signal=} to DB")
+
+    return signal
+
+
+def _fetch_error(time_frame: str, pair: str, error: Exception) -> None:
+    if isinstance(error, ServerError):
+        logger.warning(f"Binance server error for {time_frame=} {pair=}")
+    else:
+        logger.error(f"Error occurred at loading data for {pair=}", exc_info=error)
+
+
+def _parse_stage(time_frame: str, batch_signals: dict[str, Signal | None]) -> Stage:
+    return Stage("parse", partial(_parse, time_frame, batch_signals), workers=settings.compute_workers,
+                 on_error=partial(_parse_error, time_frame))
+
+
+def _parse(time_frame: str, batch_signals: dict[str, Signal | None], pair: str, lines: list) -> Signal | None:
+    if pair in batch_signals:
+        return batch_signals[pair]
+
+    state = None
+    if settings.streaming_indicators:
+        state = indicator_states.setdefault((pair, time_frame), IndicatorState(delta_window=settings.kline_lookback))
+
+    return parse_data(time_frame, pair, lines, state)
+
+
+def _parse_error(time_frame: str, pair: str, error: Exception) -> None:
+    if isinstance(error, LowLinesCountException):
+        logger.warning(f"Got only one line for {time_frame=} {pair=}")
+    else:
+        logger.error(f"Error occurred at processing {pair=}", exc_info=error)
 
 
 def load_data(time_frame: str, pair: str) -> list:
-    binance_client = Spot(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    lines = binance_client.klines(pair, time_frame, limit=50)
+    """Last `settings.kline_lookback` klines, only candles after the stored ones are requested."""
+    lookback = settings.kline_lookback
+    now = int(time.time() * 1000)
+
+    with candle_store.lock(pair, time_frame):
+        last_close_time = candle_store.last_close_time(pair, time_frame, now)
+        interval = TIME_FRAME_MS.get(time_frame)
+
+        if last_close_time is None or interval is None or (now - last_close_time) // interval >= lookback:
+            candle_store.replace(pair, time_frame, request_klines(pair, time_frame, limit=lookback))
+        else:
+            candle_store.merge(pair, time_frame, request_klines(pair, time_frame, start_time=last_close_time + 1))
+
+        return candle_store.window(pair, time_frame, lookback)
 
-    return lines
 
+def request_klines(pair: str, time_frame: str, limit: int = 1000, start_time: int | None = None) -> list:
+    response = weight_scheduler.request(KLINES_WEIGHT, Priority.HIGH, clients.spot().klines, pair, time_frame,
+                                        limit=limit, startTime=start_time)
 
-def parse_data(pair: str, time_frame: str, lines: list) -> Signal | None:
+    return response["data"]
+
+
+def parse_data(pair: str, time_frame: str, lines: list, state: IndicatorState | None = None) -> Signal | None:
     if len(lines) < 2:
         raise LowLinesCountException()
 
+    if state is not None:
+        return _parse_streaming(pair, time_frame, lines, state)
+
     df = pd.DataFrame(lines, columns=constants.BINANCE_REQUIRE_COLUMNS)
 
     df["Date"] = pd.to_datetime(df["Date"], unit="ms")
@@ -141,45 +241,128 @@ def parse_data(pair: str, time_frame: str, lines: list) -> Signal | None:
     vol_med = df['Volume'].rolling(norm_lookback).median()
     df['norm_range'] = (df['High price'] - df['Low price']) / atr
     df['norm_volume'] = df['Volume'] / vol_med
-    norm_vol = df['norm_volume'].to_numpy()
-    norm_range = df['norm_range'].to_numpy()
-    range_dev = np.zeros(len(df))
-    range_dev[:] = np.nan
-    for i in range(norm_lookback * 2, len(df)):
-        window = df.iloc[i - norm_lookback + 1: i + 1]
-        slope, intercept, r_val, _, _ = stats.linregress(window['norm_volume'], window['norm_range'])
-        if slope <= 0.0 or r_val < 0.2:
-            range_dev[i] = 0.0
+    range_dev = range_deviation(df['norm_volume'].to_numpy(), df['norm_range'].to_numpy(), norm_lookback)
+
+    # info to send
+    prev_percent_change = None
+    if len(df) > 2:
+        prev_percent_change = _percent_change(df.iloc[-3]["Open price"], df.iloc[-3]["Close price"])
+
+    return _select_signal(
+        pair,
+        time_frame,
+        time=df["Date"].iloc[-2],
+        volume=df["VO"].iloc[-2].round(2),
+        smi_window=df['SMI'][-14:-2].to_numpy(),
+        vsa_value=range_dev[-2].round(2),
+        delta=df['Normalized Delta'].iloc[-2].round(2),
+        percent_change=_percent_change(df.iloc[-2]["Open price"], df.iloc[-2]["Close price"]),
+        prev_percent_change=prev_percent_change,
+    )
+
+
+def parse_batch(time_frame: str, lines_by_pair: dict[str, list]) -> dict[str, Signal | None]:
+    """Evaluate the `parse_data` rules for many pairs at once.
+
+    Pairs are stacked by history length into (pairs x time) arrays. Pairs missing from
+    the result (too short history or a failed group) have to go through `parse_data`.
+    """
+    groups: dict[int, dict[str, list]] = {}
+    for pair, lines in lines_by_pair.items():
+        if len(lines) >= MIN_CANDLES:
+            groups.setdefault(len(lines), {})[pair] = lines
+
+    signals = {}
+    for group in groups.values():
+        try:
+            batch = KlineBatch.from_lines(group)
+            indicators = compute_indicators(batch)
+            masks = rule_masks(indicators)
+        except Exception:
+            logger.exception(f"Error occurred at batch processing of {list(group)}")
             continue
 
-        pred_range = intercept + slope * norm_vol[i]
-        range_dev[i] = norm_range[i] - pred_range
+        candidates = (masks["flat"] | masks["vsa"] | masks["increased_volume"])[:, -2]
+        for row, pair in enumerate(batch.pairs):
+            if not candidates[row]:
+                logger.info(f"{time_frame} {pair} pattern was not found")
+                signals[pair] = None
+                continue
+
+            # Same argument order as main() uses for parse_data
+            signals[pair] = _select_signal(
+                time_frame,
+                pair,
+                time=str(pd.Timestamp(batch.open_time[row, -2], unit="ms")),
+                volume=indicators.vo[row, -2].round(2),
+                smi_window=indicators.smi[row, -14:-2],
+                vsa_value=indicators.range_dev[row, -2].round(2),
+                delta=indicators.normalized_delta[row, -2].round(2),
+                percent_change=indicators.percent_change[row, -2].round(2),
+                prev_percent_change=indicators.percent_change[row, -3].round(2),
+            )
+
+    return signals
 
 
-    # info to send
-    time = df["Date"].iloc[-2]
-    volume = df["VO"].iloc[-2].round(2)
+def _parse_streaming(pair: str, time_frame: str, lines: list, state: IndicatorState) -> Signal | None:
+    # The last line is the unfinished candle, it only goes into a preview copy of the state
+    if state.last_time is not None and lines[0][0] > state.last_time:
+        state.reset()
+
+    for line in lines[:-1]:
+        if state.last_time is None or line[0] > state.last_time:
+            state.update(*_kline_values(line))
+    preview = state.preview(*_kline_values(lines[-1]))
+    history = list(preview.history)
+    current = history[-2]
+
+    prev_percent_change = None
+    if len(history) > 2:
+        prev_percent_change = _percent_change(history[-3]["open"], history[-3]["close"])
+
+    return _select_signal(
+        pair,
+        time_frame,
+        time=str(pd.Timestamp(current["time"], unit="ms")),
+        volume=current["vo"].round(2),
+        smi_window=np.array([values["smi"] for values in history[-14:-2]]),
+        vsa_value=np.round(current["vsa"], 2),
+        delta=np.round(preview.delta.normalize(current["delta"]), 2),
+        percent_change=_percent_change(current["open"], current["close"]),
+        prev_percent_change=prev_percent_change,
+    )
+
+
+def _kline_values(line: list) -> tuple:
+    # Open time, open, high, low, close, volume truncated like in the pandas pipeline, taker buy volume
+    return (line[0], float(line[1]), float(line[2]), float(line[3]), float(line[4]), int(float(line[5])),
+            float(line[9]))
+
+
+def _percent_change(open_price: float, close_price: float) -> float:
+    return ((close_price - open_price) / close_price * 100).round(2)
+
+
+def _select_signal(
+    pair: str, time_frame: str, time, volume: float, smi_window: np.ndarray, vsa_value: float, delta: float,
+    percent_change: float, prev_percent_change: float | None,
+) -> Signal | None:
     created = datetime.utcnow()
-    smi = df['SMI'][-14:-2].loc[(df['SMI'] < 0.065 ) & (df['SMI'] > -0.065)].size
-    vsa_value = range_dev[-2].round(2)
-    delta = df['Normalized Delta'].iloc[-2].round(2) #Delta
-    percent_change = ((df.iloc[-2]["Close price"] - df.iloc[-2]["Open price"]) \
-                      / df.iloc[-2]["Close price"] * 100).round(2)
+    smi_flat = smi_window[(smi_window < 0.065) & (smi_window > -0.065)]
 
     signal = None
     signal_kwargs = dict(pair=pair, time_frame=time_frame, volume=volume, time=time, created=created, delta=delta,
                          percent_change=percent_change)
 
-    if smi == 12 and volume > 10:
-        flat_value = df["SMI"][-14:-2].loc[(df["SMI"] < 0.065) & (df["SMI"] > -0.065)].mean().round(3)
+    if smi_flat.size == 12 and volume > 10:
+        flat_value = smi_flat.mean().round(3)
         signal = Signal(type=SignalType.FLAT_n_VOLUME, extra={"flat_value": flat_value}, **signal_kwargs)
 
     if (vsa_value >= 0.5 or vsa_value <= -0.5) and volume > 20:
         signal = Signal(type=SignalType.VSA, extra={"vsa_value": vsa_value}, **signal_kwargs)
 
     if volume > 20 and (delta > 2.8 or delta < -2.8):
-        prev_percent_change = ((df.iloc[-3]["Close price"] - df.iloc[-3]["Open price"]) \
-                          / df.iloc[-3]["Close price"] * 100).round(2)
         signal = Signal(type=SignalType.INCREASED_VOLUME, extra={'prev_percent_change': prev_percent_change},
                         **signal_kwargs)
 
@@ -196,22 +379,33 @@ def save_to_db(db_connection, signal: Signal, exchange='Binance') -> int:
     RETURNING id;
     """
 
-    values = (signal.type.value, signal.pair, signal.time_frame,
-              signal.time, signal.volume, json.dumps(signal.extra), signal.delta, exchange, signal.percent_change)
-
     with db_connection.cursor() as cursor:  # type: cursor_type
-        cursor.execute(query, values)
+        cursor.execute(query, signal_values(signal, exchange))
         db_connection.commit()
         row = cursor.fetchone()
 
         return row[0]
 
 
-def send_signal(signal: Signal) -> None:
-    bot = telebot.TeleBot(settings.bot_token)
+def signal_writer(db_connection, on_timing: Callable[[float, int, bool], None] | None = None) -> BatchWriter:
+    """Batched `save_to_db` for a whole run, use as a context manager."""
+    return BatchWriter(db_connection, "signals", SIGNAL_COLUMNS, flush_size=settings.db_flush_size,
+                       flush_interval=settings.db_flush_interval, on_timing=on_timing)
 
-    for chat_id in settings.chat_ids:
-        try:
-            bot.send_message(chat_id=chat_id, text=signal.message)
-        except Exception:
-            logger.exception(f"Error occurred at sending {signal.message=} to {chat_id=}")
+
+def signal_values(signal: Signal, exchange: str = 'Binance') -> tuple:
+    return (signal.type.value, signal.pair, signal.time_frame,
+            signal_time(signal.time, exchange), signal.volume, json.dumps(signal.extra), signal.delta, exchange, signal.percent_change)
+
+
+def signal_time(value, exchange: str = 'Binance') -> datetime:
+    """Candle time as an aware datetime, naive MOEX candles are in Moscow time and Binance ones in UTC."""
+    moment = pd.Timestamp(value)
+    if moment.tzinfo is None:
+        moment = moment.tz_localize(MOEX_TIMEZONE if exchange == 'MOEX' else 'UTC')
+
+    return moment.to_pydatetime()
+
+
+def send_signal(signal: Signal) -> None:
+    notifier.send(signal.message)
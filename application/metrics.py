@@ -0,0 +1,235 @@
+import bisect
+import datetime
+import json
+import logging
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterator
+
+__all__ = ["Metrics", "metrics", "serve_metrics", "configure_logging", "JsonFormatter", "DEFAULT_BUCKETS"]
+
+logger = logging.getLogger("metrics")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+Labels = tuple[str, str, str]
+
+
+class _Series:
+    """Timings of one (job, stage, pair)."""
+
+    __slots__ = ("buckets", "sum", "count", "items", "errors", "recent")
+
+    def __init__(self, bucket_count: int, window: int) -> None:
+        self.buckets = [0] * bucket_count
+        self.sum = 0.0
+        self.count = 0
+        self.items = 0
+        self.errors = 0
+        self.recent: deque[float] = deque(maxlen=window)
+
+
+class Metrics:
+    """Latency histograms, item and error counters per (job, stage, pair).
+
+    Histograms and counters are cumulative, as Prometheus expects them. The last
+    ``window`` timings of every series are also kept for the rolling quantiles, so
+    a slow hour is visible without a Prometheus server. ``render`` returns the text
+    exposition format served by ``serve_metrics``.
+    """
+
+    def __init__(self, namespace: str = "crypto", buckets: tuple[float, ...] = DEFAULT_BUCKETS,
+                 window: int = 500) -> None:
+        self.namespace = namespace
+        self.bucket_bounds = tuple(sorted(buckets))
+        self.window = window
+        self._series: dict[Labels, _Series] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, job: str, stage: str, seconds: float, pair: str = "", items: int = 1, ok: bool = True) -> None:
+        with self._lock:
+            series = self._series.get((job, stage, pair))
+            if series is None:
+                series = self._series[(job, stage, pair)] = _Series(len(self.bucket_bounds), self.window)
+            index = bisect.bisect_left(self.bucket_bounds, seconds)
+            if index < len(series.buckets):
+                series.buckets[index] += 1
+            series.sum += seconds
+            series.count += 1
+            series.items += items
+            series.errors += not ok
+            series.recent.append(seconds)
+
+    @contextmanager
+    def stage(self, job: str, stage: str, pair: str = "") -> Iterator[None]:
+        """Time the block, an exception leaving it is counted as an error and re-raised."""
+        started = time.perf_counter()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            self.observe(job, stage, time.perf_counter() - started, pair, ok=ok)
+
+    def call(self, job: str, stage: str, pair: str, func: Callable, *args, **kwargs):
+        """``func(*args, **kwargs)`` timed as a stage, for ``executor.submit``."""
+        with self.stage(job, stage, pair):
+            return func(*args, **kwargs)
+
+    def recorder(self, job: str, stage: str) -> Callable[[float, int, bool], None]:
+        """``(seconds, items, ok)`` callback for the ``on_timing`` hooks of the writer and the notifier."""
+        return lambda seconds, items, ok: self.observe(job, stage, seconds, items=items, ok=ok)
+
+    @contextmanager
+    def run(self, job: str) -> Iterator[None]:
+        """Time a whole run of ``job`` and log the per-stage totals of the run when it ends."""
+        before = self.totals(job)
+        with self.stage(job, "run"):
+            yield
+        after = self.totals(job)
+
+        stages = {}
+        for stage, (count, seconds, items, errors) in after.items():
+            previous = before.get(stage, (0, 0.0, 0, 0))
+            stages[stage] = {"count": count - previous[0], "seconds": round(seconds - previous[1], 3),
+                             "items": items - previous[2], "errors": errors - previous[3]}
+        run = stages.pop("run", {"seconds": 0.0})
+        text = ", ".join(f"{stage} {values['count']}x {values['seconds']:.2f}s"
+                         + (f" ({values['errors']} errors)" if values["errors"] else "")
+                         for stage, values in stages.items() if values["count"])
+        logger.info(f"{job} run in {run['seconds']:.2f}s: {text or 'no stages'}",
+                    extra={"job": job, "seconds": run["seconds"], "stages": stages})
+
+    def totals(self, job: str) -> dict[str, tuple[int, float, int, int]]:
+        """(count, seconds, items, errors) of every stage of ``job`` summed over the pairs."""
+        totals: dict[str, tuple[int, float, int, int]] = {}
+        with self._lock:
+            for (series_job, stage, _), series in self._series.items():
+                if series_job != job:
+                    continue
+                count, seconds, items, errors = totals.get(stage, (0, 0.0, 0, 0))
+                totals[stage] = (count + series.count, seconds + series.sum, items + series.items,
+                                 errors + series.errors)
+
+        return totals
+
+    def render(self) -> str:
+        """Every series in the Prometheus text exposition format."""
+        with self._lock:
+            series = sorted((labels, _copy(values)) for labels, values in self._series.items())
+
+        name = f"{self.namespace}_stage"
+        lines = [f"# HELP {name}_seconds Time spent in a stage.", f"# TYPE {name}_seconds histogram"]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.bucket_bounds, values.buckets):
+                cumulative += count
+                lines.append(f"{name}_seconds_bucket{_labels(labels, le=_number(bound))} {cumulative}")
+            lines.append(f'{name}_seconds_bucket{_labels(labels, le="+Inf")} {values.count}')
+            lines.append(f"{name}_seconds_sum{_labels(labels)} {_number(values.sum)}")
+            lines.append(f"{name}_seconds_count{_labels(labels)} {values.count}")
+
+        lines += [f"# HELP {name}_recent_seconds Quantiles of the last {self.window} timings.",
+                  f"# TYPE {name}_recent_seconds gauge"]
+        for labels, values in series:
+            recent = sorted(values.recent)
+            for quantile in QUANTILES:
+                value = recent[min(int(quantile * len(recent)), len(recent) - 1)]
+                lines.append(f"{name}_recent_seconds{_labels(labels, quantile=str(quantile))} {_number(value)}")
+
+        for metric, attribute, help_text in (("items_total", "items", "Items (pairs, rows, messages) handled."),
+                                             ("errors_total", "errors", "Stage runs that failed.")):
+            lines += [f"# HELP {name}_{metric} {help_text}", f"# TYPE {name}_{metric} counter"]
+            lines += [f"{name}_{metric}{_labels(labels)} {getattr(values, attribute)}" for labels, values in series]
+
+        return "\n".join(lines) + "\n"
+
+
+def _copy(series: _Series) -> _Series:
+    copy = _Series(len(series.buckets), series.recent.maxlen)
+    copy.buckets = list(series.buckets)
+    copy.sum, copy.count, copy.items, copy.errors = series.sum, series.count, series.items, series.errors
+    copy.recent.extend(series.recent)
+
+    return copy
+
+
+def _labels(labels: Labels, **extra: str) -> str:
+    values = dict(zip(("job", "stage", "pair"), labels), **extra)
+    if not values["pair"]:
+        del values["pair"]
+
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in values.items()) + "}"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(float(value))
+
+
+def serve_metrics(registry: Metrics, host: str, port: int) -> ThreadingHTTPServer:
+    """Serve ``registry.render()`` on ``http://host:port/metrics`` from a daemon thread."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logger.info(f"Serving metrics on http://{host}:{server.server_port}/metrics")
+
+    return server
+
+
+# Attributes every LogRecord has, anything else was passed with ``extra``
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, ``extra`` fields included."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.datetime.fromtimestamp(record.created, datetime.timezone.utc).isoformat(
+                timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str, log_format: str) -> None:
+    """Root logging for ``log_format`` ``json`` (one object per line) or ``text``."""
+    handler = logging.StreamHandler()
+    if log_format == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s [%(threadName)s] %(message)s"))
+    logging.basicConfig(level=level, handlers=[handler], force=True)
+
+
+metrics = Metrics()
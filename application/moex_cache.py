@@ -0,0 +1,92 @@
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["MoexCandleCache", "CANDLE_COLUMNS"]
+
+# Stored columns, begin and end as epoch seconds of the naive Moscow time MOEX returns
+CANDLE_COLUMNS = ("begin", "end", "open", "close", "high", "low", "value", "volume")
+TIME_COLUMNS = ("begin", "end")
+
+
+def _to_array(candles: list[dict]) -> np.ndarray:
+    df = pd.DataFrame(candles, columns=list(CANDLE_COLUMNS))
+    for column in TIME_COLUMNS:
+        df[column] = pd.to_datetime(df[column]).astype("datetime64[s]").astype(np.int64)
+
+    return np.asfortranarray(df.to_numpy(dtype=np.float64))
+
+
+def _to_records(array: np.ndarray) -> list[dict]:
+    df = pd.DataFrame(np.asarray(array), columns=list(CANDLE_COLUMNS))
+    for column in TIME_COLUMNS:
+        df[column] = pd.to_datetime(df[column].astype(np.int64), unit="s")
+
+    return df.to_dict("records")
+
+
+def _seconds(moment: datetime) -> int:
+    # A naive Timestamp is read as UTC, like the stored columns
+    return int(pd.Timestamp(moment).timestamp())
+
+
+class MoexCandleCache:
+    """Board candles per (security, interval) in ``<directory>/<security>_<interval>.npy``.
+
+    A file is one column-major float64 array of ``CANDLE_COLUMNS``, so every column
+    is contiguous, and it is memory-mapped on read. ``merge`` replaces the cached
+    candles from the first new ``begin`` on, the last cached candle may have been
+    unfinished when it was downloaded, and drops candles before ``start``.
+    """
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        self._locks: dict[tuple[str, int], threading.Lock] = {}
+        self._guard = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def lock(self, security: str, interval: int) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault((security, interval), threading.Lock())
+
+    def _path(self, security: str, interval: int) -> str:
+        return os.path.join(self.directory, f"{security}_{interval}.npy")
+
+    def _load(self, security: str, interval: int) -> np.ndarray | None:
+        path = self._path(security, interval)
+        if not os.path.exists(path):
+            return None
+
+        return np.load(path, mmap_mode="r")
+
+    def last_begin(self, security: str, interval: int) -> datetime | None:
+        array = self._load(security, interval)
+        if array is None or not len(array):
+            return None
+
+        return pd.to_datetime(int(array[-1, 0]), unit="s").to_pydatetime()
+
+    def merge(self, security: str, interval: int, candles: list[dict], start: datetime) -> None:
+        cached = self._load(security, interval)
+        fresh = _to_array(candles)
+        if cached is not None and len(fresh):
+            cached = cached[cached[:, 0] < fresh[0, 0]]
+        array = fresh if cached is None else np.concatenate([cached, fresh])
+        array = np.asfortranarray(array[array[:, 0] >= _seconds(start)])
+
+        path = self._path(security, interval)
+        with open(f"{path}.tmp", "wb") as file:
+            np.save(file, array)
+        # Readers that still map the old file keep their copy
+        os.replace(f"{path}.tmp", path)
+
+    def window(self, security: str, interval: int, start: datetime) -> list[dict]:
+        """Cached candles from ``start`` on, in the format ``apimoex`` returns them, ``begin`` as a Timestamp."""
+        array = self._load(security, interval)
+        if array is None:
+            return []
+
+        return _to_records(array[array[:, 0] >= _seconds(start)])
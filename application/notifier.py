@@ -0,0 +1,183 @@
+import heapq
+import itertools
+import logging
+import queue
+import threading
+import time
+from typing import Callable, Iterable
+
+import telebot
+
+__all__ = ["TelegramNotifier", "MessageBatch", "MAX_MESSAGE_LENGTH"]
+
+logger = logging.getLogger("notifier")
+
+MAX_MESSAGE_LENGTH = 4096
+# Telegram allows about 30 messages per second per bot
+GLOBAL_INTERVAL = 1 / 30
+
+
+class TelegramNotifier:
+    """Delivers messages to ``chat_ids`` from a background thread with one reused bot.
+
+    ``send`` only puts the message on a bounded queue, a full queue drops it with a
+    warning. Messages to the same chat are at least ``chat_interval`` seconds apart.
+    A failed send is retried up to ``retries`` times, after ``retry_after`` on a 429
+    and with exponential backoff otherwise. ``on_timing(seconds, 1, ok)`` gets the
+    duration of every send attempt.
+    """
+
+    def __init__(
+        self,
+        token: str,
+        chat_ids: Iterable[int],
+        queue_size: int = 1000,
+        chat_interval: float = 1.0,
+        retries: int = 5,
+        backoff: float = 1.0,
+        on_timing: Callable[[float, int, bool], None] | None = None,
+    ) -> None:
+        self.token = token
+        self.chat_ids = list(chat_ids or [])
+        self.chat_interval = chat_interval
+        self.retries = retries
+        self.backoff = backoff
+        self.on_timing = on_timing
+        self._queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self._bot: telebot.TeleBot | None = None
+        self._thread: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._pending = 0
+
+    def send(self, text: str) -> None:
+        """Queue ``text`` for every chat."""
+        for chat_id in self.chat_ids:
+            self._put(chat_id, text)
+
+    def batch(self) -> "MessageBatch":
+        return MessageBatch(self)
+
+    def wait(self, timeout: float | None = None) -> bool:
+        """Block until every queued message is sent or given up, False on timeout."""
+        with self._done:
+            return self._done.wait_for(lambda: self._pending == 0, timeout)
+
+    def _put(self, chat_id: int, text: str) -> None:
+        self._start()
+        with self._lock:
+            self._pending += 1
+        try:
+            self._queue.put_nowait((chat_id, text))
+        except queue.Full:
+            logger.warning(f"Telegram queue is full, dropping message to {chat_id=}")
+            self._finish()
+
+    def _finish(self) -> None:
+        with self._done:
+            self._pending -= 1
+            self._done.notify_all()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="telegram", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        # (ready at, sequence, chat id, text, attempt), the sequence keeps the order of equal times
+        scheduled: list[tuple[float, int, int, str, int]] = []
+        sequence = itertools.count()
+        chat_ready: dict[int, float] = {}
+        next_send = 0.0
+
+        while True:
+            timeout = max(scheduled[0][0] - time.monotonic(), 0.0) if scheduled else None
+            try:
+                chat_id, text = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                pass
+            else:
+                ready = max(time.monotonic(), chat_ready.get(chat_id, 0.0))
+                chat_ready[chat_id] = ready + self.chat_interval
+                heapq.heappush(scheduled, (ready, next(sequence), chat_id, text, 0))
+                continue
+
+            ready, _, chat_id, text, attempt = heapq.heappop(scheduled)
+            time.sleep(max(next_send - time.monotonic(), 0.0))
+            next_send = time.monotonic() + GLOBAL_INTERVAL
+
+            started = time.perf_counter()
+            try:
+                self._get_bot().send_message(chat_id=chat_id, text=text)
+            except Exception as e:
+                self._timed(started, False)
+                if attempt >= self.retries:
+                    logger.exception(f"Error occurred at sending {text=} to {chat_id=}")
+                    self._finish()
+                    continue
+
+                delay = self._retry_after(e) or self.backoff * 2 ** attempt
+                logger.warning(f"Telegram send to {chat_id=} failed ({e}), retrying in {delay}s")
+                retry_at = time.monotonic() + delay
+                chat_ready[chat_id] = max(chat_ready.get(chat_id, 0.0), retry_at + self.chat_interval)
+                heapq.heappush(scheduled, (retry_at, next(sequence), chat_id, text, attempt + 1))
+                continue
+
+            self._timed(started, True)
+            self._finish()
+
+    def _timed(self, started: float, ok: bool) -> None:
+        if self.on_timing:
+            self.on_timing(time.perf_counter() - started, 1, ok)
+
+    def _get_bot(self) -> telebot.TeleBot:
+        if self._bot is None:
+            self._bot = telebot.TeleBot(self.token)
+
+        return self._bot
+
+    @staticmethod
+    def _retry_after(error: Exception) -> float | None:
+        if getattr(error, "error_code", None) != 429:
+            return None
+        parameters = (getattr(error, "result_json", None) or {}).get("parameters") or {}
+
+        return parameters.get("retry_after")
+
+
+class MessageBatch:
+    """Messages of one run, sent to each chat as few messages as the length limit allows."""
+
+    def __init__(self, notifier: TelegramNotifier, separator: str = "\n\n") -> None:
+        self.notifier = notifier
+        self.separator = separator
+        self.messages: list[str] = []
+
+    def __enter__(self) -> "MessageBatch":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.flush()
+
+    def add(self, text: str) -> None:
+        self.messages.append(text)
+
+    def flush(self) -> None:
+        messages, self.messages = self.messages, []
+        for text in self._coalesce(messages):
+            self.notifier.send(text)
+
+    def _coalesce(self, messages: list[str]) -> list[str]:
+        chunks = []
+        current = ""
+        for text in messages:
+            text = text[:MAX_MESSAGE_LENGTH]
+            if current and len(current) + len(self.separator) + len(text) > MAX_MESSAGE_LENGTH:
+                chunks.append(current)
+                current = ""
+            current = f"{current}{self.separator}{text}" if current else text
+        if current:
+            chunks.append(current)
+
+        return chunks
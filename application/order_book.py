@@ -0,0 +1,226 @@
+import bisect
+import json
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Callable
+
+__all__ = ["OrderBook", "OrderBookGap", "DepthBooks"]
+
+logger = logging.getLogger("order_book")
+
+
+class OrderBookGap(Exception):
+    """A diff event does not continue the book, it must be reloaded from a snapshot."""
+
+
+class _Side:
+    """Price levels of one side of a book with the prices kept sorted best first."""
+
+    __slots__ = ("sign", "levels", "keys")
+
+    def __init__(self, descending: bool) -> None:
+        # Bids are sorted by the negated price, so the best level of both sides is keys[0]
+        self.sign = -1.0 if descending else 1.0
+        self.levels: dict[float, float] = {}
+        self.keys: list[float] = []
+
+    def load(self, levels: list) -> None:
+        self.levels = {float(price): float(qty) for price, qty in levels}
+        self.keys = sorted(self.sign * price for price in self.levels)
+
+    def update(self, levels: list) -> None:
+        for price, qty in levels:
+            price, qty = float(price), float(qty)
+            if qty == 0.0:
+                if self.levels.pop(price, None) is not None:
+                    del self.keys[bisect.bisect_left(self.keys, self.sign * price)]
+            else:
+                if price not in self.levels:
+                    bisect.insort(self.keys, self.sign * price)
+                self.levels[price] = qty
+
+    def prune(self, max_levels: int) -> None:
+        for key in self.keys[max_levels:]:
+            del self.levels[self.sign * key]
+        del self.keys[max_levels:]
+
+    def best(self, limit: int | None) -> list[list[float]]:
+        return [[self.sign * key, self.levels[self.sign * key]] for key in self.keys[:limit]]
+
+
+class OrderBook:
+    """Local copy of one symbol's book, kept current with ``<symbol>@depth`` diff events.
+
+    Follows Binance's "how to manage a local order book" procedure: events up
+    to the snapshot's ``lastUpdateId`` are dropped, the first applied event must
+    cover ``lastUpdateId + 1`` and every following one must start right after
+    the previous ``u``. Anything else raises ``OrderBookGap``.
+
+    With ``max_levels`` every side keeps only its best ``max_levels`` levels. The
+    snapshot doesn't cover the levels behind them either, and the book stays as
+    small as the depth that is sampled from it.
+    """
+
+    def __init__(self, symbol: str, max_levels: int | None = None) -> None:
+        self.symbol = symbol
+        self.max_levels = max_levels
+        self.bids = _Side(descending=True)
+        self.asks = _Side(descending=False)
+        self.last_update_id: int | None = None
+        self.event_time: int | None = None
+        self._first_event = True
+
+    @property
+    def synced(self) -> bool:
+        return self.last_update_id is not None
+
+    def load_snapshot(self, snapshot: dict) -> None:
+        """Reset the book to a REST ``/api/v3/depth`` response."""
+        self.bids.load(snapshot["bids"])
+        self.asks.load(snapshot["asks"])
+        self._prune()
+        self.last_update_id = snapshot["lastUpdateId"]
+        self._first_event = True
+
+    def apply(self, event: dict) -> bool:
+        """Apply a ``depthUpdate`` event, False when it is older than the book."""
+        if not self.synced:
+            raise OrderBookGap(f"{self.symbol} has no snapshot")
+
+        first_id, final_id = event["U"], event["u"]
+        if final_id <= self.last_update_id:
+            return False
+
+        expected = self.last_update_id + 1
+        if (first_id > expected) if self._first_event else (first_id != expected):
+            last_update_id, self.last_update_id = self.last_update_id, None
+            raise OrderBookGap(f"{self.symbol} expected update {expected}, got {first_id}..{final_id} "
+                               f"after {last_update_id}")
+
+        self.bids.update(event["b"])
+        self.asks.update(event["a"])
+        self._prune()
+        self.last_update_id = final_id
+        self.event_time = event.get("E")
+        self._first_event = False
+
+        return True
+
+    def snapshot(self, limit: int | None = None) -> dict:
+        """The book in the shape of a REST depth response, best levels first."""
+        return {"lastUpdateId": self.last_update_id, "bids": self.bids.best(limit), "asks": self.asks.best(limit)}
+
+    def _prune(self) -> None:
+        if self.max_levels is not None:
+            self.bids.prune(self.max_levels)
+            self.asks.prune(self.max_levels)
+
+
+class DepthBooks:
+    """Order books for several symbols fed by one diff-depth websocket.
+
+    Events that arrive while a symbol has no snapshot are buffered. The snapshot
+    is requested with ``load_snapshot(symbol)`` on an executor thread, at most
+    once per ``snapshot_interval`` seconds, so a gap only costs one REST depth
+    request for that symbol and the reader thread keeps buffering while it is in
+    flight. The buffer is replayed once the snapshot arrives. ``book(symbol)``
+    returns ``None`` until the symbol is synced.
+    """
+
+    def __init__(
+        self,
+        symbols: list[str],
+        load_snapshot: Callable[[str], dict],
+        buffer_size: int = 1000,
+        snapshot_interval: float = 5.0,
+        max_levels: int | None = None,
+        snapshot_workers: int = 4,
+    ) -> None:
+        self.load_snapshot = load_snapshot
+        self.snapshot_interval = snapshot_interval
+        self.books = {symbol: OrderBook(symbol, max_levels) for symbol in symbols}
+        self.buffers = {symbol: deque(maxlen=buffer_size) for symbol in symbols}
+        self.resyncs = {symbol: 0 for symbol in symbols}
+        self._locks = {symbol: threading.Lock() for symbol in symbols}
+        self._snapshot_at = {symbol: float("-inf") for symbol in symbols}
+        self._loading: dict[str, Future] = {}
+        self._executor = ThreadPoolExecutor(max_workers=snapshot_workers, thread_name_prefix="depth-snapshot")
+        self._stream = None
+
+    def start(self, speed: int = 100) -> None:
+        from binance.websocket.spot.websocket_stream import SpotWebsocketStreamClient
+
+        self._stream = SpotWebsocketStreamClient(on_message=self._on_message, is_combined=True)
+        for symbol in self.books:
+            self._stream.diff_book_depth(symbol=symbol.lower(), speed=speed)
+
+    def stop(self) -> None:
+        if self._stream is not None:
+            self._stream.stop()
+            self._stream = None
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def on_event(self, event: dict) -> None:
+        symbol = event["s"]
+        if symbol not in self.books:
+            return
+
+        with self._locks[symbol]:
+            book = self.books[symbol]
+            if book.synced:
+                try:
+                    book.apply(event)
+                    return
+                except OrderBookGap as e:
+                    logger.warning(f"{e}, reloading the snapshot")
+                    self.resyncs[symbol] += 1
+                    self.buffers[symbol].clear()
+
+            self.buffers[symbol].append(event)
+            self._request_snapshot(symbol)
+
+    def book(self, symbol: str, limit: int | None = None) -> dict | None:
+        with self._locks[symbol]:
+            book = self.books[symbol]
+            return book.snapshot(limit) if book.synced else None
+
+    def wait(self, timeout: float | None = None) -> None:
+        """Block until the snapshots in flight are loaded and replayed."""
+        wait(list(self._loading.values()), timeout)
+
+    def _request_snapshot(self, symbol: str) -> None:
+        # Called under the symbol's lock
+        if symbol in self._loading or time.monotonic() - self._snapshot_at[symbol] < self.snapshot_interval:
+            return
+        self._snapshot_at[symbol] = time.monotonic()
+        self._loading[symbol] = self._executor.submit(self._load, symbol)
+
+    def _load(self, symbol: str) -> None:
+        try:
+            snapshot = self.load_snapshot(symbol)
+        except Exception:
+            logger.exception(f"Error occurred at loading {symbol} snapshot")
+            with self._locks[symbol]:
+                del self._loading[symbol]
+            return
+
+        with self._locks[symbol]:
+            book = self.books[symbol]
+            book.load_snapshot(snapshot)
+            buffer = self.buffers[symbol]
+            try:
+                while buffer:
+                    book.apply(buffer.popleft())
+            except OrderBookGap as e:
+                # The snapshot is older than the buffered events, the next event retries
+                logger.warning(f"{e}, snapshot is behind the stream")
+                buffer.clear()
+            del self._loading[symbol]
+
+    def _on_message(self, _, message: str) -> None:
+        data = json.loads(message).get("data")
+        if data and data.get("e") == "depthUpdate":
+            self.on_event(data)
@@ -1,75 +1,172 @@
 import logging
+import threading
+import time
 from datetime import datetime
-import pandas as pd
+from functools import partial
 import numpy as np
-from scipy import stats
+import pandas as pd
 import pandas_ta as ta  # noqa
-from binance.error import ServerError
 import requests as re
 import datetime as dt
 import apimoex
-import telebot
+from apimoex.client import ISSMoexError
+from application.clients import TimeoutSession, connection_stats, mount_pool
 from application.exceptions import LowLinesCountException
+from application.indicators import IndicatorState
+from application.metrics import metrics
+from application.pipeline import Stage
+from application.moex_cache import MoexCandleCache
+from application.notifier import TelegramNotifier
 from application.settings import settings
+from application.vsa import range_deviation
 
-from application.main import Signal, SignalType, save_to_db, send_signal
+from application.main import Signal, SignalType, job_pipeline, signal_stages, signal_writer
 
-__all__ = ['main_moex']
+__all__ = ['main_moex', 'notifier_moex']
 
 logger = logging.getLogger("moex")
 
+indicator_states: dict[tuple[str, int], IndicatorState] = {}
+notifier_moex = TelegramNotifier(
+    settings.bot_token_moex,
+    settings.chat_ids_moex,
+    queue_size=settings.telegram_queue_size,
+    chat_interval=settings.telegram_chat_interval,
+    retries=settings.telegram_retries,
+    backoff=settings.telegram_backoff,
+    on_timing=metrics.recorder("moex", "telegram"),
+)
+# One keep-alive pool for every security and run instead of a session per download
+moex_session = mount_pool(TimeoutSession(settings.moex_timeout), settings.moex_workers, settings.moex_workers)
+moex_cache = MoexCandleCache(settings.moex_cache_dir) if settings.moex_cache_dir else None
+
+
+class FetchTimings:
+    """Download times, attempts and failures of one MOEX run, for its summary line."""
+
+    def __init__(self) -> None:
+        self.seconds: dict[str, float] = {}
+        self.retries = 0
+        self.failed: list[str] = []
+        self._lock = threading.Lock()
+
+    def record(self, security: str, seconds: float, attempts: int, ok: bool) -> None:
+        with self._lock:
+            self.seconds[security] = seconds
+            self.retries += attempts - 1
+            if not ok:
+                self.failed.append(security)
+
+    def summary(self, wall: float) -> str:
+        if not self.seconds:
+            return f"nothing fetched in {wall:.1f}s"
+        times = np.array(list(self.seconds.values()))
+        slowest = max(self.seconds, key=self.seconds.get)
+        return (f"{len(times) - len(self.failed)}/{len(times)} securities in {wall:.1f}s "
+                f"(downloads {times.sum():.1f}s, p50 {np.median(times):.2f}s, p95 {np.percentile(times, 95):.2f}s, "
+                f"slowest {slowest} {self.seconds[slowest]:.2f}s), {self.retries} retries, "
+                f"failed: {self.failed or 'none'}")
+
 
 def main_moex(db_connection, interval: int) -> None:
-    for security in settings.moex_pairs:
-        try:
-            data = load_data_moex(security, interval)
-        except ServerError:
-            logger.warning(f"Binance server error for {interval=} {security=}")
-            continue
-        except Exception as e:
-            logger.exception("Error occurred at loading data")
-            continue
+    # Candles are downloaded by `settings.moex_workers` threads and parsed by
+    # `settings.compute_workers`, saving has one worker for the one connection
+    started = time.perf_counter()
+    timings = FetchTimings()
+    job = f"moex_{interval}"
+    with (
+        metrics.run(job),
+        signal_writer(db_connection, on_timing=metrics.recorder(job, "flush")) as writer,
+        notifier_moex.batch() as messages,
+    ):
+        stages = [
+            Stage("fetch", lambda security, _: _fetch_timed(security, interval, timings), workers=settings.moex_workers,
+                  on_error=partial(_fetch_error, interval)),
+            Stage("parse", partial(_parse, interval), workers=settings.compute_workers,
+                  on_error=partial(_parse_error, interval)),
+            *signal_stages(writer, messages, exchange='MOEX'),
+        ]
+        job_pipeline(job, stages).run(settings.moex_pairs)
 
-        try:
-            signal = parse_data_moex(security, interval, data)
-        except LowLinesCountException:
-            logger.warning(f"Got only one line for {interval=} {security=}")
-            continue
-        except Exception as e:
-            logger.exception(f"Error occurred at processing {security}")
-            continue
+    logger.info(f"MOEX {interval=}: {timings.summary(time.perf_counter() - started)}, "
+                f"connections: {connection_stats(moex_session)}")
 
-        try:
-            if signal:
-                signal.db_id = save_to_db(db_connection, signal, exchange='MOEX')
-        except Exception as e:
-            logger.exception(f"Error occurred at saving {signal=} to DB")
 
-        try:
-            if signal:
-                send_signal_moex(signal)
-        except Exception as e:
-            logger.exception(f"Error occurred at sending {signal=}")
+def _fetch_error(interval: int, security: str, error: Exception) -> None:
+    if isinstance(error, (re.RequestException, ISSMoexError)):
+        logger.warning(f"MOEX request failed for {interval=} {security=}")
+    else:
+        logger.error(f"Error occurred at loading data for {security=}", exc_info=error)
+
+
+def _parse(interval: int, security: str, data: list) -> Signal | None:
+    state = None
+    if settings.streaming_indicators:
+        state = indicator_states.setdefault((security, interval), IndicatorState())
+
+    return parse_data_moex(security, interval, data, state)
+
+
+def _parse_error(interval: int, security: str, error: Exception) -> None:
+    if isinstance(error, LowLinesCountException):
+        logger.warning(f"Got only one line for {interval=} {security=}")
+    else:
+        logger.error(f"Error occurred at processing {security}", exc_info=error)
+
 
 def send_signal_moex(signal: Signal) -> None:
-    bot = telebot.TeleBot(settings.bot_token_moex)
+    notifier_moex.send(signal.message)
 
-    for chat_id in settings.chat_ids_moex:
-        try:
-            bot.send_message(chat_id=chat_id, text=signal.message)
-        except Exception:
-            logger.exception(f"Error occurred at sending {signal.message=} to {chat_id=}")
+
+def load_data_moex(security: str, interval: int, attempts: list[int] | None = None) -> list:
+    """Last `settings.moex_history_days` days of candles.
+
+    With `settings.moex_cache_dir` only candles from the last cached `begin` on are
+    downloaded and merged into the cache, the window is read back from it.
+    """
+    start = dt.datetime.today() - dt.timedelta(days=settings.moex_history_days)
+    if moex_cache is None:
+        return _request_candles(security, interval, start, attempts)
+
+    with moex_cache.lock(security, interval):
+        last_begin = moex_cache.last_begin(security, interval)
+        since = start if last_begin is None or last_begin < start else last_begin
+        moex_cache.merge(security, interval, _request_candles(security, interval, since, attempts), start)
+
+        return moex_cache.window(security, interval, start)
 
 
-def load_data_moex(security: str, interval: int) -> list:
-    start = dt.datetime.today() - dt.timedelta(days=50)
+def _request_candles(security: str, interval: int, start: dt.datetime, attempts: list[int] | None = None) -> list:
+    # Retried `settings.moex_retries` times with exponential backoff
+    for attempt in range(settings.moex_retries + 1):
+        if attempts is not None:
+            attempts.append(attempt)
+        try:
+            return apimoex.get_board_candles(session=moex_session, security=security, interval=interval,
+                                             start=str(start))
+        except (re.RequestException, ISSMoexError) as e:
+            if attempt == settings.moex_retries:
+                raise
+            delay = settings.moex_backoff * 2 ** attempt
+            logger.warning(f"MOEX request for {security} failed: {e}, retrying in {delay:.1f}s")
+            time.sleep(delay)
+
 
-    with re.Session() as session:
-        data = apimoex.get_board_candles(session=session, security=security, interval=interval, start=str(start))
-    return data
+def _fetch_timed(security: str, interval: int, timings: FetchTimings) -> list:
+    attempts = []
+    started = time.perf_counter()
+    ok = False
+    try:
+        data = load_data_moex(security, interval, attempts)
+        ok = True
+        return data
+    finally:
+        timings.record(security, time.perf_counter() - started, len(attempts), ok)
 
 
-def parse_data_moex(security: str, interval: int, data: list) -> Signal | None:
+def parse_data_moex(security: str, interval: int, data: list, state: IndicatorState | None = None) -> Signal | None:
+    if state is not None:
+        return _parse_streaming_moex(security, interval, data, state)
 
     df = pd.DataFrame(data)
     df["begin"] = pd.to_datetime(df["begin"])
@@ -90,62 +187,88 @@ def parse_data_moex(security: str, interval: int, data: list) -> Signal | None:
     vol_med = df['value'].rolling(norm_lookback).median()
     df['norm_range'] = (df['high'] - df['low']) / atr
     df['norm_volume'] = df['value'] / vol_med
-    norm_vol = df['norm_volume'].to_numpy()
-    norm_range = df['norm_range'].to_numpy()
-    range_dev = np.zeros(len(df))
-    range_dev[:] = np.nan
-    for i in range(norm_lookback * 2, len(df)):
-        window = df.iloc[i - norm_lookback + 1: i + 1]
-        slope, intercept, r_val, _, _ = stats.linregress(window['norm_volume'], window['norm_range'])
-        if slope <= 0.0 or r_val < 0.2:
-            range_dev[i] = 0.0
-            continue
-
-        pred_range = intercept + slope * norm_vol[i]
-        range_dev[i] = norm_range[i] - pred_range
+    range_dev = range_deviation(df['norm_volume'].to_numpy(), df['norm_range'].to_numpy(), norm_lookback)
 
     # info to send
-    time = df["begin"].iloc[-1]
-    volume = df["VO"].iloc[-1].round(2)
+    return _select_signal_moex(
+        security,
+        interval,
+        time=df["begin"].iloc[-1],
+        volume=df["VO"].iloc[-1].round(2),
+        smi_window=df['SMI'][-13:-1].to_numpy(),
+        vsa_value=range_dev[-1].round(2),
+        percent_change=_percent_change(df.iloc[-1]["open"], df.iloc[-1]["close"]).round(2),
+        prev_percent_change=_percent_change(df.iloc[-2]["open"], df.iloc[-2]["close"]).round(3),
+    )
+
+
+def _parse_streaming_moex(security: str, interval: int, data: list, state: IndicatorState) -> Signal | None:
+    # The last candle may be unfinished, it only goes into a preview copy of the state
+    candles = [_candle_values(candle) for candle in data]
+    if state.last_time is not None and candles[0][0] > state.last_time:
+        state.reset()
+
+    for candle in candles[:-1]:
+        if state.last_time is None or candle[0] > state.last_time:
+            state.update(*candle)
+    history = list(state.preview(*candles[-1]).history)
+    current, previous = history[-1], history[-2]
+
+    return _select_signal_moex(
+        security,
+        interval,
+        time=current["time"],
+        volume=current["vo"].round(2),
+        smi_window=np.array([values["smi"] for values in history[-13:-1]]),
+        vsa_value=np.round(current["vsa"], 2),
+        percent_change=_percent_change(current["open"], current["close"]).round(2),
+        prev_percent_change=_percent_change(previous["open"], previous["close"]).round(3),
+    )
+
+
+def _candle_values(candle: dict) -> tuple:
+    return (pd.Timestamp(candle["begin"]), float(candle["open"]), float(candle["high"]), float(candle["low"]),
+            float(candle["close"]), float(candle["value"]))
+
+
+def _percent_change(open_price: float, close_price: float) -> float:
+    return (close_price - open_price) / close_price * 100
+
+
+def _select_signal_moex(
+    security: str, interval: int, time, volume: float, smi_window: np.ndarray, vsa_value: float,
+    percent_change: float, prev_percent_change: float,
+) -> Signal | None:
     created = datetime.utcnow()
-    smi = df['SMI'][-13:-1].loc[(df['SMI'] < 0.065) & (df['SMI'] > -0.065)].size
-    vsa_value = range_dev[-1].round(2)
-    percent_change = ((df.iloc[-1]["close"] - df.iloc[-1]["open"]) \
-                      / df.iloc[-1]["close"] * 100).round(2)
+    smi_flat = smi_window[(smi_window < 0.065) & (smi_window > -0.065)]
     delta = None
     signal = None
     signal_kwargs = dict(pair=interval, time_frame=security, volume=volume, time=time, created=created, delta = delta,
                          percent_change=percent_change)
 
     if interval == 60:
-        if smi == 12 and volume > 30:
-            flat_value = df["SMI"][-13:-1].loc[(df["SMI"] < 0.065) & (df["SMI"] > -0.065)].mean().round(3)
+        if smi_flat.size == 12 and volume > 30:
+            flat_value = smi_flat.mean().round(3)
             signal = Signal(type=SignalType.FLAT_n_VOLUME, extra={"flat_value": flat_value}, **signal_kwargs)
 
         if (vsa_value >= 0.5 or vsa_value <= -0.5) and volume > 30:
             signal = Signal(type=SignalType.VSA, extra={"vsa_value": vsa_value}, **signal_kwargs)
 
         if volume > 50:
-            prev_percent_change = ((df.iloc[-2]["close"] - df.iloc[-2]["open"]) \
-                                   / df.iloc[-2]["close"] * 100).round(3)
             signal = Signal(type=SignalType.INCREASED_VOLUME, **signal_kwargs,
                             extra={"prev_percent_change": prev_percent_change})
     else:
-        if smi == 12 and volume > 10:
-            flat_value = df["SMI"][-13:-1].loc[(df["SMI"] < 0.065) & (df["SMI"] > -0.065)].mean().round(3)
+        if smi_flat.size == 12 and volume > 10:
+            flat_value = smi_flat.mean().round(3)
             signal = Signal(type=SignalType.FLAT_n_VOLUME, extra={"flat_value": flat_value}, **signal_kwargs)
 
         if (vsa_value >= 0.5 or vsa_value <= -0.5) and volume > 20:
             signal = Signal(type=SignalType.VSA, extra={"vsa_value": vsa_value}, **signal_kwargs)
 
         if volume > 20:
-            prev_percent_change = ((df.iloc[-2]["close"] - df.iloc[-2]["open"]) \
-                              / df.iloc[-2]["close"] * 100).round(3)
             signal = Signal(type=SignalType.INCREASED_VOLUME, **signal_kwargs,
                             extra={"prev_percent_change": prev_percent_change})
 
     logger.info(f"{security} {interval} pattern was {'' if signal else 'not'} found")
 
     return signal
-
-
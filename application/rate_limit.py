@@ -0,0 +1,218 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from enum import IntEnum
+from typing import Callable, Sequence
+
+__all__ = ["WeightBucket", "WeightScheduler", "Priority", "KLINES_WEIGHT", "AGG_TRADES_WEIGHT", "depth_weight",
+           "retry_after"]
+
+logger = logging.getLogger("rate_limit")
+
+# Request weight of GET /api/v3/klines, it does not depend on `limit`
+KLINES_WEIGHT = 2
+# Request weight of GET /api/v3/aggTrades
+AGG_TRADES_WEIGHT = 4
+# Binance answers 429 when the limit is exceeded and 418 when the IP is banned for ignoring 429s
+BACKOFF_STATUS_CODES = (429, 418)
+
+
+def depth_weight(limit: int) -> int:
+    """Request weight of GET /api/v3/depth for ``limit`` levels."""
+    for levels, weight in ((100, 5), (500, 25), (1000, 50)):
+        if limit <= levels:
+            return weight
+
+    return 250
+
+
+class Priority(IntEnum):
+    """Lower is served first."""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class WeightBucket:
+    """Token bucket for the Binance request weight limit.
+
+    Binance counts weight per IP for a rolling minute, so the bucket refills
+    ``limit`` tokens per ``period`` seconds. Every response carries the
+    ``X-MBX-USED-WEIGHT-1M`` header; ``observe`` uses it to correct the local
+    estimate when other processes share the same IP.
+    """
+
+    def __init__(self, limit: int = 6000, period: float = 60.0, reserve: int = 0) -> None:
+        self.limit = limit
+        self.period = period
+        self.reserve = reserve
+        self._rate = limit / period
+        self._tokens = float(limit - reserve)
+        self._updated = time.monotonic()
+        self._condition = threading.Condition()
+
+    @property
+    def available(self) -> float:
+        with self._condition:
+            self._refill()
+            return self._tokens
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        capacity = self.limit - self.reserve
+        self._tokens = min(capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def acquire(self, weight: int) -> float:
+        """Block until ``weight`` tokens are available and take them.
+
+        Returns the number of seconds spent waiting.
+        """
+        started = time.monotonic()
+        with self._condition:
+            while True:
+                self._refill()
+                if self._tokens >= weight:
+                    self._tokens -= weight
+                    return time.monotonic() - started
+
+                self._condition.wait((weight - self._tokens) / self._rate)
+
+    def observe(self, limit_usage: dict | None) -> None:
+        """Sync the bucket with the ``x-mbx-used-weight-1m`` response header."""
+        if not limit_usage:
+            return
+
+        used = limit_usage.get("x-mbx-used-weight-1m") or limit_usage.get("x-mbx-used-weight")
+        if used is None:
+            return
+
+        with self._condition:
+            self._refill()
+            self._tokens = min(self._tokens, self.limit - self.reserve - int(used))
+            self._condition.notify_all()
+
+
+def retry_after(error: Exception) -> float | None:
+    """``Retry-After`` seconds of a 429/418 error of either Binance client, 0 without the header, else None."""
+    if getattr(error, "status_code", None) not in BACKOFF_STATUS_CODES:
+        return None
+    headers = getattr(error, "header", None) or getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("Retry-After") or headers.get("retry-after")
+
+    return float(value) if value else 0.0
+
+
+class WeightScheduler(WeightBucket):
+    """``WeightBucket`` for every Binance request of a process, with pacing, priorities and backoff.
+
+    The collectors run as separate processes on one IP, the ``X-MBX-USED-WEIGHT-1M``
+    header every response brings back is their shared budget. On top of it:
+
+    - at most ``burst`` weight goes out at once, the rest at ``(limit - reserve) / period``
+      weight per second, so jobs starting at second 1 of a minute spread over it;
+    - waiters are served lowest ``priority`` first, in arrival order within one, and a
+      priority leaves ``headroom[priority]`` weight of the budget to the ones before it,
+      so low-priority jobs stop first when the IP gets close to the limit;
+    - a 429 or 418 pauses every request of the process for its ``Retry-After``.
+    """
+
+    def __init__(
+        self,
+        limit: int = 6000,
+        period: float = 60.0,
+        reserve: int = 0,
+        burst: int | None = None,
+        headroom: Sequence[int] = (0, 0, 0),
+        retries: int = 3,
+        backoff: float = 1.0,
+    ) -> None:
+        super().__init__(limit=limit, period=period, reserve=reserve)
+        self.burst = min(burst or limit - reserve, limit - reserve)
+        self.headroom = list(headroom)
+        self.retries = retries
+        self.backoff = backoff
+        self._paced = float(self.burst)
+        self._paused_until = 0.0
+        self._waiting: list[tuple[int, int]] = []
+        self._sequence = itertools.count()
+
+    def _refill(self) -> None:
+        elapsed = time.monotonic() - self._updated
+        super()._refill()
+        self._paced = min(self.burst, self._paced + elapsed * self._rate)
+
+    def _wait_time(self, weight: int, priority: int) -> float:
+        paused = self._paused_until - time.monotonic()
+        if paused > 0:
+            return paused
+
+        capacity = self.limit - self.reserve
+        missing = max(min(weight, self.burst) - self._paced,
+                      min(weight + self.headroom[min(priority, len(self.headroom) - 1)], capacity) - self._tokens)
+
+        return max(missing, 0.0) / self._rate
+
+    def acquire(self, weight: int, priority: int = Priority.NORMAL) -> float:
+        """Block until ``weight`` can be sent at ``priority`` and take it.
+
+        Returns the number of seconds spent waiting.
+        """
+        started = time.monotonic()
+        ticket = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    self._refill()
+                    wait = self._wait_time(weight, priority) if self._waiting[0] == ticket else None
+                    if wait == 0:
+                        heapq.heappop(self._waiting)
+                        self._tokens -= weight
+                        self._paced -= weight
+                        self._condition.notify_all()
+                        return time.monotonic() - started
+
+                    self._condition.wait(wait)
+            except BaseException:
+                if ticket in self._waiting:
+                    self._waiting.remove(ticket)
+                    heapq.heapify(self._waiting)
+                self._condition.notify_all()
+                raise
+
+    def pause(self, seconds: float) -> None:
+        """Hold every request for ``seconds``, the budget is treated as spent."""
+        with self._condition:
+            self._refill()
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+            self._paced = min(self._paced, 0.0)
+            self._condition.notify_all()
+
+    def request(self, weight: int, priority: int, func: Callable, *args, **kwargs):
+        """``func(*args, **kwargs)`` once the budget allows, retried after 429/418 responses.
+
+        binance-connector responses with ``limit_usage`` resync the bucket.
+        """
+        for attempt in range(self.retries + 1):
+            self.acquire(weight, priority)
+            try:
+                response = func(*args, **kwargs)
+            except Exception as e:
+                delay = retry_after(e)
+                if delay is None:
+                    raise
+                delay = delay or self.backoff * 2 ** attempt
+                logger.warning(f"Binance answered {e.status_code}, pausing requests for {delay:.1f}s")
+                self.pause(delay)
+                if attempt == self.retries:
+                    raise
+                continue
+
+            if isinstance(response, dict) and "limit_usage" in response:
+                self.observe(response["limit_usage"])
+            return response
@@ -0,0 +1,195 @@
+import logging
+from datetime import date, datetime, timezone
+
+from psycopg2 import sql
+from psycopg2._psycopg import connection, cursor as cursor_type
+
+__all__ = ["TABLES", "ensure_partitions", "migrate_table", "month_starts", "add_months"]
+
+logger = logging.getLogger("schema")
+
+# Columns after ``id`` and ``time``, the same as in db_init/init.sql
+TABLES = {
+    "bid_ask_ratio": """
+        pair                VARCHAR(12) NOT NULL,
+        bid_ask_ratio_total FLOAT,
+        bid_ask_ratio_50    FLOAT,
+        bid_ask_ratio_20    FLOAT,
+        bid_ask_ratio_8     FLOAT,
+        bid_ask_ratio_5     FLOAT,
+        bid_ask_ratio_3     FLOAT,
+        limit_density       VARCHAR(512),
+        total_orders        FLOAT,
+        sell_buy_ratio      FLOAT,
+        buy_sell_ratio      FLOAT,
+        delta               FLOAT
+    """,
+    "signals": """
+        type           VARCHAR(16),
+        time_frame     VARCHAR(12),
+        instrument     VARCHAR(12),
+        volume         FLOAT,
+        extra          VARCHAR(128),
+        delta          FLOAT,
+        exchange       VARCHAR(12),
+        percent_change FLOAT
+    """,
+    "agg_trade": """
+        pair              VARCHAR(16) NOT NULL,
+        buy_sum           FLOAT,
+        sell_sum          FLOAT,
+        buy_recent_qty    FLOAT,
+        sell_recent_qty   FLOAT,
+        buy_recent_count  INTEGER,
+        sell_recent_count INTEGER
+    """,
+}
+
+# Lookup column of the (column, time) index
+INDEXED = {"bid_ask_ratio": "pair", "signals": "instrument", "agg_trade": "pair"}
+
+# How the old VARCHAR time is read, MOEX candles are in Moscow time and the rest in UTC
+LEGACY_TIME = {
+    "bid_ask_ratio": "{time}::timestamp AT TIME ZONE 'UTC'",
+    "signals": "{time}::timestamp AT TIME ZONE CASE WHEN exchange = 'MOEX' THEN 'Europe/Moscow' ELSE 'UTC' END",
+    "agg_trade": "{time}::timestamp AT TIME ZONE 'UTC'",
+}
+
+
+def add_months(day: date, months: int) -> date:
+    """First day of the month ``months`` after ``day``'s."""
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def month_starts(first: date, last: date) -> list[date]:
+    """First days of the months from ``first``'s to the one after ``last``'s, the bounds of their partitions."""
+    months = [add_months(first, 0)]
+    while months[-1] <= last:
+        months.append(add_months(months[-1], 1))
+
+    return months
+
+
+def _create_table(cursor: cursor_type, table: str, name: str | None = None) -> None:
+    # Partitions and the index are named after `name`, the table's name once a migration renames it
+    name = name or table
+    cursor.execute(sql.SQL("""
+        CREATE TABLE IF NOT EXISTS {table} (
+            id   BIGINT GENERATED BY DEFAULT AS IDENTITY,
+            time TIMESTAMPTZ NOT NULL,
+            {columns},
+            PRIMARY KEY (id, time)
+        ) PARTITION BY RANGE (time)
+    """).format(table=sql.Identifier(table), columns=sql.SQL(TABLES[name].strip())))
+    cursor.execute(sql.SQL("CREATE INDEX IF NOT EXISTS {index} ON {table} ({column}, time)").format(
+        index=sql.Identifier(f"{name}_{INDEXED[name]}_time_idx"),
+        table=sql.Identifier(table),
+        column=sql.Identifier(INDEXED[name]),
+    ))
+    cursor.execute(sql.SQL("CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} DEFAULT").format(
+        partition=sql.Identifier(f"{name}_default"), table=sql.Identifier(table),
+    ))
+
+
+def _create_partitions(cursor: cursor_type, table: str, first: date, last: date, name: str | None = None) -> None:
+    months = month_starts(first, last)
+    for start, end in zip(months, months[1:]):
+        cursor.execute(sql.SQL(
+            "CREATE TABLE IF NOT EXISTS {partition} PARTITION OF {table} FOR VALUES FROM (%s) TO (%s)"
+        ).format(
+            partition=sql.Identifier(f"{name or table}_{start:%Y_%m}"), table=sql.Identifier(table),
+        ), (datetime(start.year, start.month, 1, tzinfo=timezone.utc), datetime(end.year, end.month, 1,
+                                                                               tzinfo=timezone.utc)))
+
+
+def _is_partitioned(cursor: cursor_type, table: str) -> bool:
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", (table,))
+    row = cursor.fetchone()
+    return bool(row) and row[0] == "p"
+
+
+def ensure_partitions(db_connection: connection, months_ahead: int = 3, tables: list[str] | None = None) -> None:
+    """Create the monthly partitions up to ``months_ahead`` months from now, before rows reach the default one."""
+    today = datetime.now(timezone.utc).date()
+
+    with db_connection.cursor() as cursor:  # type: cursor_type
+        for table in tables or TABLES:
+            if not _is_partitioned(cursor, table):
+                logger.warning(f"{table} is not partitioned yet, run `cli.py migrate-schema`")
+                continue
+            _create_partitions(cursor, table, today, add_months(today, months_ahead - 1))
+    db_connection.commit()
+
+
+def _columns(cursor: cursor_type, table: str) -> list[str]:
+    cursor.execute(
+        "SELECT column_name FROM information_schema.columns WHERE table_name = %s AND table_schema = current_schema() "
+        "ORDER BY ordinal_position", (table,)
+    )
+    return [row[0] for row in cursor.fetchall()]
+
+
+def migrate_table(db_connection: connection, table: str, chunk_size: int = 50_000, months_ahead: int = 3) -> int:
+    """Move a VARCHAR-time ``table`` into its partitioned ``TIMESTAMPTZ`` version, returns the copied rows.
+
+    Rows are copied by ``id`` in chunks of ``chunk_size``, one transaction each, while the
+    collectors keep writing. The last chunk and the rename run under an exclusive lock, the
+    old table stays as ``<table>_legacy``. Rows without a time are skipped. Columns that are
+    not in the new schema are dropped. A table that is already partitioned is left alone.
+    """
+    new_table, legacy_table = f"{table}_partitioned", f"{table}_legacy"
+    with db_connection.cursor() as cursor:  # type: cursor_type
+        if _is_partitioned(cursor, table):
+            logger.info(f"{table} is already partitioned")
+            return 0
+
+        cursor.execute(sql.SQL("SELECT min(id), max(id) FROM {table}").format(table=sql.Identifier(table)))
+        min_id, max_id = cursor.fetchone()
+        time = sql.SQL(LEGACY_TIME[table]).format(time=sql.Identifier("time"))
+        cursor.execute(sql.SQL("SELECT min({time}), max({time}) FROM {table} WHERE time IS NOT NULL").format(
+            time=time, table=sql.Identifier(table),
+        ))
+        first, last = cursor.fetchone()
+
+        _create_table(cursor, new_table, name=table)
+        today = datetime.now(timezone.utc).date()
+        _create_partitions(cursor, new_table, first.date() if first else today, add_months(today, months_ahead - 1),
+                           name=table)
+        db_connection.commit()
+
+        old_columns = set(_columns(cursor, table))
+        columns = [column for column in _columns(cursor, new_table) if column in old_columns and column != "time"]
+        copy = sql.SQL(
+            "INSERT INTO {new_table} (time, {columns}) SELECT {time}, {columns} FROM {table} "
+            "WHERE id > %s AND id <= %s AND time IS NOT NULL"
+        ).format(
+            new_table=sql.Identifier(new_table), table=sql.Identifier(table), time=time,
+            columns=sql.SQL(", ").join(map(sql.Identifier, columns)),
+        )
+
+        copied = 0
+        copied_to = (min_id or 1) - 1
+        while max_id is not None and copied_to < max_id:
+            cursor.execute(copy, (copied_to, copied_to + chunk_size))
+            copied += cursor.rowcount
+            copied_to += chunk_size
+            db_connection.commit()
+            logger.info(f"{table}: copied up to id {min(copied_to, max_id)} of {max_id}")
+
+        cursor.execute(sql.SQL("LOCK TABLE {table} IN EXCLUSIVE MODE").format(table=sql.Identifier(table)))
+        cursor.execute(copy, (copied_to, 2 ** 62))
+        copied += cursor.rowcount
+        cursor.execute(sql.SQL(
+            "SELECT setval(pg_get_serial_sequence(%s, 'id'), (SELECT coalesce(max(id), 0) + 1 FROM {table}), false)"
+        ).format(table=sql.Identifier(table)), (new_table,))
+        cursor.execute(sql.SQL("ALTER TABLE {table} RENAME TO {legacy}").format(
+            table=sql.Identifier(table), legacy=sql.Identifier(legacy_table),
+        ))
+        cursor.execute(sql.SQL("ALTER TABLE {new_table} RENAME TO {table}").format(
+            new_table=sql.Identifier(new_table), table=sql.Identifier(table),
+        ))
+        db_connection.commit()
+
+    logger.info(f"{table}: {copied} rows moved, the old table is kept as {legacy_table}")
+    return copied
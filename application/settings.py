@@ -1,3 +1,4 @@
+import os
 from enum import Enum
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -22,7 +23,7 @@ class Settings(BaseSettings):
     binance_api_secret: str = os.getenv('API_KEY_SECRET')
 
 
-pairs: list[str] = [
+    pairs: list[str] = [
         "BTCUSDT",
         "ETHUSDT",
         "BNBUSDT",
@@ -53,8 +54,57 @@ pairs: list[str] = [
 
     log_level: str = "INFO"
     log_format: LogFormatEnum = LogFormatEnum.json
+    # Stage timings on http://<metrics_host>:<metrics_port>/metrics, not served without a port
+    metrics_host: str = "0.0.0.0"
+    metrics_port: int | None = None
 
     db_dsn: str = 'dbname=main user=analyzer password=analyzer host=pg port=5432'
+    db_flush_size: int = 100
+    db_flush_interval: float = 5.0
+    db_pool_min_size: int = 1
+    db_pool_max_size: int = 5
+    db_pool_timeout: float = 30.0
+    db_health_check_interval: float = 30.0
+
+    telegram_queue_size: int = 1000
+    telegram_chat_interval: float = 1.0
+    telegram_retries: int = 5
+    telegram_backoff: float = 1.0
+
+    fetch_workers: int = 8
+    # Parse workers of the pipelines, fetching and parsing of different pairs overlap
+    compute_workers: int = 2
+    # Items a pipeline stage may be ahead of the next one
+    pipeline_queue_size: int = 100
+    kline_lookback: int = 50
+    backtest_dir: str | None = None
+    candle_store_dir: str | None = None
+    candle_store_capacity: int = 1000
+    streaming_indicators: bool = False
+    batch_indicators: bool = False
+    binance_pool_connections: int = 4
+    binance_pool_maxsize: int = 10
+    binance_weight_limit: int = 6000
+    binance_weight_reserve: int = 1000
+    # Weight sent at once, the rest is spread over the minute
+    binance_weight_burst: int = 1000
+    # Weight the HIGH, NORMAL and LOW priority requests leave to the ones before them
+    binance_weight_headroom: list[int] = [0, 500, 1500]
+    binance_retries: int = 3
+    binance_backoff: float = 1.0
+    moex_workers: int = 8
+    moex_timeout: float = 15.0
+    moex_retries: int = 3
+    moex_backoff: float = 1.0
+    moex_history_days: int = 50
+    moex_cache_dir: str | None = None
+    depth_limit: int = 5000
+    depth_stream: bool = False
+    depth_sample_seconds: int = 5
+    # Extra bid/ask ratio bands, name -> share of levels / distance from the mid price (0.01 is +-1%)
+    depth_level_bands: dict[str, float] = {}
+    depth_price_bands: dict[str, float] = {}
+    depth_archive_dir: str | None = None
 
     moex_pairs: list[str] = ['ABIO', 'ABRD', 'AFKS', 'AFLT', 'AGRO', 'AKRN', 'ALRS', 'AMEZ', 'APTK', 'AQUA', 'ARSA',
                              'ASSB', 'ASTR', 'AVAN', 'BANE', 'BANEP', 'BELU', 'BISVP', 'BLNG', 'BRZL', 'BSPB', 'BSPBP',
@@ -0,0 +1,61 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+__all__ = ["rolling_linregress", "range_deviation"]
+
+
+def rolling_linregress(x: np.ndarray, y: np.ndarray, window: int) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Slope, intercept and r of ``y ~ x`` over every trailing window along the last axis.
+
+    Gives the same values as calling ``scipy.stats.linregress`` on each window,
+    the first ``window - 1`` positions are NaN. A window with constant ``x`` or
+    ``y`` gets ``r == 0`` (scipy's convention) and a NaN slope.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+
+    slope = np.full(x.shape, np.nan)
+    intercept = np.full(x.shape, np.nan)
+    r = np.full(x.shape, np.nan)
+    if x.shape[-1] < window:
+        return slope, intercept, r
+
+    x_windows = sliding_window_view(x, window, axis=-1)
+    y_windows = sliding_window_view(y, window, axis=-1)
+    x_mean = x_windows.mean(axis=-1)
+    y_mean = y_windows.mean(axis=-1)
+    x_dev = x_windows - x_mean[..., None]
+    y_dev = y_windows - y_mean[..., None]
+    ssxm = (x_dev * x_dev).mean(axis=-1)
+    ssym = (y_dev * y_dev).mean(axis=-1)
+    ssxym = (x_dev * y_dev).mean(axis=-1)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        window_slope = ssxym / ssxm
+        window_r = np.clip(ssxym / np.sqrt(ssxm * ssym), -1.0, 1.0)
+    window_r[(ssxm == 0.0) | (ssym == 0.0)] = 0.0
+
+    slope[..., window - 1:] = window_slope
+    intercept[..., window - 1:] = y_mean - window_slope * x_mean
+    r[..., window - 1:] = window_r
+
+    return slope, intercept, r
+
+
+def range_deviation(norm_volume: np.ndarray, norm_range: np.ndarray, lookback: int) -> np.ndarray:
+    """VSA deviation of the candle range from the range predicted by its volume.
+
+    The regression of ``norm_range`` on ``norm_volume`` is fitted over the last
+    ``lookback`` candles. Weak or inverse fits (``slope <= 0`` or ``r < 0.2``)
+    give 0, the first ``2 * lookback`` positions are NaN.
+    """
+    norm_volume = np.asarray(norm_volume, dtype=float)
+    norm_range = np.asarray(norm_range, dtype=float)
+
+    slope, intercept, r = rolling_linregress(norm_volume, norm_range, lookback)
+    with np.errstate(invalid="ignore"):
+        range_dev = norm_range - (intercept + slope * norm_volume)
+        range_dev = np.where((slope <= 0.0) | (r < 0.2), 0.0, range_dev)
+    range_dev[..., :lookback * 2] = np.nan
+
+    return range_dev
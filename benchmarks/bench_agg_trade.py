@@ -0,0 +1,77 @@
+"""Aggregate trade totals: the DataFrame groupby of ``parse_agg_trade`` vs. ``agg_trade.trade_stats``.
+
+    python -m benchmarks.bench_agg_trade [--sizes 100 1000 10000]
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from agg_trade.trade_stats import side_totals
+
+AGG_TRADE_FIELDS = ['a', 'p', 'q', 'f', 'l', 'T', 'm', 'M']
+
+
+def groupby_totals(trades: list[dict]) -> tuple[float, float, int, int]:
+    # The DataFrame version parse_agg_trade used before agg_trade.trade_stats
+    df_trades = pd.DataFrame(trades, columns=AGG_TRADE_FIELDS)
+    df_trades['q'] = df_trades['q'].astype(float)
+    df_trades['count'] = df_trades['l'] - df_trades['f'] + 1
+    agg_df = df_trades.groupby('m').agg({'q': 'sum', 'count': 'sum'}).reindex([True, False], fill_value=0)
+
+    return agg_df.loc[False, 'q'], agg_df.loc[True, 'q'], int(agg_df.loc[False, 'count']), \
+        int(agg_df.loc[True, 'count'])
+
+
+def make_trades(size: int, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    first = np.cumsum(rng.integers(1, 5, size))
+    last = first + rng.integers(0, 3, size)
+
+    return [
+        {"a": i, "p": f"{price:.2f}", "q": f"{qty:.8f}", "f": int(f), "l": int(l), "T": 1_700_000_000_000 + i,
+         "m": bool(m), "M": True}
+        for i, (price, qty, f, l, m) in enumerate(zip(
+            42_000 + rng.normal(0, 5, size), rng.lognormal(-4, 1.5, size), first, last, rng.random(size) < 0.5
+        ))
+    ]
+
+
+def measure(func, trades: list[dict], repeat: int) -> tuple[float, int]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(trades)
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    func(trades)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return min(timings), peak
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1_000, 10_000])
+    args = parser.parse_args()
+
+    print(f"{'trades':>8} {'groupby, ms':>12} {'numpy, ms':>10} {'speedup':>8} {'groupby, KiB':>13} {'numpy, KiB':>11}")
+    for size in args.sizes:
+        trades = make_trades(size)
+        expected = groupby_totals(trades)
+        actual = side_totals(trades)
+        assert np.round(expected[:2], 3).tolist() == np.round(actual[:2], 3).tolist()
+        assert expected[2:] == actual[2:]
+
+        groupby_time, groupby_peak = measure(groupby_totals, trades, 20)
+        numpy_time, numpy_peak = measure(side_totals, trades, 20)
+        print(f"{size:>8} {groupby_time * 1e3:>12.3f} {numpy_time * 1e3:>10.3f} {groupby_time / numpy_time:>7.0f}x "
+              f"{groupby_peak / 1024:>13.0f} {numpy_peak / 1024:>11.0f}")
+
+
+if __name__ == "__main__":
+    main()
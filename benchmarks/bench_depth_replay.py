@@ -0,0 +1,72 @@
+"""Archive and replay a day of 5,000-level depth snapshots through ``parse_depth_data``.
+
+    python -m benchmarks.bench_depth_replay [--snapshots 1440] [--levels 5000]
+
+Needs the settings environment of the depth collector, ``bid_ask_ratio`` is imported
+the way its Docker image runs it.
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "application"))
+
+from application.depth_archive import DepthArchive, archive_path  # noqa: E402
+
+MINUTE = 60_000
+
+
+def make_snapshots(count: int, levels: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    mid = 42_000.0
+    bid_amount = rng.lognormal(0, 1, levels)
+    ask_amount = rng.lognormal(0, 1, levels)
+    for _ in range(count):
+        mid += rng.normal(0, 5)
+        changed = rng.integers(0, levels, levels // 20)
+        bid_amount[changed] = rng.lognormal(0, 1, changed.size)
+        ask_amount[rng.integers(0, levels, levels // 20)] = rng.lognormal(0, 1, changed.size)
+        bid_price = np.round(mid - 0.01 - np.arange(levels) * 0.01, 2)
+        ask_price = np.round(mid + np.arange(levels) * 0.01, 2)
+        yield {"bids": np.column_stack((bid_price, bid_amount)).tolist(),
+               "asks": np.column_stack((ask_price, ask_amount)).tolist()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--snapshots", type=int, default=1440)
+    parser.add_argument("--levels", type=int, default=5000)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    from bid_ask_ratio import replay_depth
+
+    with tempfile.TemporaryDirectory() as directory:
+        archive = DepthArchive(directory)
+        started = time.perf_counter()
+        for i, snapshot in enumerate(make_snapshots(args.snapshots, args.levels)):
+            archive.write("BTCUSDT", i * MINUTE, snapshot)
+        archive.close()
+        written = time.perf_counter() - started
+
+        path = archive_path(directory, "BTCUSDT", 0)
+        size = os.path.getsize(path)
+        raw = args.snapshots * args.levels * 2 * 2 * 4
+
+        started = time.perf_counter()
+        replayed = sum(1 for _ in replay_depth(path, "BTCUSDT"))
+        replay = time.perf_counter() - started
+
+    print(f"snapshots: {replayed}, levels: {args.levels}")
+    print(f"archive: {size / 2 ** 20:.1f} MiB ({raw / size:.1f}x smaller than raw float32), "
+          f"written in {written:.1f} s")
+    print(f"replay through parse_depth_data: {replay:.2f} s, {replayed / replay:,.0f} snapshots/s")
+
+
+if __name__ == "__main__":
+    main()
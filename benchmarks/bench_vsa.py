@@ -0,0 +1,76 @@
+"""Rolling VSA regression: per-window ``stats.linregress`` loop vs. ``application.vsa``.
+
+    python -m benchmarks.bench_vsa [--sizes 50 1000 100000]
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+from application.vsa import range_deviation
+
+NORM_LOOKBACK = 14
+
+
+def linregress_loop(df: pd.DataFrame, norm_lookback: int) -> np.ndarray:
+    # The loop parse_data and parse_data_moex used before application.vsa
+    norm_vol = df['norm_volume'].to_numpy()
+    norm_range = df['norm_range'].to_numpy()
+    range_dev = np.zeros(len(df))
+    range_dev[:] = np.nan
+    for i in range(norm_lookback * 2, len(df)):
+        window = df.iloc[i - norm_lookback + 1: i + 1]
+        slope, intercept, r_val, _, _ = stats.linregress(window['norm_volume'], window['norm_range'])
+        if slope <= 0.0 or r_val < 0.2:
+            range_dev[i] = 0.0
+            continue
+
+        pred_range = intercept + slope * norm_vol[i]
+        range_dev[i] = norm_range[i] - pred_range
+
+    return range_dev
+
+
+def make_frame(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    norm_volume = rng.lognormal(0.0, 0.5, size)
+    norm_range = 0.6 * norm_volume + rng.normal(0.0, 0.4, size)
+
+    return pd.DataFrame({'norm_volume': norm_volume, 'norm_range': norm_range})
+
+
+def best_of(func, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 1_000, 100_000])
+    args = parser.parse_args()
+
+    print(f"{'candles':>10} {'loop, ms':>12} {'vectorized, ms':>16} {'speedup':>10}")
+    for size in args.sizes:
+        df = make_frame(size)
+        norm_volume = df['norm_volume'].to_numpy()
+        norm_range = df['norm_range'].to_numpy()
+
+        expected = linregress_loop(df, NORM_LOOKBACK)
+        actual = range_deviation(norm_volume, norm_range, NORM_LOOKBACK)
+        assert np.allclose(expected, actual, equal_nan=True, rtol=1e-9, atol=1e-12)
+
+        repeat = 1 if size > 10_000 else 5
+        loop = best_of(lambda: linregress_loop(df, NORM_LOOKBACK), repeat)
+        vectorized = best_of(lambda: range_deviation(norm_volume, norm_range, NORM_LOOKBACK), 5)
+        print(f"{size:>10} {loop * 1e3:>12.2f} {vectorized * 1e3:>16.3f} {loop / vectorized:>9.0f}x")
+
+
+if __name__ == "__main__":
+    main()
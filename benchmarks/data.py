@@ -0,0 +1,67 @@
+"""Synthetic inputs for the benchmarks, in the formats the exchanges return them."""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+__all__ = ["make_klines", "make_moex_candles", "make_order_book", "make_trades"]
+
+HOUR_MS = 3_600_000
+
+
+def _walk(size: int, rng: np.random.Generator, start: float) -> tuple[np.ndarray, ...]:
+    close = start * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    open_ = np.concatenate(([start], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, size))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, size))
+    volume = rng.lognormal(8, 0.5, size)
+
+    return open_, high, low, close, volume
+
+
+def make_klines(size: int, seed: int = 0) -> list[list]:
+    """Hourly ``/api/v3/klines`` lines, prices and volumes as strings."""
+    rng = np.random.default_rng(seed)
+    open_, high, low, close, volume = _walk(size, rng, 42_000.0)
+    buy_volume = volume * rng.uniform(0.2, 0.8, size)
+    open_time = 1_700_000_000_000 - 1_700_000_000_000 % HOUR_MS + np.arange(size) * HOUR_MS
+
+    return [
+        [int(t), f"{o:.2f}", f"{h:.2f}", f"{lo:.2f}", f"{c:.2f}", f"{v:.5f}", int(t) + HOUR_MS - 1,
+         f"{v * c:.2f}", int(v), f"{b:.5f}", f"{b * c:.2f}", "0"]
+        for t, o, h, lo, c, v, b in zip(open_time, open_, high, low, close, volume, buy_volume)
+    ]
+
+
+def make_moex_candles(size: int, seed: int = 0) -> list[dict]:
+    """Daily board candles as ``apimoex.get_board_candles`` returns them."""
+    rng = np.random.default_rng(seed)
+    open_, high, low, close, volume = _walk(size, rng, 250.0)
+    start = datetime(2020, 1, 1)
+
+    return [
+        {"open": round(o, 2), "close": round(c, 2), "high": round(h, 2), "low": round(lo, 2), "value": v * c,
+         "volume": int(v), "begin": f"{start + timedelta(days=i):%Y-%m-%d %H:%M:%S}",
+         "end": f"{start + timedelta(days=i, hours=23, minutes=59, seconds=59):%Y-%m-%d %H:%M:%S}"}
+        for i, (o, h, lo, c, v) in enumerate(zip(open_, high, low, close, volume))
+    ]
+
+
+def make_order_book(levels: int, seed: int = 0) -> dict:
+    """``/api/v3/depth`` snapshot with ``levels`` bids and asks, prices and amounts as strings."""
+    rng = np.random.default_rng(seed)
+    mid = 42_000.0
+    bid_price = mid - 0.01 - np.arange(levels) * 0.01
+    ask_price = mid + np.arange(levels) * 0.01
+
+    return {
+        "lastUpdateId": 1,
+        "bids": [[f"{p:.2f}", f"{a:.5f}"] for p, a in zip(bid_price, rng.lognormal(0, 1, levels))],
+        "asks": [[f"{p:.2f}", f"{a:.5f}"] for p, a in zip(ask_price, rng.lognormal(0, 1, levels))],
+    }
+
+
+def make_trades(size: int, seed: int = 0) -> list[dict]:
+    """``/api/v3/aggTrades`` items."""
+    from benchmarks.bench_agg_trade import make_trades as make
+
+    return make(size, seed)
@@ -0,0 +1,175 @@
+"""Time and peak memory of the parse/compute hot paths, compared against a JSON baseline.
+
+    python -m benchmarks.suite --save                  # record benchmarks/baseline.json
+    python -m benchmarks.suite [--tolerance 0.2] [--memory-tolerance 0.2] [--groups klines depth]
+
+Runs offline on synthetic data. Every group runs in its own process: the depth and
+aggregate trade collectors are imported the way their Docker images run them, each with
+its own flat ``settings`` module, and the settings environment of the collectors must be
+set. Exits with 1 when a case is slower or uses more memory than the baseline allows.
+A baseline is only comparable on the machine it was recorded on.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable
+
+from benchmarks.data import make_klines, make_moex_candles, make_order_book, make_trades
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+
+Case = tuple[str, int, Callable[[], object]]
+
+
+def _klines_cases(sizes: list[int]) -> list[Case]:
+    from application.main import parse_batch, parse_data
+
+    cases = []
+    for size in sizes:
+        lines = make_klines(size)
+        batch = {f"PAIR{i}USDT": make_klines(size, seed=i) for i in range(22)}
+        cases.append(("parse_data", size, lambda lines=lines: parse_data("BTCUSDT", "1h", lines)))
+        cases.append(("parse_batch_22_pairs", size, lambda batch=batch: parse_batch("1h", batch)))
+
+    return cases
+
+
+def _moex_cases(sizes: list[int]) -> list[Case]:
+    from application.parse_n_send import parse_data_moex
+
+    return [("parse_data_moex", size, lambda candles=make_moex_candles(size): parse_data_moex("SBER", 24, candles))
+            for size in sizes]
+
+
+def _depth_cases(sizes: list[int]) -> list[Case]:
+    sys.path.insert(0, os.path.join(ROOT, "application"))
+    from bid_ask_ratio import parse_depth_data
+
+    return [("parse_depth_data", size,
+             lambda book=make_order_book(size): parse_depth_data(book, None, "BTCUSDT", 1_700_000_000_000))
+            for size in sizes]
+
+
+def _agg_trade_cases(sizes: list[int]) -> list[Case]:
+    trades = {size: make_trades(size) for size in sizes}
+    # The collector's flat imports resolve inside agg_trade/, the module itself is loaded from its
+    # file because "agg_trade" already names the directory here
+    sys.path.insert(0, os.path.join(ROOT, "agg_trade"))
+    spec = importlib.util.spec_from_file_location("agg_trade_collector", os.path.join(ROOT, "agg_trade", "agg_trade.py"))
+    collector = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(collector)
+
+    return [("parse_agg_trade", size, lambda trades=trades[size]: collector.parse_agg_trade(trades, "BTCUSDT"))
+            for size in sizes]
+
+
+GROUPS: dict[str, tuple[Callable[[list[int]], list[Case]], list[int]]] = {
+    "klines": (_klines_cases, [50, 500, 5_000]),
+    "moex": (_moex_cases, [50, 500, 5_000]),
+    "depth": (_depth_cases, [1_000, 5_000]),
+    "agg_trade": (_agg_trade_cases, [100, 1_000, 10_000]),
+}
+
+
+def measure(func: Callable[[], object], repeat: int) -> dict[str, float]:
+    """Best of ``repeat`` timed calls after a warm-up one, and the traced peak of one more call."""
+    func()
+    timings = []
+    for _ in range(repeat):
+        gc.collect()
+        started = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - started)
+
+    gc.collect()
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {"seconds": min(timings), "peak_bytes": peak}
+
+
+def run_group(group: str, repeat: int) -> dict[str, dict[str, float]]:
+    import logging
+    logging.disable(logging.CRITICAL)
+
+    make_cases, sizes = GROUPS[group]
+    return {f"{group}.{name}[{size}]": measure(func, repeat) for name, size, func in make_cases(sizes)}
+
+
+def compare(results: dict, baseline: dict, tolerance: float, memory_tolerance: float) -> list[str]:
+    """Cases that got slower than ``1 + tolerance`` or use more than ``1 + memory_tolerance`` of the baseline."""
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if base is None:
+            continue
+        if result["seconds"] > base["seconds"] * (1 + tolerance):
+            regressions.append(f"{case}: {result['seconds'] * 1e3:.3f} ms vs {base['seconds'] * 1e3:.3f} ms")
+        if result["peak_bytes"] > base["peak_bytes"] * (1 + memory_tolerance):
+            regressions.append(f"{case}: peak {result['peak_bytes'] / 1024:.0f} KiB vs "
+                               f"{base['peak_bytes'] / 1024:.0f} KiB")
+
+    return regressions
+
+
+def _machine() -> dict[str, str]:
+    return {"python": platform.python_version(), "machine": platform.machine(), "processor": platform.processor(),
+            "system": platform.platform()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--groups", nargs="+", choices=list(GROUPS), default=list(GROUPS))
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save", action="store_true", help="Record the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown, 0.2 is +20%%")
+    parser.add_argument("--memory-tolerance", type=float, default=0.2, help="Allowed peak memory growth")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    results = {}
+    for group in args.groups:
+        with context.Pool(1) as pool:
+            results.update(pool.apply(run_group, (group, args.repeat)))
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline) as file:
+            stored = json.load(file)
+        baseline = stored["results"]
+        if stored.get("machine") != _machine():
+            print(f"warning: the baseline was recorded on {stored.get('machine')}", file=sys.stderr)
+
+    print(f"{'case':<40} {'ms':>10} {'baseline':>10} {'change':>8} {'peak KiB':>10}")
+    for case, result in results.items():
+        base = baseline.get(case)
+        change = f"{result['seconds'] / base['seconds'] - 1:+.0%}" if base else "new"
+        base_ms = f"{base['seconds'] * 1e3:.3f}" if base else "-"
+        print(f"{case:<40} {result['seconds'] * 1e3:>10.3f} {base_ms:>10} {change:>8} "
+              f"{result['peak_bytes'] / 1024:>10.0f}")
+
+    if args.save:
+        with open(args.baseline, "w") as file:
+            json.dump({"machine": _machine(), "results": {**baseline, **results}}, file, indent=2, sort_keys=True)
+        print(f"Saved {len(results)} cases to {args.baseline}")
+        return
+
+    regressions = compare(results, baseline, args.tolerance, args.memory_tolerance)
+    if regressions:
+        print("Regressions:\n  " + "\n  ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,22 @@
 #!/usr/bin/env python
+import json
 import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import click
 from apscheduler.schedulers.background import BlockingScheduler
 from pytz import utc
-from application.db import connect_db
-from application.main import main
-from application.parse_n_send import main_moex
+from application.db import connect_db, connect_pool
+from application.backtest import fetch_history, run_backtest
+from application.candle_store import TIME_FRAME_MS
+from application.main import main, notifier, request_klines
+from application.metrics import configure_logging, metrics, serve_metrics
+from application.parse_n_send import main_moex, notifier_moex
+from application.schema import TABLES, ensure_partitions, migrate_table
+from application.settings import settings
 
-logging.basicConfig(level=logging.INFO)
+configure_logging(settings.log_level, settings.log_format)
 logger = logging.getLogger("cli")
 
 
@@ -19,14 +28,18 @@ def cli() -> None:
 @cli.command()
 def run_scheduler() -> None:
     logger.info("Run scheduler")
+    if settings.metrics_port:
+        serve_metrics(metrics, settings.metrics_host, settings.metrics_port)
 
     scheduler = BlockingScheduler(timezone=utc)
 
-    with connect_db() as db_connection:
-        scheduler.add_job(main, "cron", hour="*", minute=0, second=10, args=[db_connection, "1h"])
-        scheduler.add_job(main, "cron", hour="*/4", minute=0, second=20, args=[db_connection, "4h"])
-        scheduler.add_job(main, "cron", day="*", hour=0, minute=1, second=20, args=[db_connection, "1d"])
-        scheduler.add_job(main_moex, "cron", day_of_week='mon-fri', hour=15, args=[db_connection, 24])
+    with connect_pool() as pool:
+        pool.job(ensure_partitions)()
+        scheduler.add_job(pool.job(ensure_partitions), "cron", day="*", hour=0, minute=5)
+        scheduler.add_job(pool.job(main), "cron", hour="*", minute=0, second=10, args=["1h"])
+        scheduler.add_job(pool.job(main), "cron", hour="*/4", minute=0, second=20, args=["4h"])
+        scheduler.add_job(pool.job(main), "cron", day="*", hour=0, minute=1, second=20, args=["1d"])
+        scheduler.add_job(pool.job(main_moex), "cron", day_of_week='mon-fri', hour=15, args=[24])
 
         scheduler.start()
 
@@ -41,6 +54,8 @@ def run_once(time_frame: str) -> None:
     with connect_db() as db_connection:
         main(db_connection, time_frame)
 
+    notifier.wait()
+
 @cli.command()
 @click.option(
     "-i", "--interval", default=24, help='Interval', type=click.Choice([60, 24])
@@ -51,6 +66,54 @@ def run_once_moex(interval: int) -> None:
     with connect_db() as db_connection:
         main_moex(db_connection, interval)
 
+    notifier_moex.wait()
+
+
+@cli.command()
+@click.option("-c", "--chunk-size", default=50_000, help="Rows copied per transaction", type=int)
+def migrate_schema(chunk_size: int) -> None:
+    logger.info("Migrate tables to the partitioned schema")
+
+    with connect_db() as db_connection:
+        for table in TABLES:
+            migrate_table(db_connection, table, chunk_size=chunk_size)
+        ensure_partitions(db_connection)
+
+
+@cli.command()
+@click.option("-t", "--time-frame", default="1h", help="Time frame", type=click.Choice(list(TIME_FRAME_MS)))
+@click.option("-d", "--days", default=365, help="History length in days", type=int)
+@click.option("-p", "--pairs", default=None, help="Comma separated pairs, settings.pairs by default")
+@click.option("-w", "--workers", default=None, help="Processes, one per CPU by default", type=int)
+@click.option("--horizons", default="1,4,24", help="Forward return horizons in candles, comma separated")
+@click.option("-o", "--output", default=None, help="Write the report as JSON to this file")
+def backtest(time_frame: str, days: int, pairs: str | None, workers: int | None, horizons: str,
+             output: str | None) -> None:
+    """Replay stored klines through the signal rules and report signal counts and forward returns."""
+    pair_list = pairs.split(",") if pairs else settings.pairs
+    end = int(time.time() * 1000)
+    start = end - days * 86_400_000
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=settings.fetch_workers, thread_name_prefix="history") as executor:
+        futures = {pair: executor.submit(fetch_history, pair, time_frame, start, end, request_klines,
+                                         settings.backtest_dir) for pair in pair_list}
+        histories = {}
+        for pair, future in futures.items():
+            try:
+                histories[pair] = future.result()
+            except Exception:
+                logger.exception(f"Error occurred at loading the history of {pair}")
+    logger.info(f"Loaded {sum(map(len, histories.values()))} candles in {time.perf_counter() - started:.1f}s")
+
+    report = run_backtest(histories, settings.kline_lookback, tuple(int(h) for h in horizons.split(",")), workers)
+    report.update(time_frame=time_frame, days=days)
+
+    click.echo(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w") as file:
+            json.dump(report, file, indent=2)
+
 
 if __name__ == "__main__":
     cli()
@@ -1,7 +1,7 @@
 CREATE TABLE IF NOT EXISTS bid_ask_ratio (
-    id SERIAL PRIMARY KEY,
-    time VARCHAR(21),
-    pair VARCHAR(12),
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    time TIMESTAMPTZ NOT NULL,
+    pair VARCHAR(12) NOT NULL,
     bid_ask_ratio_total FLOAT,
     bid_ask_ratio_50 FLOAT,
     bid_ask_ratio_20 FLOAT,
@@ -12,29 +12,88 @@ CREATE TABLE IF NOT EXISTS bid_ask_ratio (
     total_orders FLOAT,
     sell_buy_ratio FLOAT,
     buy_sell_ratio FLOAT,
-    delta FLOAT
+    delta FLOAT,
+    PRIMARY KEY (id, time)
+) PARTITION BY RANGE (time);
 
-);
+CREATE INDEX IF NOT EXISTS bid_ask_ratio_pair_time_idx ON bid_ask_ratio (pair, time);
 
 CREATE TABLE IF NOT EXISTS signals (
-    id SERIAL PRIMARY KEY,
+    id BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    time TIMESTAMPTZ NOT NULL,
     type VARCHAR(16),
-    time_frame VARCHAR(4),
+    time_frame VARCHAR(12),
     instrument VARCHAR(12),
-    time VARCHAR(21),
     volume FLOAT,
     extra VARCHAR(128),
     delta FLOAT,
     exchange VARCHAR(12),
-    percent_change FLOAT
+    percent_change FLOAT,
+    PRIMARY KEY (id, time)
+) PARTITION BY RANGE (time);
 
-);
+CREATE INDEX IF NOT EXISTS signals_instrument_time_idx ON signals (instrument, time);
 
 CREATE TABLE IF NOT EXISTS agg_trade
 (
-    id       SERIAL PRIMARY KEY,
-    time     varchar(32),
-    pair     varchar(16),
-    buy_sum  float,
-    sell_sum float
-);
+    id                BIGINT GENERATED BY DEFAULT AS IDENTITY,
+    time              TIMESTAMPTZ NOT NULL,
+    pair              VARCHAR(16) NOT NULL,
+    buy_sum           FLOAT,
+    sell_sum          FLOAT,
+    buy_recent_qty    FLOAT,
+    sell_recent_qty   FLOAT,
+    buy_recent_count  INTEGER,
+    sell_recent_count INTEGER,
+    PRIMARY KEY (id, time)
+) PARTITION BY RANGE (time);
+
+CREATE INDEX IF NOT EXISTS agg_trade_pair_time_idx ON agg_trade (pair, time);
+
+-- Every row covers the trades read since the previous run (agg_trade/trade_cursor.py). The recent quantities are
+-- only set on rows written before the cursor, the first 15-second bucket of the last 1000 trades.
+COMMENT ON COLUMN agg_trade.buy_recent_qty IS 'Not written since the trade cursor, the row''s volume is buy_sum';
+COMMENT ON COLUMN agg_trade.sell_recent_qty IS 'Not written since the trade cursor, the row''s volume is sell_sum';
+COMMENT ON COLUMN agg_trade.buy_recent_count IS 'Taker buy trades of the row, l - f + 1 per aggregate trade';
+COMMENT ON COLUMN agg_trade.sell_recent_count IS 'Taker sell trades of the row, l - f + 1 per aggregate trade';
+
+-- Minute, 15 minute and hour sums of agg_trade, the collector keeps them in step (agg_trade/rollups.py)
+DO $$
+DECLARE
+    level TEXT;
+BEGIN
+    FOREACH level IN ARRAY ARRAY['1m', '15m', '1h'] LOOP
+        EXECUTE format('
+            CREATE TABLE IF NOT EXISTS %I (
+                pair              VARCHAR(16) NOT NULL,
+                time              TIMESTAMPTZ NOT NULL,
+                rows              INTEGER     NOT NULL,
+                buy_sum           FLOAT,
+                sell_sum          FLOAT,
+                buy_recent_count  BIGINT,
+                sell_recent_count BIGINT,
+                last_id           BIGINT      NOT NULL,
+                PRIMARY KEY (pair, time)
+            )', 'agg_trade_' || level);
+    END LOOP;
+END $$;
+
+-- Monthly partitions for the next three months, the scheduler keeps adding them (application/schema.py)
+DO $$
+DECLARE
+    table_name TEXT;
+    month      TIMESTAMPTZ;
+BEGIN
+    FOREACH table_name IN ARRAY ARRAY['bid_ask_ratio', 'signals', 'agg_trade'] LOOP
+        EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I DEFAULT', table_name || '_default', table_name);
+        FOR month IN
+            SELECT generate_series(date_trunc('month', now() AT TIME ZONE 'UTC'),
+                                   date_trunc('month', now() AT TIME ZONE 'UTC') + INTERVAL '2 months',
+                                   INTERVAL '1 month') AT TIME ZONE 'UTC'
+        LOOP
+            EXECUTE format('CREATE TABLE IF NOT EXISTS %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                           table_name || '_' || to_char(month AT TIME ZONE 'UTC', 'YYYY_MM'), table_name,
+                           month, month + INTERVAL '1 month');
+        END LOOP;
+    END LOOP;
+END $$;
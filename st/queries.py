@@ -0,0 +1,245 @@
+import math
+import threading
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import partial
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+__all__ = ["DEPTH_SERIES", "AGG_SERIES", "ROLLUP_LEVELS", "SeriesCache", "bucket_seconds", "rollup_level",
+           "depth_series", "agg_series", "depth_cache", "agg_cache", "lttb", "downsample"]
+
+# The dashboard's rolling(60) over one row a minute, as a time window
+ROLLING_WINDOW = timedelta(hours=1)
+# SQL buckets per chart point, LTTB picks the points out of them
+BUCKETS_PER_POINT = 4
+
+_BUCKET = "to_timestamp(floor(extract(epoch FROM {column}) / %(step)s) * %(step)s)"
+
+# Buckets start at their first second, a window of `window - step` before a bucket's start covers `window`
+_WINDOW = """WINDOW w AS (ORDER BY time
+                 RANGE BETWEEN make_interval(secs => greatest(%(window)s - %(step)s, 0)) PRECEDING AND CURRENT ROW)"""
+
+DEPTH_SERIES = ['time', '100%', '50%', '20%', '8%', '5%', 'delta', 'max_delta']
+
+_DEPTH_QUERY = f"""
+WITH buckets AS (
+    SELECT {_BUCKET.format(column='time')} AS time,
+           count(*) AS rows,
+           sum(bid_ask_ratio_total) AS total, sum(bid_ask_ratio_50) AS r50, sum(bid_ask_ratio_20) AS r20,
+           sum(bid_ask_ratio_8) AS r8, sum(bid_ask_ratio_5) AS r5,
+           sum(delta) AS delta, max(abs(delta)) AS max_delta
+    FROM bid_ask_ratio
+    WHERE pair = %(pair)s AND time >= %(start)s - make_interval(secs => %(window)s) AND time < %(end)s
+    GROUP BY 1
+), rolling AS (
+    SELECT time,
+           sum(total) OVER w / sum(rows) OVER w AS "100%%",
+           sum(r50) OVER w / sum(rows) OVER w AS "50%%",
+           sum(r20) OVER w / sum(rows) OVER w AS "20%%",
+           sum(r8) OVER w / sum(rows) OVER w AS "8%%",
+           sum(r5) OVER w / sum(rows) OVER w AS "5%%",
+           sum(delta) OVER w / sum(rows) OVER w AS delta,
+           max_delta
+    FROM buckets
+    {_WINDOW}
+)
+SELECT {', '.join(f'"{column}"' for column in DEPTH_SERIES).replace('%', '%%')}
+FROM rolling
+WHERE time >= %(start)s
+ORDER BY time
+"""
+
+AGG_SERIES = ['time', 'buy_flow', 'sell_flow', 'Count', 'Buy_volume', 'Sell_volume']
+
+# Rollup tables the agg_trade collector keeps (agg_trade/rollups.py), by bucket width in seconds
+ROLLUP_LEVELS = {"1m": 60, "15m": 15 * 60, "1h": 60 * 60}
+
+# Flows and count per minute of the span the window's buckets cover, count(*) buckets of `step` seconds each.
+# The volumes are per minute of the bucket itself.
+_AGG_QUERY = f"""
+WITH buckets AS (
+    SELECT {_BUCKET.format(column='time')} AS time,
+           sum(buy_sum) AS buy, sum(sell_sum) AS sell,
+           sum(buy_recent_count + sell_recent_count) AS count
+    FROM {{table}}
+    WHERE pair = %(pair)s AND time >= %(start)s - make_interval(secs => %(window)s) AND time < %(end)s
+    GROUP BY 1
+), rolling AS (
+    SELECT time,
+           sum(buy) OVER w / (count(*) OVER w * %(step)s / 60.0) AS buy_flow,
+           sum(sell) OVER w / (count(*) OVER w * %(step)s / 60.0) AS sell_flow,
+           sum(count) OVER w / (count(*) OVER w * %(step)s / 60.0) AS count,
+           buy / (%(step)s / 60.0) AS buy_volume,
+           sell / (%(step)s / 60.0) AS sell_volume
+    FROM buckets
+    {_WINDOW}
+)
+SELECT time, buy_flow, sell_flow, count AS "Count", buy_volume AS "Buy_volume", sell_volume AS "Sell_volume"
+FROM rolling
+WHERE time >= %(start)s
+ORDER BY time
+"""
+
+
+def bucket_seconds(start: datetime, end: datetime, points: int) -> int:
+    """Bucket width for ``points`` chart points over ``start`` - ``end``, whole minutes, at least one."""
+    span = (end - start).total_seconds() / (points * BUCKETS_PER_POINT)
+    return max(1, math.ceil(span / 60)) * 60
+
+
+def rollup_level(step: int, levels: list[str]) -> str:
+    """The coarsest of ``levels`` whose buckets add up to ``step``-second ones, else the finest."""
+    fitting = [level for level in levels if step % ROLLUP_LEVELS[level] == 0]
+    return max(fitting or [min(levels, key=ROLLUP_LEVELS.get)], key=ROLLUP_LEVELS.get)
+
+
+def _series(cursor, query: str, columns: list[str], pair: str, start: datetime, end: datetime,
+            step: int) -> pd.DataFrame:
+    window = ROLLING_WINDOW.total_seconds()
+    cursor.execute(query, dict(pair=pair, start=start, end=end, step=step, window=window))
+    df = pd.DataFrame(cursor.fetchall(), columns=columns)
+    df[columns[1:]] = df[columns[1:]].astype(float)
+
+    return df
+
+
+def depth_series(cursor, pair: str, start: datetime, end: datetime, step: int) -> pd.DataFrame:
+    """Rolling bid/ask ratios and delta of ``pair`` in ``step``-second buckets."""
+    return _series(cursor, _DEPTH_QUERY, DEPTH_SERIES, pair, start, end, step)
+
+
+def agg_series(cursor, pair: str, start: datetime, end: datetime, step: int,
+               levels: list[str] = tuple(ROLLUP_LEVELS)) -> pd.DataFrame:
+    """Rolling per-minute taker flow and trade count, and the taker volume of ``pair`` in ``step``-second buckets.
+
+    Reads the agg_trade rollup of ``levels`` that fits ``step`` best, never ``agg_trade`` itself.
+    """
+    query = _AGG_QUERY.format(table=f"agg_trade_{rollup_level(step, list(levels))}")
+    return _series(cursor, query, AGG_SERIES, pair, start, end, step)
+
+
+def _normalize_depth(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    df['Delta'] = df['delta'] / (df['max_delta'].max() or float('nan'))
+
+    return df
+
+
+def _normalize_agg(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    for column, flow in (('Buy_flow', 'buy_flow'), ('Sell_flow', 'sell_flow')):
+        low, high = df[flow].min(), df[flow].max()
+        df[column] = (df[flow] - low) / ((high - low) or float('nan'))
+
+    return df
+
+
+@dataclass
+class _Series:
+    df: pd.DataFrame
+    last_id: int
+    step: int
+
+
+class SeriesCache:
+    """Bucketed series of one table per (pair, period), shared by every dashboard session.
+
+    The first ``get`` loads the period. Later ones run ``last_id_query`` for ids above
+    the last seen one and, when there are any, re-query only from the last bucket on:
+    the rolling windows of the older buckets can't change. Normalizations over the
+    whole period are applied to the combined frame by ``finish``.
+    """
+
+    def __init__(self, last_id_query: str, load: Callable[..., pd.DataFrame],
+                 finish: Callable[[pd.DataFrame], pd.DataFrame]) -> None:
+        self.load = load
+        self.finish = finish
+        self._last_id_query = last_id_query
+        self._series: dict[tuple[str, timedelta], _Series] = {}
+        self._lock = threading.Lock()
+
+    def get(self, cursor, pair: str, start: datetime, end: datetime, points: int) -> pd.DataFrame:
+        key = (pair, end - start)
+        step = bucket_seconds(start, end, points)
+        with self._lock:
+            cached = self._series.get(key)
+            if cached is None or cached.step != step:
+                cached = _Series(pd.DataFrame(columns=['time']), 0, step)
+                tail = start
+            else:
+                tail = cached.df['time'].iloc[-1] if len(cached.df) else start
+
+            cursor.execute(self._last_id_query, dict(pair=pair, last_id=cached.last_id, since=tail))
+            last_id = cursor.fetchone()[0]
+            if last_id is None and len(cached.df):
+                df = cached.df
+            else:
+                fresh = self.load(cursor, pair, max(tail, start), end, step)
+                kept = cached.df[cached.df['time'] < tail]
+                df = pd.concat([kept, fresh], ignore_index=True) if len(kept) else fresh
+            df = df[df['time'] >= start].reset_index(drop=True)
+
+            self._series[key] = _Series(df, last_id or cached.last_id, step)
+
+        return self.finish(df)
+
+
+def depth_cache() -> SeriesCache:
+    return SeriesCache("SELECT max(id) FROM bid_ask_ratio WHERE pair = %(pair)s AND id > %(last_id)s",
+                       depth_series, _normalize_depth)
+
+
+def agg_cache(levels: list[str] = tuple(ROLLUP_LEVELS)) -> SeriesCache:
+    # Every level folds in the same agg_trade ids, the finest one has the fewest rows to check per bucket
+    finest = min(levels, key=ROLLUP_LEVELS.get)
+    return SeriesCache(
+        f"SELECT max(last_id) FROM agg_trade_{finest} "
+        f"WHERE pair = %(pair)s AND time >= %(since)s AND last_id > %(last_id)s",
+        partial(agg_series, levels=list(levels)), _normalize_agg,
+    )
+
+
+def lttb(x: np.ndarray, y: np.ndarray, threshold: int) -> np.ndarray:
+    """Indices of the ``threshold`` points Largest-Triangle-Three-Buckets keeps out of ``(x, y)``.
+
+    The first and last points are always kept. In each bucket in between, the point
+    forming the largest triangle with the previously kept point and the next bucket's
+    average wins. NaNs never win over a real value.
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = np.linspace(1, size - 1, threshold - 1).astype(np.int64)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0], indices[-1] = 0, size - 1
+
+    kept = 0
+    for bucket in range(threshold - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        next_end = edges[bucket + 2] if bucket + 2 < len(edges) else size
+        next_x = x[end:next_end].mean()
+        next_y = np.nanmean(y[end:next_end]) if not np.isnan(y[end:next_end]).all() else y[kept]
+        area = np.abs((x[kept] - next_x) * (y[start:end] - y[kept]) - (x[kept] - x[start:end]) * (next_y - y[kept]))
+        kept = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[bucket + 1] = kept
+
+    return indices
+
+
+def downsample(df: pd.DataFrame, columns: list[str], points: int, x: str = 'time') -> pd.DataFrame:
+    """Rows of ``df`` that LTTB keeps for any of ``columns``, at most ``points`` rows in total."""
+    if len(df) <= points:
+        return df
+
+    moments = pd.to_datetime(df[x]).astype('int64').to_numpy() / 1e9
+    threshold = max(3, points // len(columns))
+    keep = np.unique(np.concatenate([lttb(moments, df[column].to_numpy(dtype=float), threshold)
+                                     for column in columns]))
+
+    return df.iloc[keep].reset_index(drop=True)
@@ -56,6 +56,12 @@ class Settings(BaseSettings):
 
     db_dsn: str = 'dbname=main user=analyzer password=analyzer host=pg port=5432'
 
+    binance_pool_connections: int = 4
+    binance_pool_maxsize: int = 10
+
+    chart_points: int = 2000
+    agg_rollup_levels: list[str] = ["1m", "15m", "1h"]
+
     moex_pairs: list[str] = ['ABIO', 'ABRD', 'AFKS', 'AFLT', 'AGRO', 'AKRN', 'ALRS', 'AMEZ', 'APTK', 'AQUA', 'ARSA',
                              'ASSB', 'ASTR', 'AVAN', 'BANE', 'BANEP', 'BELU', 'BISVP', 'BLNG', 'BRZL', 'BSPB', 'BSPBP',
                              'CARM', 'CBOM', 'CHGZ', 'CHKZ', 'CHMF', 'CHMK', 'CIAN', 'CNTL', 'CNTLP', 'DIOD', 'DSKY',
@@ -3,46 +3,57 @@ import plotly.express as px
 import pandas as pd
 import psycopg2
 from binance.client import Client
+from requests.adapters import HTTPAdapter
 from settings import settings
+from queries import SeriesCache, agg_cache, depth_cache, downsample
 import time
+from datetime import datetime, timedelta, timezone
 
+PERIODS = {'1d': timedelta(days=1), '5d': timedelta(days=5), '10d': timedelta(days=10),
+           '1m': timedelta(days=30), '3m': timedelta(days=90)}
 
-def load_figures(pair: str) -> pd.DataFrame:
-    conn = psycopg2.connect(dbname="main", user="analyzer", password="analyzer", host="pg")
-    cursor = conn.cursor()
-
-    cursor.execute(f"SELECT * FROM bid_ask_ratio WHERE pair = '{pair}' ORDER BY id DESC ")
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-
-    df = pd.DataFrame(data,
-                      columns=['id', 'time', 'pair', 'bid_ask_ratio_total', 'bid_ask_ratio_50', 'bid_ask_ratio_20',
-                               'bid_ask_ratio_8', 'bid_ask_ratio_5', 'bid_ask_ratio_3',
-                               'limit_density', 'total_orders', 'sell_buy_ratio', 'buy_sell_ratio', 'delta',
-                               'bid_density_total', 'ask_density_total', 'bid_density_50', 'ask_density_50',
-                               'bid_density_20', 'ask_density_20', 'bid_density_8', 'ask_density_8', 'bid_density_5',
-                               'ask_density_5', 'bid_density_3', 'ask_density_3'])
-    df['time'] = pd.to_datetime(df['time'])
-    df = df.sort_values(by='time')
-    df['Normalized delta'] = df['delta'] / df['delta'].abs().max()
-    df['Delta'] = df['Normalized delta'].rolling(60).mean()
-
-    if pair in ['BTCUSDT', 'ETHUSDT']:
-        df['100%'] = df['bid_ask_ratio_total'].rolling(60).mean()
-        df['50%'] = df['bid_ask_ratio_50'].rolling(60).mean()
-        df['20%'] = df['bid_ask_ratio_20'].rolling(60).mean()
-    else:
-        df['8%'] = df['bid_ask_ratio_8'].rolling(60).mean()
-        df['5%'] = df['bid_ask_ratio_5'].rolling(60).mean()
-        df['20%'] = df['bid_ask_ratio_20'].rolling(60).mean()
 
-    return df
+@st.cache_resource
+def binance_client() -> Client:
+    # One client per server process, shared by every session and rerun
+    client = Client(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
+    adapter = HTTPAdapter(pool_connections=settings.binance_pool_connections,
+                          pool_maxsize=settings.binance_pool_maxsize)
+    client.session.mount('https://', adapter)
+    return client
+
+
+@st.cache_resource
+def db_connection() -> psycopg2.extensions.connection:
+    # One connection per server process, reads only, so no transaction is left open between reruns
+    conn = psycopg2.connect(settings.db_dsn)
+    conn.autocommit = True
+    return conn
+
+
+@st.cache_resource
+def series_caches() -> dict[str, SeriesCache]:
+    return {'depth': depth_cache(), 'agg': agg_cache(settings.agg_rollup_levels)}
+
+
+def load_series(name: str, pair: str, start: datetime, end: datetime) -> pd.DataFrame:
+    for attempt in range(2):
+        try:
+            with db_connection().cursor() as cursor:
+                return series_caches()[name].get(cursor, pair, start, end, settings.chart_points)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            # The server restarted or dropped the idle connection, reconnect once
+            db_connection.clear()
+            if attempt:
+                raise
+
+
+def load_figures(pair: str, start: datetime, end: datetime) -> pd.DataFrame:
+    return load_series('depth', pair, start, end)
 
 
 def fetch_book(pair: str) -> object:
-    client = Client(api_key=settings.binance_api_key, api_secret=settings.binance_api_secret)
-    data = client.get_order_book(symbol=pair, limit=5000)
+    data = binance_client().get_order_book(symbol=pair, limit=5000)
     bids = data['bids']
     asks = data['asks']
     df_bids = pd.DataFrame(bids)
@@ -59,32 +70,12 @@ def fetch_book(pair: str) -> object:
                         color_discrete_sequence=["green", "red"])
 
 
-def fetch_agg_trades(pair: str) -> object:
-    conn = psycopg2.connect(dbname="main", user="analyzer", password="analyzer", host="pg")
-    cursor = conn.cursor()
-    cursor.execute(f"SELECT * FROM agg_trade WHERE pair = '{pair}' ")
-    data = cursor.fetchall()
-    cursor.close()
-    conn.close()
-    df = pd.DataFrame(data, columns=['id', 'time', 'pair', 'buy', 'sell', 'buy_recent_qty', 'sell_recent_qty',
-                                     'buy_recent_count', 'sell_recent_count'])
-
-    df['time'] = pd.to_datetime(df['time'])
-    df['time'] = df['time'].dt.floor(freq='min')
-    result = df.groupby('time').sum()[['buy', 'sell', 'buy_recent_qty', 'sell_recent_qty', 'buy_recent_count',
-                                       'sell_recent_count']]
-    result = result.reset_index()
-    result['Buy_flow'] = result['buy'].rolling(60).mean()
-    result['Sell_flow'] = result['sell'].rolling(60).mean()
-    result['Buy_flow'] = (result['Buy_flow'] - result['Buy_flow'].min()) /\
-                         (result['Buy_flow'].max() - result['Buy_flow'].min())
-    result['Sell_flow'] = (result['Sell_flow'] - result['Sell_flow'].min()) /\
-                         (result['Sell_flow'].max() - result['Sell_flow'].min())
-    result['Count'] = (result['buy_recent_count'] + result['sell_recent_count']).rolling(60).mean()
-    result['Buy_qty'] = result['buy_recent_qty'].rolling(60).mean()
-    result['Sell_qty'] = result['sell_recent_qty'].rolling(60).mean()
-
-    return result
+def fetch_agg_trades(pair: str, start: datetime, end: datetime) -> pd.DataFrame:
+    return load_series('agg', pair, start, end)
+
+
+def line_chart(df: pd.DataFrame, columns: list[str], **kwargs) -> object:
+    return px.line(downsample(df, columns, settings.chart_points), x='time', y=columns, **kwargs)
 
 
 st.set_page_config(
@@ -95,9 +86,12 @@ st.set_page_config(
 st.title('Analyzer')
 instrument = st.selectbox('Select the instrument', ('BTCUSDT', 'ETHUSDT', 'SOLUSDT', 'XRPUSDT', 'DOGEUSDT', 'SHIBUSDT',
         'ADAUSDT'))
+period = st.selectbox('Period', list(PERIODS), index=2)
+end = datetime.now(timezone.utc)
+start = end - PERIODS[period]
 
 col1, col2 = st.columns(2)
-main_df = load_figures(instrument)
+main_df = load_figures(instrument, start, end)
 
 dict_settings = dict(
         rangeselector=dict(
@@ -117,14 +111,14 @@ dict_settings = dict(
              ])
         ),
         rangeslider=dict(visible=True),
-        range=[main_df['time'].to_list()[-3500], main_df['time'].to_list()[-1]],
+        range=[start, end],
         type="date")
 
 with col1:
     if instrument in ['BTCUSDT', 'ETHUSDT']:
-        bid_ask_ratio = px.line(main_df, x='time', y=['100%', '50%', '20%'])
+        bid_ask_ratio = line_chart(main_df, ['100%', '50%', '20%'])
     else:
-        bid_ask_ratio = px.line(main_df, x='time', y=['20%', '8%', '5%'])
+        bid_ask_ratio = line_chart(main_df, ['20%', '8%', '5%'])
     bid_ask_ratio.update_layout(xaxis=dict_settings)
 
     st.subheader('Bid ask ratio')
@@ -135,30 +129,31 @@ with col2:
     st.plotly_chart(book)
 
 col3, col4 = st.columns(2)
-agg_df = fetch_agg_trades(instrument)
+agg_df = fetch_agg_trades(instrument, start, end)
 with col3:
-    limit_density = px.line(main_df, x='time', y=['Delta'])
+    limit_density = line_chart(main_df, ['Delta'])
     limit_density.update_layout(xaxis=dict_settings)
     st.subheader('Normalized Delta')
     st.plotly_chart(limit_density)
 
 with col4:
-    agg_trade_graph = px.line(agg_df, x='time', y=['Buy_flow', 'Sell_flow'], color_discrete_sequence=["green", "red"])
+    agg_trade_graph = line_chart(agg_df, ['Buy_flow', 'Sell_flow'], color_discrete_sequence=["green", "red"])
     agg_trade_graph.update_layout(xaxis=dict_settings)
     st.subheader('Aggregated trades')
     st.plotly_chart(agg_trade_graph)
 
 col5, col6 = st.columns(2)
 with col5:
-    trades_quant = px.line(agg_df, x='time', y=['Count'])
+    trades_quant = line_chart(agg_df, ['Count'])
     trades_quant.update_layout(xaxis=dict_settings)
     st.subheader('Quantity trades')
     st.plotly_chart(trades_quant)
 
 with col6:
-    trades_qty = px.line(agg_df, x='time', y=['Buy_qty', 'Sell_qty'], color_discrete_sequence=["green", "red"])
+    trades_qty = line_chart(agg_df, ['Buy_volume', 'Sell_volume'], color_discrete_sequence=["green", "red"])
     trades_qty.update_layout(xaxis=dict_settings)
-    st.subheader('Qty recent trades')
+    st.subheader('Taker volume')
+    st.caption('Taker buy / sell volume per minute of every point, not rolled over the hour.')
     st.plotly_chart(trades_qty)
 
 time.sleep(300)
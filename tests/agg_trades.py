@@ -0,0 +1,31 @@
+"""Aggregate trades for the agg_trade tests, and the DataFrame totals ``side_totals`` replaced."""
+import numpy as np
+import pandas as pd
+
+AGG_TRADE_FIELDS = ['a', 'p', 'q', 'f', 'l', 'T', 'm', 'M']
+
+
+def agg_trade(qty: str, first: int, last: int, is_sell: bool) -> dict:
+    return {"a": first, "p": "42000.00", "q": qty, "f": first, "l": last, "T": 1_700_000_000_000, "m": is_sell,
+            "M": True}
+
+
+def random_trades(size: int, seed: int) -> list[dict]:
+    """Both sides mixed, aggregates of one to three trades."""
+    rng = np.random.default_rng(seed)
+    first = np.cumsum(rng.integers(1, 5, size))
+    last = first + rng.integers(0, 3, size)
+
+    return [agg_trade(f"{qty:.8f}", int(f), int(l), bool(m))
+            for qty, f, l, m in zip(rng.lognormal(-4, 1.5, size), first, last, rng.random(size) < 0.5)]
+
+
+def groupby_totals(trades: list[dict]) -> tuple[float, float, int, int]:
+    # The groupby parse_agg_trade used before agg_trade.trade_stats
+    df_trades = pd.DataFrame(trades, columns=AGG_TRADE_FIELDS)
+    df_trades['q'] = df_trades['q'].astype(float)
+    df_trades['count'] = df_trades['l'] - df_trades['f'] + 1
+    agg_df = df_trades.groupby('m').agg({'q': 'sum', 'count': 'sum'}).reindex([True, False], fill_value=0)
+
+    return agg_df.loc[False, 'q'], agg_df.loc[True, 'q'], int(agg_df.loc[False, 'count']), \
+        int(agg_df.loc[True, 'count'])
@@ -0,0 +1,44 @@
+import importlib.util
+import sys
+from pathlib import Path
+
+import pytest
+
+from agg_trades import agg_trade
+
+AGG_TRADE = Path(__file__).parent.parent / "agg_trade"
+
+
+@pytest.fixture(scope="module")
+def collector():
+    # The collector's flat imports resolve inside agg_trade/, the module itself is loaded from its file
+    # because "agg_trade" already names the directory here
+    modules = set(sys.modules)
+    sys.path.insert(0, str(AGG_TRADE))
+    spec = importlib.util.spec_from_file_location("agg_trade_collector", AGG_TRADE / "agg_trade.py")
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    yield module
+
+    sys.path.remove(str(AGG_TRADE))
+    for name in set(sys.modules) - modules:
+        if str(AGG_TRADE) in str(getattr(sys.modules[name], "__file__", "")):
+            del sys.modules[name]
+
+
+def test_parse_agg_trade(collector) -> None:
+    trades = [agg_trade("0.1234", 1, 3, False), agg_trade("0.5", 4, 4, True), agg_trade("0.0011", 5, 6, True)]
+
+    agg = collector.parse_agg_trade(trades, "BTCUSDT")
+
+    assert agg.pair == "BTCUSDT"
+    assert (agg.buy_sum, agg.sell_sum) == (0.12, 0.5)
+    assert (agg.buy_recent_count, agg.sell_recent_count) == (3, 3)
+    assert agg.time.tzinfo is not None
+
+
+def test_parse_agg_trade_empty(collector) -> None:
+    agg = collector.parse_agg_trade([], "BTCUSDT")
+
+    assert collector.agg_values(agg)[2:] == (0.0, 0.0, 0, 0)
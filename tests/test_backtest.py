@@ -0,0 +1,88 @@
+import numpy as np
+import pandas as pd
+
+from application.backtest import RULES, backtest_pair, fetch_history, rolling_normalized_delta, run_backtest
+
+HOUR = 3_600_000
+
+
+def make_history(size: int, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    open_ = np.concatenate(([100.0], close[:-1]))
+    high = np.maximum(open_, close) * (1 + rng.uniform(0, 0.01, size))
+    low = np.minimum(open_, close) * (1 - rng.uniform(0, 0.01, size))
+    volume = rng.lognormal(8, 0.5, size)
+    volume[rng.integers(0, size, size // 50)] *= 8
+    buy_volume = volume * rng.uniform(0.2, 0.8, size)
+
+    return np.column_stack((np.arange(size) * HOUR, open_, high, low, close, volume, buy_volume))
+
+
+class Klines:
+    """klines endpoint over `size` hourly candles."""
+
+    def __init__(self, size: int) -> None:
+        self.history = make_history(size)
+        self.requests = []
+
+    def __call__(self, pair: str, time_frame: str, limit: int, start_time: int) -> list:
+        self.requests.append(start_time)
+        rows = self.history[self.history[:, 0] >= start_time][:limit]
+        return [[int(row[0]), *row[1:6], 0, 0, 0, row[6], 0, 0] for row in rows]
+
+
+def test_rolling_normalized_delta() -> None:
+    history = make_history(300)
+    volume, buy_volume = history[:, 5], history[:, 6]
+    delta = pd.Series(buy_volume - (volume - buy_volume))
+    expected = (delta - delta.rolling(50).mean()) / delta.rolling(50).std()
+
+    np.testing.assert_allclose(rolling_normalized_delta(volume, buy_volume, 50), expected.to_numpy(), rtol=1e-9)
+
+
+def test_fetch_history_pages_and_caches(tmp_path) -> None:
+    klines = Klines(2500)
+    end = 2500 * HOUR
+
+    history = fetch_history("BTCUSDT", "1h", 0, end, klines, str(tmp_path))
+
+    assert len(history) == 2500
+    assert klines.requests == [0, 1000 * HOUR, 2000 * HOUR]
+
+    again = fetch_history("BTCUSDT", "1h", 100 * HOUR, end, klines, str(tmp_path))
+    assert len(again) == 2400 and again[0, 0] == 100 * HOUR
+    assert len(klines.requests) == 3
+
+
+def test_fetch_history_drops_unfinished_candle() -> None:
+    history = fetch_history("BTCUSDT", "1h", 0, 10 * HOUR + 1, Klines(11))
+
+    assert len(history) == 10
+
+
+def test_backtest_pair() -> None:
+    history = make_history(3000)
+
+    result = backtest_pair("BTCUSDT", history, lookback=50, horizons=(1, 24))
+
+    assert result.bars == 3000
+    assert set(result.rules) == set(RULES)
+    assert sum(stats.signals for stats in result.rules.values()) > 0
+    for stats in result.rules.values():
+        assert stats.return_count[24] <= stats.return_count[1] <= stats.signals
+
+
+def test_short_history() -> None:
+    result = backtest_pair("BTCUSDT", make_history(30), lookback=50, horizons=(1,))
+
+    assert all(stats.signals == 0 for stats in result.rules.values())
+
+
+def test_run_backtest() -> None:
+    report = run_backtest({"BTCUSDT": make_history(2000), "ETHUSDT": make_history(2000, seed=1)}, 50, (1, 4),
+                          workers=2)
+
+    assert report["bars"] == 4000
+    assert set(report["pairs"]) == {"BTCUSDT", "ETHUSDT"}
+    assert report["rules"]["vsa"]["signals"] == report["pairs"]["BTCUSDT"]["vsa"] + report["pairs"]["ETHUSDT"]["vsa"]
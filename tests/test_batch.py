@@ -0,0 +1,98 @@
+import dataclasses
+
+import numpy as np
+import pandas as pd
+import pandas_ta as ta  # noqa
+import pytest
+
+from application.batch import NORM_LOOKBACK, KlineBatch, compute_indicators, rule_masks
+from application.main import parse_batch, parse_data
+from application.vsa import range_deviation
+
+HOUR = 3_600_000
+SIZE = 50
+
+
+def _lines(seed: int, spike: bool = False) -> list:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, SIZE))
+    open_price = close + rng.normal(0, 0.5, SIZE)
+    high = np.maximum(close, open_price) + rng.random(SIZE)
+    low = np.minimum(close, open_price) - rng.random(SIZE)
+    volume = rng.lognormal(8, 1, SIZE)
+    buy_volume = volume * rng.random(SIZE)
+    if spike:
+        # Taker buying of the last closed candle far above the rest
+        volume[-2] *= 20
+        buy_volume[-2] = volume[-2] * 0.95
+
+    return [
+        [i * HOUR, str(open_price[i]), str(high[i]), str(low[i]), str(close[i]), str(volume[i]), i * HOUR + HOUR - 1,
+         "0", 1, str(buy_volume[i]), "0", "0"]
+        for i in range(SIZE)
+    ]
+
+
+@pytest.fixture
+def batch() -> KlineBatch:
+    return KlineBatch.from_lines({f"PAIR{seed}": _lines(seed) for seed in range(5)})
+
+
+def test_from_lines(batch: KlineBatch) -> None:
+    assert batch.pairs == [f"PAIR{seed}" for seed in range(5)]
+    assert batch.close.shape == (5, SIZE)
+    assert batch.open_time[0, 1] == HOUR
+    assert (batch.volume == np.trunc(batch.volume)).all()
+
+
+def test_indicators_match_pandas(batch: KlineBatch) -> None:
+    indicators = compute_indicators(batch)
+
+    for row in range(len(batch.pairs)):
+        close = pd.Series(batch.close[row])
+        volume = pd.Series(batch.volume[row])
+        ema_5 = volume.ewm(span=5, adjust=False).mean()
+        ema_10 = volume.ewm(span=10, adjust=False).mean()
+        delta = pd.Series(batch.buy_volume[row]) - (volume - batch.buy_volume[row])
+        high, low = pd.Series(batch.high[row]), pd.Series(batch.low[row])
+        atr = ta.atr(high, low, close, NORM_LOOKBACK)
+        norm_range = (high - low) / atr
+        norm_volume = volume / volume.rolling(NORM_LOOKBACK).median()
+        range_dev = range_deviation(norm_volume.to_numpy(), norm_range.to_numpy(), NORM_LOOKBACK)
+
+        np.testing.assert_allclose(indicators.vo[row], (ema_5 - ema_10) / ema_10 * 100)
+        np.testing.assert_allclose(indicators.smi[row], ta.smi(close, fast=5, slow=20, signal=5)["SMIo_5_20_5"],
+                                   atol=1e-12)
+        np.testing.assert_allclose(indicators.normalized_delta[row], (delta - delta.mean()) / delta.std())
+        np.testing.assert_allclose(indicators.atr[row], atr, rtol=1e-10)
+        np.testing.assert_allclose(indicators.norm_range[row], norm_range, rtol=1e-10)
+        np.testing.assert_allclose(indicators.range_dev[row], range_dev, rtol=1e-8, atol=1e-10)
+        assert np.isnan(indicators.range_dev[row, :2 * NORM_LOOKBACK]).all()
+        assert not np.isnan(indicators.range_dev[row, 2 * NORM_LOOKBACK:]).any()
+
+
+def test_rule_masks_shape(batch: KlineBatch) -> None:
+    masks = rule_masks(compute_indicators(batch))
+
+    assert set(masks) == {"flat", "vsa", "increased_volume"}
+    for mask in masks.values():
+        assert mask.shape == (5, SIZE)
+        assert mask.dtype == bool
+    assert not masks["flat"][:, :12].any()
+
+
+def test_parse_batch_matches_parse_data() -> None:
+    lines_by_pair = {f"PAIR{seed}": _lines(seed, spike=seed % 2 == 0) for seed in range(6)}
+
+    signals = parse_batch("1h", lines_by_pair)
+
+    assert set(signals) == set(lines_by_pair)
+    assert any(signals.values())
+    for pair, lines in lines_by_pair.items():
+        # Same argument order as main() uses for parse_data
+        expected = parse_data("1h", pair, lines)
+        signal = signals[pair]
+        if expected is None:
+            assert signal is None, pair
+        else:
+            assert dataclasses.replace(signal, created=expected.created) == expected, pair
@@ -0,0 +1,36 @@
+from benchmarks.data import make_klines, make_moex_candles, make_order_book
+from benchmarks.suite import compare, measure
+
+
+def test_compare() -> None:
+    baseline = {"a[1]": {"seconds": 1.0, "peak_bytes": 1000}, "b[1]": {"seconds": 1.0, "peak_bytes": 1000}}
+    results = {
+        "a[1]": {"seconds": 1.1, "peak_bytes": 1100},
+        "b[1]": {"seconds": 1.3, "peak_bytes": 1300},
+        "new[1]": {"seconds": 9.0, "peak_bytes": 9000},
+    }
+
+    regressions = compare(results, baseline, tolerance=0.2, memory_tolerance=0.2)
+
+    assert len(regressions) == 2
+    assert all(line.startswith("b[1]") for line in regressions)
+
+
+def test_measure() -> None:
+    result = measure(lambda: [0] * 100_000, repeat=2)
+
+    assert result["seconds"] > 0
+    assert result["peak_bytes"] >= 800_000
+
+
+def test_synthetic_data() -> None:
+    klines = make_klines(100)
+    assert len(klines) == 100 and len(klines[0]) == 12
+    assert klines[1][0] - klines[0][0] == 3_600_000
+
+    book = make_order_book(5000)
+    assert len(book["bids"]) == len(book["asks"]) == 5000
+    assert float(book["bids"][0][0]) < float(book["asks"][0][0])
+
+    candles = make_moex_candles(10)
+    assert all(candle["low"] <= min(candle["open"], candle["close"]) for candle in candles)
@@ -0,0 +1,46 @@
+from pathlib import Path
+
+from application.candle_store import CandleStore
+
+PAIR = "BTCUSDT"
+TIME_FRAME = "1h"
+HOUR = 3_600_000
+
+
+def _line(open_time: int, close: str = "1.5") -> list:
+    return [open_time, "1", "2", "0.5", close, "10", open_time + HOUR - 1, "0", 1, "5", "0", "0"]
+
+
+def test_merge_replaces_unfinished_candle() -> None:
+    store = CandleStore()
+    store.merge(PAIR, TIME_FRAME, [_line(0), _line(HOUR), _line(2 * HOUR, close="1.6")])
+
+    store.merge(PAIR, TIME_FRAME, [_line(2 * HOUR, close="1.7"), _line(3 * HOUR)])
+
+    window = store.window(PAIR, TIME_FRAME, 3)
+    assert [line[0] for line in window] == [HOUR, 2 * HOUR, 3 * HOUR]
+    assert window[1][4] == "1.7"
+
+
+def test_last_close_time_skips_unfinished_candle() -> None:
+    store = CandleStore()
+    store.merge(PAIR, TIME_FRAME, [_line(0), _line(HOUR)])
+
+    assert store.last_close_time(PAIR, TIME_FRAME, now=HOUR + 10) == HOUR - 1
+    assert store.last_close_time("ETHUSDT", TIME_FRAME, now=HOUR + 10) is None
+
+
+def test_capacity() -> None:
+    store = CandleStore(capacity=2)
+
+    store.merge(PAIR, TIME_FRAME, [_line(0), _line(HOUR), _line(2 * HOUR)])
+
+    assert [line[0] for line in store.window(PAIR, TIME_FRAME, 50)] == [HOUR, 2 * HOUR]
+
+
+def test_persisted_between_instances(tmp_path: Path) -> None:
+    CandleStore(str(tmp_path)).merge(PAIR, TIME_FRAME, [_line(0), _line(HOUR)])
+
+    store = CandleStore(str(tmp_path))
+
+    assert store.window(PAIR, TIME_FRAME, 50) == [_line(0), _line(HOUR)]
@@ -0,0 +1,57 @@
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from agg_trade import clients as agg_trade_clients
+from application import clients as application_clients
+
+
+class Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so the client can send every request over one connection
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        body = b'{"serverTime": 1700000000000}'
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize("module", [application_clients, agg_trade_clients])
+def test_spot_reuses_one_connection(module, server_url: str) -> None:
+    registry = module.ClientRegistry("key", "secret", pool_connections=2, pool_maxsize=3)
+    spot = registry.spot()
+    spot.base_url = server_url
+
+    for _ in range(5):
+        assert spot.time()["data"] == {"serverTime": 1700000000000}
+
+    assert registry.spot() is spot
+    assert registry.stats() == {"opened": 1, "requests": 5, "reused": 4}
+
+
+@pytest.mark.parametrize("module", [application_clients, agg_trade_clients])
+def test_pool_sizes_reach_the_adapter(module) -> None:
+    spot = module.ClientRegistry("key", "secret", pool_connections=2, pool_maxsize=3).spot()
+
+    for url in ("https://api.binance.com", "http://127.0.0.1"):
+        poolmanager = spot.session.get_adapter(url).poolmanager
+        assert poolmanager.pools._maxsize == 2
+        assert poolmanager.connection_pool_kw["maxsize"] == 3
@@ -0,0 +1,71 @@
+import threading
+
+import pytest
+from psycopg2._psycopg import connection, cursor as cursor_type
+
+from application.db import ConnectionPool, PoolTimeout
+from application.settings import settings
+
+
+@pytest.fixture
+def pool() -> ConnectionPool:
+    pool = ConnectionPool(settings.db_dsn, min_size=1, max_size=2, timeout=0.2, health_check_interval=0.0)
+    try:
+        yield pool
+    finally:
+        pool.close()
+
+
+def test_job_gets_its_own_connection(pool: ConnectionPool) -> None:
+    seen = []
+    barrier = threading.Barrier(2)
+
+    def job(db_connection: connection) -> None:
+        seen.append(db_connection)
+        barrier.wait(timeout=1)
+
+    threads = [threading.Thread(target=pool.job(job)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert seen[0] is not seen[1]
+    assert pool.stats()["checkouts"] == 2
+    assert pool.stats()["in_use"] == 0
+
+
+def test_timeout_when_exhausted(pool: ConnectionPool) -> None:
+    with pool.connection(), pool.connection():
+        with pytest.raises(PoolTimeout):
+            with pool.connection():
+                pass
+
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_reconnects_after_drop(pool: ConnectionPool) -> None:
+    with pool.connection() as db_connection:
+        db_connection.close()
+
+    with pool.connection() as db_connection:
+        with db_connection.cursor() as cursor:  # type: cursor_type
+            cursor.execute("SELECT 1")
+            assert cursor.fetchone() == (1,)
+
+
+def test_dead_idle_connection_is_replaced(pool: ConnectionPool, connection_db: connection) -> None:
+    with pool.connection() as db_connection:
+        with db_connection.cursor() as cursor:  # type: cursor_type
+            cursor.execute("SELECT pg_backend_pid()")
+            pid = cursor.fetchone()[0]
+
+    with connection_db.cursor() as cursor:  # type: cursor_type
+        cursor.execute("SELECT pg_terminate_backend(%s)", (pid,))
+    connection_db.commit()
+
+    with pool.connection() as db_connection:
+        with db_connection.cursor() as cursor:  # type: cursor_type
+            cursor.execute("SELECT 1")
+
+    assert pool.stats()["reconnects"] == 1
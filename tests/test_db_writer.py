@@ -0,0 +1,59 @@
+from psycopg2._psycopg import connection, cursor as cursor_type
+
+from application.db_writer import BatchWriter
+
+COLUMNS = ("type", "pair", "time_frame", "time", "CDL_PATTERN")
+
+
+def _count(db_connection: connection) -> int:
+    with db_connection.cursor() as cursor:  # type: cursor_type
+        cursor.execute("SELECT count(*) FROM signals")
+        return cursor.fetchone()[0]
+
+
+def test_flush_returns_ids_in_order(connection_db: connection) -> None:
+    saved = []
+    before = _count(connection_db)
+
+    with BatchWriter(connection_db, "signals", COLUMNS, flush_size=10) as writer:
+        for time in range(3):
+            writer.add(("VSA", "BTCUSDT", "1h", time, "VSA"), on_saved=saved.append)
+        assert saved == []
+
+    assert len(saved) == 3
+    assert saved == sorted(saved)
+    assert _count(connection_db) == before + 3
+
+
+def test_flush_size(connection_db: connection) -> None:
+    saved = []
+
+    writer = BatchWriter(connection_db, "signals", COLUMNS, flush_size=2)
+    writer.add(("VSA", "BTCUSDT", "1h", 0, "VSA"), on_saved=saved.append)
+    writer.add(("VSA", "BTCUSDT", "1h", 1, "VSA"), on_saved=saved.append)
+
+    assert len(saved) == 2
+
+
+def test_bad_row_only_loses_itself(connection_db: connection) -> None:
+    before = _count(connection_db)
+
+    with BatchWriter(connection_db, "signals", COLUMNS) as writer:
+        writer.add(("VSA", "BTCUSDT", "1h", 0, "VSA"))
+        writer.add(("VSA", None, "1h", 1, "VSA"))
+        writer.add(("VSA", "ETHUSDT", "1h", 2, "VSA"))
+        ids = writer.flush()
+
+    assert ids[1] is None
+    assert None not in (ids[0], ids[2])
+    assert _count(connection_db) == before + 2
+
+
+def test_on_timing(connection_db: connection) -> None:
+    timings = []
+
+    with BatchWriter(connection_db, "signals", COLUMNS, on_timing=lambda *timing: timings.append(timing)) as writer:
+        writer.add(("VSA", "BTCUSDT", "1h", 0, "VSA"))
+        writer.add(("VSA", "ETHUSDT", "1h", 1, "VSA"))
+
+    assert [(rows, ok) for _, rows, ok in timings] == [(2, True)]
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from application.depth import BookSides, DepthBand, band_ratios, level_bands
+
+BANDS = level_bands({'50': 0.5, '20': 0.2, '8': 0.08, '5': 0.05, '3': 0.03})
+
+
+def _book(bids: int, asks: int, seed: int = 0) -> dict:
+    rng = np.random.default_rng(seed)
+    bid_prices = 100 - np.arange(bids) * 0.01
+    ask_prices = 100.01 + np.arange(asks) * 0.01
+
+    return {
+        "bids": [[f"{price:.2f}", f"{amount:.8f}"] for price, amount in zip(bid_prices, rng.lognormal(0, 1, bids))],
+        "asks": [[f"{price:.2f}", f"{amount:.8f}"] for price, amount in zip(ask_prices, rng.lognormal(0, 1, asks))],
+    }
+
+
+def _pandas_ratios(data: dict) -> dict[str, float]:
+    # The DataFrame version of parse_depth_data for books with sides of equal length
+    df = pd.concat([pd.DataFrame(data["bids"]), pd.DataFrame(data["asks"])], axis=1)
+    df.columns = ['price_bid', 'amount_bid', 'price_ask', 'amount_ask']
+    df = df.astype(float)
+    ratios = {"total": ((df['amount_bid'].sum() - df['amount_ask'].sum()) /
+                        (df['amount_bid'].sum() + df['amount_ask'].sum())).round(2)}
+    for band in BANDS:
+        depth = round(len(df) * band.fraction)
+        ratios[band.name] = ((df['amount_bid'][:depth].sum() - df['amount_ask'][:depth].sum()) /
+                             (df['amount_bid'][:depth].sum() + df['amount_ask'][:depth].sum())).round(2)
+
+    return ratios
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_level_bands_match_pandas(seed: int) -> None:
+    data = _book(5000, 5000, seed)
+
+    ratios = band_ratios(BookSides.from_depth(data), BANDS)
+
+    assert ratios == pytest.approx(_pandas_ratios(data), abs=0.01)
+
+
+def test_uneven_sides_keep_the_deeper_one() -> None:
+    data = {"bids": [["10", "1"], ["9", "1"], ["8", "1"], ["7", "1"]], "asks": [["11", "1"], ["12", "1"]]}
+    sides = BookSides.from_depth(data)
+
+    assert sides.sums() == (4.0, 2.0)
+    assert sides.sums(DepthBand("50", fraction=0.5)) == (2.0, 2.0)
+    assert band_ratios(sides, [])["total"] == 0.33
+
+
+def test_price_bands() -> None:
+    data = {"bids": [["99.5", "1"], ["99", "2"], ["97", "4"]], "asks": [["100.5", "3"], ["102", "5"]]}
+    sides = BookSides.from_depth(data)
+
+    assert sides.mid == 100.0
+    assert sides.sums(DepthBand("1%", distance=0.01)) == (3.0, 3.0)
+    assert sides.sums(DepthBand("5%", distance=0.05)) == (7.0, 8.0)
+    assert band_ratios(sides, [DepthBand("2%", distance=0.02)])["2%"] == -0.45
@@ -0,0 +1,111 @@
+import os
+
+import numpy as np
+import pytest
+
+from application.depth_archive import DepthArchive, archive_path, read_archive
+
+DAY = 86_400_000
+
+
+def _snapshots(count: int, levels: int = 500, seed: int = 0) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    bids = np.column_stack((100 - np.arange(levels) * 0.01, rng.lognormal(0, 1, levels)))
+    asks = np.column_stack((100.01 + np.arange(levels) * 0.01, rng.lognormal(0, 1, levels)))
+
+    snapshots = []
+    for _ in range(count):
+        # A few levels change between snapshots, the book also grows and shrinks
+        bids[rng.integers(0, levels, 10), 1] = rng.lognormal(0, 1, 10)
+        asks[rng.integers(0, levels, 10), 1] = rng.lognormal(0, 1, 10)
+        size = levels - int(rng.integers(0, 5))
+        snapshots.append({"bids": [[str(price), str(qty)] for price, qty in bids[:size]],
+                          "asks": asks[:levels - int(rng.integers(0, 5))].tolist()})
+
+    return snapshots
+
+
+def test_roundtrip(tmp_path) -> None:
+    archive = DepthArchive(str(tmp_path), keyframe_interval=7)
+    snapshots = _snapshots(20)
+    for i, snapshot in enumerate(snapshots):
+        archive.write("BTCUSDT", i * 1000, snapshot)
+    archive.close()
+
+    replayed = list(read_archive(archive_path(str(tmp_path), "BTCUSDT", 0)))
+
+    assert [time_ms for time_ms, _ in replayed] == [i * 1000 for i in range(20)]
+    for (_, data), snapshot in zip(replayed, snapshots):
+        np.testing.assert_array_equal(data["bids"], np.asarray(snapshot["bids"], dtype=np.float32))
+        np.testing.assert_array_equal(data["asks"], np.asarray(snapshot["asks"], dtype=np.float32))
+
+
+def test_delta_encoding_is_compact(tmp_path) -> None:
+    archive = DepthArchive(str(tmp_path))
+    for i, snapshot in enumerate(_snapshots(50)):
+        archive.write("BTCUSDT", i * 1000, snapshot)
+    archive.close()
+
+    raw_size = 50 * 2 * 500 * 2 * 4
+    assert os.path.getsize(archive_path(str(tmp_path), "BTCUSDT", 0)) < raw_size / 5
+
+
+def test_daily_files_and_restart(tmp_path) -> None:
+    snapshots = _snapshots(4)
+    archive = DepthArchive(str(tmp_path))
+    archive.write("BTCUSDT", DAY - 1000, snapshots[0])
+    archive.write("BTCUSDT", DAY, snapshots[1])
+    archive.close()
+
+    # A restarted collector appends to the same day file
+    archive = DepthArchive(str(tmp_path))
+    archive.write("BTCUSDT", DAY + 1000, snapshots[2])
+    archive.close()
+
+    assert len(list(read_archive(archive_path(str(tmp_path), "BTCUSDT", 0)))) == 1
+    replayed = list(read_archive(archive_path(str(tmp_path), "BTCUSDT", DAY)))
+    assert [time_ms for time_ms, _ in replayed] == [DAY, DAY + 1000]
+    np.testing.assert_array_equal(replayed[1][1]["asks"], np.asarray(snapshots[2]["asks"], dtype=np.float32))
+
+
+def test_truncated_record_ends_replay(tmp_path) -> None:
+    archive = DepthArchive(str(tmp_path))
+    for i, snapshot in enumerate(_snapshots(3)):
+        archive.write("BTCUSDT", i * 1000, snapshot)
+    archive.close()
+    path = archive_path(str(tmp_path), "BTCUSDT", 0)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 10)
+
+    assert len(list(read_archive(path))) == 2
+
+
+def test_append_after_truncated_record(tmp_path) -> None:
+    snapshots = _snapshots(5)
+    archive = DepthArchive(str(tmp_path))
+    for i, snapshot in enumerate(snapshots[:3]):
+        archive.write("BTCUSDT", i * 1000, snapshot)
+    archive.close()
+    path = archive_path(str(tmp_path), "BTCUSDT", 0)
+    with open(path, "r+b") as file:
+        file.truncate(os.path.getsize(path) - 10)
+
+    # The restarted collector drops the cut record and appends after the last complete one
+    archive = DepthArchive(str(tmp_path))
+    for i, snapshot in enumerate(snapshots[3:], start=3):
+        archive.write("BTCUSDT", i * 1000, snapshot)
+    archive.close()
+
+    replayed = list(read_archive(path))
+    assert [time_ms for time_ms, _ in replayed] == [0, 1000, 3000, 4000]
+    for (_, data), snapshot in zip(replayed, snapshots[:2] + snapshots[3:]):
+        np.testing.assert_array_equal(data["bids"], np.asarray(snapshot["bids"], dtype=np.float32))
+        np.testing.assert_array_equal(data["asks"], np.asarray(snapshot["asks"], dtype=np.float32))
+
+
+def test_not_an_archive(tmp_path) -> None:
+    path = tmp_path / "other.depth"
+    path.write_bytes(b"something else")
+
+    with pytest.raises(ValueError):
+        list(read_archive(str(path)))
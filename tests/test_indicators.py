@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pandas_ta as ta  # noqa
+import pytest
+
+from application.indicators import ATR, EMA, SMI, IndicatorState, RollingMedian
+from application.vsa import range_deviation
+
+SIZE = 120
+
+
+@pytest.fixture
+def candles() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    close = 100 + np.cumsum(rng.normal(0, 1, SIZE))
+    open_price = close + rng.normal(0, 0.5, SIZE)
+
+    return pd.DataFrame({
+        "open": open_price,
+        "high": np.maximum(close, open_price) + rng.random(SIZE),
+        "low": np.minimum(close, open_price) - rng.random(SIZE),
+        "close": close,
+        "volume": rng.lognormal(8, 0.5, SIZE).astype(int).astype(float),
+    })
+
+
+def test_ema(candles: pd.DataFrame) -> None:
+    ema = EMA(5)
+
+    result = [ema.update(value) for value in candles["volume"]]
+
+    np.testing.assert_allclose(result, candles["volume"].ewm(span=5, adjust=False).mean())
+
+
+def test_atr(candles: pd.DataFrame) -> None:
+    atr = ATR(14)
+
+    result = [atr.update(*row) for row in candles[["high", "low", "close"]].itertuples(index=False)]
+
+    np.testing.assert_allclose(result, ta.atr(candles["high"], candles["low"], candles["close"], 14))
+
+
+def test_smi(candles: pd.DataFrame) -> None:
+    smi = SMI(fast=5, slow=20, signal=5)
+
+    result = [smi.update(value) for value in candles["close"]]
+
+    np.testing.assert_allclose(result, ta.smi(candles["close"], fast=5, slow=20, signal=5)["SMIo_5_20_5"])
+
+
+def test_rolling_median(candles: pd.DataFrame) -> None:
+    median = RollingMedian(14)
+
+    result = [median.update(value) for value in candles["volume"]]
+
+    np.testing.assert_allclose(result, candles["volume"].rolling(14).median())
+
+
+def test_indicator_state_vsa_and_vo(candles: pd.DataFrame) -> None:
+    state = IndicatorState(history=SIZE)
+    for row in candles.itertuples(index=True):
+        state.update(row.Index, row.open, row.high, row.low, row.close, row.volume)
+
+    atr = ta.atr(candles["high"], candles["low"], candles["close"], 14)
+    norm_range = (candles["high"] - candles["low"]) / atr
+    norm_volume = candles["volume"] / candles["volume"].rolling(14).median()
+    ema_5 = candles["volume"].ewm(span=5, adjust=False).mean()
+    ema_10 = candles["volume"].ewm(span=10, adjust=False).mean()
+
+    history = list(state.history)
+    np.testing.assert_allclose([values["vsa"] for values in history],
+                               range_deviation(norm_volume.to_numpy(), norm_range.to_numpy(), 14), atol=1e-12)
+    np.testing.assert_allclose([values["vo"] for values in history], (ema_5 - ema_10) / ema_10 * 100)
+
+
+def test_indicator_state_preview_keeps_state(candles: pd.DataFrame) -> None:
+    state = IndicatorState()
+    for row in candles.iloc[:-1].itertuples(index=True):
+        state.update(row.Index, row.open, row.high, row.low, row.close, row.volume, row.volume / 2)
+    last = candles.iloc[-1]
+
+    preview = state.preview(SIZE - 1, last.open, last.high, last.low, last.close, last.volume, last.volume / 2)
+
+    assert state.last_time == SIZE - 2
+    assert preview.last_time == SIZE - 1
+    assert preview.count == state.count + 1
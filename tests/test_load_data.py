@@ -2,19 +2,33 @@ import pytest
 from binance.error import ServerError
 from requests_mock import Mocker
 
+from application import main
+from application.candle_store import CandleStore
 from application.main import load_data
 
 TIME_FRAME = "1d"
 PAIR = "BTCUSD"
+DAY = 86_400_000
+# Two daily klines as /api/v3/klines returns them
+KLINES = [
+    [day * DAY, "42000.00", "43000.00", "41000.00", "42500.00", "1000.5", day * DAY + DAY - 1, "42250000.0", 1500,
+     "600.25", "25500000.0", "0"]
+    for day in (19_700, 19_701)
+]
+
+
+@pytest.fixture(autouse=True)
+def candle_store(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Klines stored by one test would otherwise answer the next one
+    monkeypatch.setattr(main, "candle_store", CandleStore())
 
 
 def test_success(requests_mock: Mocker) -> None:
-    response_data = ["1"]
-    requests_mock.get('https://api.binance.com/api/v3/klines', json=response_data)
+    requests_mock.get('https://api.binance.com/api/v3/klines', json=KLINES)
 
     result = load_data(TIME_FRAME, PAIR)
 
-    assert response_data == result
+    assert result == KLINES
 
 
 @pytest.mark.parametrize("status_code", [500, 501, 502, 503, 504])
@@ -6,7 +6,7 @@ from psycopg2.extras import DictCursor, DictRow
 from pytest_mock import MockerFixture
 from requests_mock import Mocker
 
-from application.main import main, SignalType
+from application.main import main, notifier, SignalType
 from application.settings import settings
 
 
@@ -30,6 +30,7 @@ def test_success(connection_db: connection, requests_mock: Mocker, mocker: Mocke
     m_send_message: MagicMock = mocker.patch("telebot.TeleBot.send_message")
 
     main(connection_db, "1d")
+    notifier.wait(timeout=5)
 
     assert m_send_message.call_count == 1
 
@@ -0,0 +1,84 @@
+import json
+import logging
+import urllib.request
+
+import pytest
+
+from application.metrics import JsonFormatter, Metrics, serve_metrics
+
+
+def test_render() -> None:
+    metrics = Metrics(buckets=(0.1, 1.0))
+    metrics.observe("binance_1h", "fetch", 0.05, pair="BTCUSDT")
+    metrics.observe("binance_1h", "fetch", 0.5, pair="BTCUSDT")
+    metrics.observe("binance_1h", "persist", 2.0, items=10, ok=False)
+
+    text = metrics.render()
+
+    assert 'crypto_stage_seconds_bucket{job="binance_1h",stage="fetch",pair="BTCUSDT",le="0.1"} 1' in text
+    assert 'crypto_stage_seconds_bucket{job="binance_1h",stage="fetch",pair="BTCUSDT",le="1.0"} 2' in text
+    assert 'crypto_stage_seconds_bucket{job="binance_1h",stage="fetch",pair="BTCUSDT",le="+Inf"} 2' in text
+    assert 'crypto_stage_seconds_count{job="binance_1h",stage="persist"} 1' in text
+    assert 'crypto_stage_recent_seconds{job="binance_1h",stage="fetch",pair="BTCUSDT",quantile="0.95"} 0.5' in text
+    assert 'crypto_stage_items_total{job="binance_1h",stage="persist"} 10' in text
+    assert 'crypto_stage_errors_total{job="binance_1h",stage="persist"} 1' in text
+    assert 'crypto_stage_errors_total{job="binance_1h",stage="fetch",pair="BTCUSDT"} 0' in text
+
+
+def test_stage_counts_errors() -> None:
+    metrics = Metrics()
+
+    with pytest.raises(ValueError):
+        with metrics.stage("depth", "parse", "BTCUSDT"):
+            raise ValueError
+    assert metrics.call("depth", "fetch", "BTCUSDT", lambda x: x * 2, 21) == 42
+
+    assert metrics.totals("depth")["parse"][::3] == (1, 1)
+    assert metrics.totals("depth")["fetch"][::3] == (1, 0)
+
+
+def test_run_logs_the_stages_of_the_run(caplog: pytest.LogCaptureFixture) -> None:
+    metrics = Metrics()
+    metrics.observe("depth", "fetch", 5.0, pair="BTCUSDT")
+
+    with caplog.at_level(logging.INFO, logger="metrics"):
+        with metrics.run("depth"):
+            metrics.observe("depth", "fetch", 0.25, pair="BTCUSDT")
+            metrics.observe("depth", "fetch", 0.25, pair="ETHUSDT", ok=False)
+
+    record = caplog.records[-1]
+    assert record.job == "depth"
+    assert record.stages == {"fetch": {"count": 2, "seconds": 0.5, "items": 2, "errors": 1}}
+    assert "fetch 2x 0.50s (1 errors)" in record.getMessage()
+
+
+def test_label_escaping() -> None:
+    metrics = Metrics()
+    metrics.observe('a"b', "fetch", 0.1, pair="x\\y")
+
+    assert '{job="a\\"b",stage="fetch",pair="x\\\\y"}' in metrics.render()
+
+
+def test_serve_metrics() -> None:
+    metrics = Metrics()
+    metrics.observe("agg_trade", "fetch", 0.1, pair="BTCUSDT")
+    server = serve_metrics(metrics, "127.0.0.1", 0)
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics", timeout=5) as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+
+    assert body == metrics.render()
+
+
+def test_json_formatter() -> None:
+    record = logging.LogRecord("crypto", logging.WARNING, __file__, 1, "took %ss", (3,), None)
+    record.job = "binance_1h"
+
+    entry = json.loads(JsonFormatter().format(record))
+
+    assert entry["message"] == "took 3s"
+    assert entry["level"] == "WARNING"
+    assert entry["logger"] == "crypto"
+    assert entry["job"] == "binance_1h"
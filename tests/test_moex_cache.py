@@ -0,0 +1,71 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+from requests_mock import Mocker
+
+from application import parse_n_send
+from application.moex_cache import MoexCandleCache
+from application.parse_n_send import load_data_moex
+
+URL = "https://iss.moex.com/iss/engines/stock/markets/shares/boards/TQBR/securities/SBER/candles.json"
+START = datetime(2024, 1, 1)
+
+
+def candle(hour: int, close: float = 2.0) -> dict:
+    begin = START + timedelta(hours=hour)
+    return {"open": 1.0, "close": close, "high": 3.0, "low": 0.5, "value": 1500.5, "volume": 10,
+            "begin": f"{begin:%Y-%m-%d %H:%M:%S}", "end": f"{begin + timedelta(minutes=59, seconds=59):%Y-%m-%d %H:%M:%S}"}
+
+
+def test_round_trip(tmp_path) -> None:
+    cache = MoexCandleCache(str(tmp_path))
+    cache.merge("SBER", 60, [candle(0), candle(1)], START)
+
+    window = cache.window("SBER", 60, START)
+
+    assert [row["begin"] for row in window] == [pd.Timestamp("2024-01-01 00:00"), pd.Timestamp("2024-01-01 01:00")]
+    assert window[1]["end"] == pd.Timestamp("2024-01-01 01:59:59")
+    assert window[0]["value"] == 1500.5
+    assert cache.last_begin("SBER", 60) == datetime(2024, 1, 1, 1)
+
+    stored = np.load(tmp_path / "SBER_60.npy", mmap_mode="r")
+    assert isinstance(stored, np.memmap) and stored.flags.f_contiguous
+
+
+def test_merge_replaces_unfinished_and_trims(tmp_path) -> None:
+    cache = MoexCandleCache(str(tmp_path))
+    cache.merge("SBER", 60, [candle(0), candle(1), candle(2, close=2.5)], START)
+
+    cache.merge("SBER", 60, [candle(2, close=4.0), candle(3)], START + timedelta(hours=1))
+
+    window = cache.window("SBER", 60, START)
+    assert [row["begin"].hour for row in window] == [1, 2, 3]
+    assert window[1]["close"] == 4.0
+    assert [row["begin"].hour for row in cache.window("SBER", 60, START + timedelta(hours=3))] == [3]
+
+
+def test_empty(tmp_path) -> None:
+    cache = MoexCandleCache(str(tmp_path))
+
+    assert cache.window("SBER", 24, START) == []
+    assert cache.last_begin("SBER", 24) is None
+
+
+def test_load_data_moex_downloads_the_tail(tmp_path, requests_mock: Mocker, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parse_n_send, "moex_cache", MoexCandleCache(str(tmp_path)))
+    now = datetime.today().replace(minute=0, second=0, microsecond=0)
+    first = [dict(candle(0), begin=f"{now - timedelta(hours=hours):%Y-%m-%d %H:%M:%S}") for hours in (2, 1)]
+    update = [dict(candle(0), begin=f"{now - timedelta(hours=hours):%Y-%m-%d %H:%M:%S}", close=close)
+              for hours, close in ((1, 5.0), (0, 6.0))]
+    requests_mock.get(URL, [
+        {"json": [{}, {"candles": first}]}, {"json": [{}, {"candles": []}]},
+        {"json": [{}, {"candles": update}]}, {"json": [{}, {"candles": []}]},
+    ])
+
+    assert len(load_data_moex("SBER", 60)) == 2
+    data = load_data_moex("SBER", 60)
+
+    assert requests_mock.request_history[2].qs["from"] == [f"{now - timedelta(hours=1):%Y-%m-%d %H:%M:%S}"]
+    assert [row["close"] for row in data] == [2.0, 5.0, 6.0]
@@ -0,0 +1,59 @@
+import pytest
+import requests
+from requests_mock import Mocker
+
+from application import parse_n_send
+from application.parse_n_send import FetchTimings, load_data_moex
+
+URL = "https://iss.moex.com/iss/engines/stock/markets/shares/boards/TQBR/securities/SBER/candles.json"
+CANDLE = {"open": 1, "close": 2, "high": 3, "low": 0.5, "value": 100, "volume": 10, "begin": "2024-01-02 10:00:00",
+          "end": "2024-01-02 10:59:59"}
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(parse_n_send.settings, "moex_backoff", 0.0)
+    monkeypatch.setattr(parse_n_send.settings, "moex_retries", 2)
+
+
+def test_success(requests_mock: Mocker) -> None:
+    requests_mock.get(URL, [{"json": [{}, {"candles": [CANDLE]}]}, {"json": [{}, {"candles": []}]}])
+    attempts = []
+
+    assert load_data_moex("SBER", 60, attempts) == [CANDLE]
+    assert attempts == [0]
+
+
+def test_retries(requests_mock: Mocker) -> None:
+    requests_mock.get(URL, [
+        {"exc": requests.ConnectTimeout},
+        {"status_code": 502},
+        {"json": [{}, {"candles": [CANDLE]}]},
+        {"json": [{}, {"candles": []}]},
+    ])
+    attempts = []
+
+    assert load_data_moex("SBER", 60, attempts) == [CANDLE]
+    assert attempts == [0, 1, 2]
+
+
+def test_gives_up(requests_mock: Mocker) -> None:
+    requests_mock.get(URL, exc=requests.ReadTimeout)
+
+    with pytest.raises(requests.ReadTimeout):
+        load_data_moex("SBER", 60)
+
+    assert requests_mock.call_count == 3
+
+
+def test_timings_summary() -> None:
+    timings = FetchTimings()
+    timings.record("SBER", 0.5, 1, True)
+    timings.record("GAZP", 2.0, 3, False)
+
+    summary = timings.summary(2.5)
+
+    assert summary.startswith("1/2 securities in 2.5s")
+    assert "slowest GAZP 2.00s" in summary
+    assert "2 retries" in summary
+    assert "['GAZP']" in summary
@@ -0,0 +1,68 @@
+from mock.mock import MagicMock
+from pytest_mock import MockerFixture
+from telebot.apihelper import ApiTelegramException
+
+from application.notifier import MAX_MESSAGE_LENGTH, TelegramNotifier
+
+
+def test_batch_is_one_message_per_chat(mocker: MockerFixture) -> None:
+    m_send_message: MagicMock = mocker.patch("telebot.TeleBot.send_message")
+    notifier = TelegramNotifier("123:token", [1, 2], chat_interval=0.0)
+
+    with notifier.batch() as messages:
+        messages.add("first")
+        messages.add("second")
+        assert m_send_message.call_count == 0
+
+    assert notifier.wait(timeout=5)
+    assert sorted(call.kwargs["chat_id"] for call in m_send_message.call_args_list) == [1, 2]
+    assert m_send_message.call_args_list[0].kwargs["text"] == "first\n\nsecond"
+
+
+def test_batch_splits_long_messages(mocker: MockerFixture) -> None:
+    m_send_message: MagicMock = mocker.patch("telebot.TeleBot.send_message")
+    notifier = TelegramNotifier("123:token", [1], chat_interval=0.0)
+
+    with notifier.batch() as messages:
+        for _ in range(3):
+            messages.add("x" * (MAX_MESSAGE_LENGTH // 3))
+
+    assert notifier.wait(timeout=5)
+    assert m_send_message.call_count == 2
+    assert all(len(call.kwargs["text"]) <= MAX_MESSAGE_LENGTH for call in m_send_message.call_args_list)
+
+
+def test_retry_after_rate_limit(mocker: MockerFixture) -> None:
+    error = ApiTelegramException(
+        "sendMessage", None, {"error_code": 429, "description": "Too Many Requests",
+                              "parameters": {"retry_after": 0.01}}
+    )
+    m_send_message: MagicMock = mocker.patch("telebot.TeleBot.send_message", side_effect=[error, None])
+    notifier = TelegramNotifier("123:token", [1], chat_interval=0.0)
+
+    notifier.send("text")
+
+    assert notifier.wait(timeout=5)
+    assert m_send_message.call_count == 2
+
+
+def test_gives_up_after_retries(mocker: MockerFixture) -> None:
+    m_send_message: MagicMock = mocker.patch("telebot.TeleBot.send_message", side_effect=ConnectionError)
+    notifier = TelegramNotifier("123:token", [1], chat_interval=0.0, retries=2, backoff=0.001)
+
+    notifier.send("text")
+
+    assert notifier.wait(timeout=5)
+    assert m_send_message.call_count == 3
+
+
+def test_on_timing(mocker: MockerFixture) -> None:
+    mocker.patch("telebot.TeleBot.send_message", side_effect=[ConnectionError, None])
+    timings = []
+    notifier = TelegramNotifier("123:token", [1], chat_interval=0.0, backoff=0.001,
+                                on_timing=lambda *timing: timings.append(timing))
+
+    notifier.send("text")
+
+    assert notifier.wait(timeout=5)
+    assert [(items, ok) for _, items, ok in timings] == [(1, False), (1, True)]
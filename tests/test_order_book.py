@@ -0,0 +1,109 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+
+from application.order_book import DepthBooks, OrderBook, OrderBookGap
+
+FIXTURE = Path(__file__).parent / "data" / "depth_diff.json"
+
+
+@pytest.fixture
+def recorded() -> dict:
+    return json.loads(FIXTURE.read_text())
+
+
+def _events(recorded: dict) -> list[dict]:
+    return [json.loads(message)["data"] for message in recorded["messages"]]
+
+
+def test_replay(recorded: dict) -> None:
+    book = OrderBook("BTCUSDT")
+    book.load_snapshot(recorded["snapshot"])
+
+    applied = [book.apply(event) for event in _events(recorded)]
+
+    assert applied == [False, True, True, True, True]
+    assert book.last_update_id == 1011
+    assert book.snapshot() == {
+        "lastUpdateId": 1011,
+        "bids": [[42000.1, 1.25], [41999.9, 0.6], [41999.5, 2.0]],
+        "asks": [[42000.25, 0.8], [42000.3, 1.3], [42001.0, 2.5], [42002.0, 5.0]],
+    }
+    assert book.snapshot(limit=1)["asks"] == [[42000.25, 0.8]]
+
+
+def test_max_levels(recorded: dict) -> None:
+    book = OrderBook("BTCUSDT", max_levels=2)
+    book.load_snapshot(recorded["snapshot"])
+    assert book.snapshot()["bids"] == [[42000.1, 1.5], [42000.0, 0.75]]
+
+    for event in _events(recorded):
+        book.apply(event)
+
+    # 41999.9 was pruned when it was the third bid, 42002.0 never got into the best two asks
+    assert book.snapshot() == {
+        "lastUpdateId": 1011,
+        "bids": [[42000.1, 1.25]],
+        "asks": [[42000.25, 0.8], [42000.3, 1.3]],
+    }
+
+
+def test_gap_unsyncs_the_book(recorded: dict) -> None:
+    book = OrderBook("BTCUSDT")
+    book.load_snapshot(recorded["snapshot"])
+    events = _events(recorded)
+    book.apply(events[1])
+
+    with pytest.raises(OrderBookGap):
+        book.apply(events[3])
+
+    assert not book.synced
+
+
+def test_depth_books_resync(recorded: dict) -> None:
+    snapshots = []
+
+    def load_snapshot(symbol: str) -> dict:
+        snapshots.append(symbol)
+        return recorded["snapshot"]
+
+    books = DepthBooks(["BTCUSDT"], load_snapshot, snapshot_interval=0.0)
+    assert books.book("BTCUSDT") is None
+
+    events = _events(recorded)
+    for event in events[:3]:
+        books.on_event(event)
+    books.wait()
+    assert snapshots == ["BTCUSDT"]
+    assert books.book("BTCUSDT")["lastUpdateId"] == 1006
+
+    # 1007 is lost, the book is reloaded and the snapshot is older than the stream
+    books.on_event(events[4])
+    books.wait()
+    assert books.resyncs["BTCUSDT"] == 1
+    assert snapshots == ["BTCUSDT", "BTCUSDT"]
+    assert books.book("BTCUSDT") is None
+
+
+def test_depth_books_buffer_while_loading(recorded: dict) -> None:
+    release = threading.Event()
+
+    def load_snapshot(symbol: str) -> dict:
+        release.wait(5)
+        return recorded["snapshot"]
+
+    books = DepthBooks(["BTCUSDT"], load_snapshot, snapshot_interval=0.0)
+    events = _events(recorded)
+    # The stream isn't held up by the snapshot request
+    for event in events:
+        books.on_event(event)
+    assert len(books.buffers["BTCUSDT"]) == 5
+    assert books.book("BTCUSDT") is None
+
+    release.set()
+    books.wait()
+
+    assert books.book("BTCUSDT")["lastUpdateId"] == 1011
+    assert not books.buffers["BTCUSDT"]
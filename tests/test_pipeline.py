@@ -0,0 +1,87 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from application.pipeline import Pipeline, Stage
+
+
+def test_items_pass_every_stage() -> None:
+    pipeline = Pipeline("test", [
+        Stage("fetch", lambda key, _: key * 10, workers=4),
+        Stage("parse", lambda key, value: value + 1, workers=2),
+    ])
+
+    assert pipeline.run(range(20)) == {key: key * 10 + 1 for key in range(20)}
+
+
+def test_values_and_none_ends_the_item() -> None:
+    saved = []
+    pipeline = Pipeline("test", [
+        Stage("parse", lambda key, value: value if value % 2 else None, workers=2),
+        Stage("persist", lambda key, value: saved.append(key)),
+    ])
+
+    assert pipeline.run({"a": 1, "b": 2, "c": 3}, {"a": 1, "b": 2, "c": 3}) == {}
+    assert sorted(saved) == ["a", "c"]
+
+
+def test_error_only_drops_its_item() -> None:
+    errors = []
+
+    def parse(key: int, _) -> int:
+        if key == 3:
+            raise ValueError(key)
+        return key
+
+    pipeline = Pipeline("test", [
+        Stage("parse", parse, workers=2, on_error=lambda key, error: errors.append((key, type(error)))),
+        Stage("persist", lambda key, value: 1 / (value - 5)),
+    ])
+
+    assert set(pipeline.run(range(8))) == {0, 1, 2, 4, 6, 7}
+    assert errors == [(3, ValueError)]
+
+
+def test_stages_overlap() -> None:
+    pipeline = Pipeline("test", [
+        Stage("fetch", lambda key, _: time.sleep(0.05) or key, workers=4),
+        Stage("persist", lambda key, value: time.sleep(0.05) or value),
+    ])
+
+    started = time.monotonic()
+    pipeline.run(range(8))
+
+    # 8 x 0.05s of persisting behind the first fetches, not 2 x 8 x 0.05s one after another
+    assert time.monotonic() - started < 0.6
+
+
+def test_queue_bounds_the_stage_in_front() -> None:
+    fetched = []
+    release = threading.Event()
+    pipeline = Pipeline("test", [
+        Stage("fetch", lambda key, _: fetched.append(key) or key),
+        Stage("persist", lambda key, value: release.wait(5)),
+    ], queue_size=2)
+
+    thread = threading.Thread(target=pipeline.run, args=(range(10),))
+    thread.start()
+    time.sleep(0.2)
+    # One item in persist, two queued for it, one fetched and waiting to be queued
+    assert len(fetched) == 4
+    release.set()
+    thread.join(5)
+
+    assert len(fetched) == 10
+
+
+def test_timer() -> None:
+    timed = []
+
+    @contextmanager
+    def timer(stage: str, key: str):
+        yield
+        timed.append((stage, key))
+
+    Pipeline("test", [Stage("fetch", lambda key, _: key)], timer=timer).run(["BTCUSDT"])
+
+    assert timed == [("fetch", "BTCUSDT")]
@@ -0,0 +1,128 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from st.queries import SeriesCache, agg_series, bucket_seconds, depth_series, downsample, lttb, rollup_level
+
+
+def test_bucket_seconds() -> None:
+    end = datetime(2024, 1, 10, tzinfo=timezone.utc)
+    assert bucket_seconds(end - timedelta(hours=1), end, 2000) == 60
+    assert bucket_seconds(end - timedelta(days=10), end, 2000) == 120
+    assert bucket_seconds(end - timedelta(days=90), end, 1000) == 1980
+
+
+def test_rollup_level() -> None:
+    assert rollup_level(60, ["1m", "15m", "1h"]) == "1m"
+    assert rollup_level(1800, ["1m", "15m", "1h"]) == "15m"
+    assert rollup_level(7200, ["1m", "15m", "1h"]) == "1h"
+    assert rollup_level(1980, ["1m", "15m", "1h"]) == "1m"
+    assert rollup_level(120, ["15m", "1h"]) == "15m"
+
+
+def test_lttb_keeps_ends_and_peaks() -> None:
+    x = np.arange(1000, dtype=float)
+    y = np.zeros(1000)
+    y[[137, 512, 861]] = [5, -7, 3]
+
+    indices = lttb(x, y, 50)
+
+    assert len(indices) == 50
+    assert indices[0] == 0 and indices[-1] == 999
+    assert np.all(np.diff(indices) > 0)
+    assert {137, 512, 861} <= set(indices.tolist())
+
+
+def test_lttb_short_series() -> None:
+    assert lttb(np.arange(10), np.arange(10), 20).tolist() == list(range(10))
+
+
+def test_lttb_nan() -> None:
+    y = np.sin(np.linspace(0, 20, 500))
+    y[:60] = np.nan
+
+    indices = lttb(np.arange(500), y, 40)
+
+    assert len(np.unique(indices)) == 40
+
+
+def test_downsample() -> None:
+    df = pd.DataFrame({
+        "time": pd.date_range("2024-01-01", periods=10_000, freq="min", tz="UTC"),
+        "Buy": np.random.default_rng(0).normal(size=10_000),
+        "Sell": np.random.default_rng(1).normal(size=10_000),
+    })
+
+    result = downsample(df, ["Buy", "Sell"], 500)
+
+    assert 250 <= len(result) <= 500
+    assert result["time"].is_monotonic_increasing
+    assert len(downsample(df.head(100), ["Buy", "Sell"], 500)) == 100
+
+
+class QueryCursor:
+    def execute(self, query: str, params: dict) -> None:
+        self.query, self.params = query, params
+
+    def fetchall(self) -> list:
+        return []
+
+
+def test_series_windows() -> None:
+    end = datetime(2024, 1, 10, tzinfo=timezone.utc)
+    depth, agg = QueryCursor(), QueryCursor()
+
+    depth_series(depth, "BTCUSDT", end - timedelta(days=1), end, 90)
+    agg_series(agg, "BTCUSDT", end - timedelta(days=1), end, 90)
+
+    # Both windows cover an hour of buckets, the flows are per minute of the buckets they hold
+    bound = "greatest(%(window)s - %(step)s, 0)) PRECEDING"
+    assert bound in depth.query and bound in agg.query
+    assert "sum(buy) OVER w / (count(*) OVER w * %(step)s / 60.0)" in agg.query
+    assert agg.params == depth.params == dict(pair="BTCUSDT", start=end - timedelta(days=1), end=end, step=90,
+                                              window=3600.0)
+
+
+class LastIdCursor:
+    def __init__(self) -> None:
+        self.last_id = None
+
+    def execute(self, query: str, params: tuple) -> None:
+        self.params = params
+
+    def fetchone(self) -> tuple:
+        return (self.last_id,)
+
+
+def test_series_cache_reloads_only_the_tail() -> None:
+    calls = []
+    step = 60 * 60
+
+    def load(cursor, pair, start, end, load_step):
+        calls.append(start)
+        times = pd.date_range(start, end, freq=f"{load_step}s", inclusive="left")
+        return pd.DataFrame({"time": times, "value": [float(len(calls))] * len(times)})
+
+    cache = SeriesCache("agg_trade", load, lambda df: df)
+    cursor = LastIdCursor()
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = start + timedelta(days=1)
+
+    cursor.last_id = 10
+    df = cache.get(cursor, "BTCUSDT", start, end, points=6)
+    assert len(df) == 24 and calls == [start]
+
+    cursor.last_id = None
+    assert len(cache.get(cursor, "BTCUSDT", start, end, points=6)) == 24
+    assert len(calls) == 1
+    assert cursor.params["last_id"] == 10
+
+    cursor.last_id = 12
+    later = timedelta(hours=2)
+    df = cache.get(cursor, "BTCUSDT", start + later, end + later, points=6)
+    assert calls[-1] == start + timedelta(hours=23)
+    assert df["time"].iloc[0] == start + later
+    assert df["time"].is_unique and len(df) == 24
+    assert df["value"].tolist() == [1.0] * 21 + [2.0] * 3
+    assert bucket_seconds(start, end, 6) == step
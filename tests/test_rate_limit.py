@@ -0,0 +1,121 @@
+import threading
+import time
+
+import pytest
+from binance.error import ClientError, ServerError
+
+from application.rate_limit import Priority, WeightBucket, WeightScheduler, depth_weight, retry_after
+
+
+def test_acquire_without_waiting() -> None:
+    bucket = WeightBucket(limit=100, period=60)
+
+    waited = bucket.acquire(40)
+
+    assert waited < 0.1
+    assert 59 < bucket.available <= 61
+
+
+def test_acquire_waits_for_refill() -> None:
+    bucket = WeightBucket(limit=100, period=1)
+    bucket.acquire(100)
+
+    started = time.monotonic()
+    bucket.acquire(20)
+
+    assert time.monotonic() - started >= 0.15
+
+
+def test_observe_used_weight() -> None:
+    bucket = WeightBucket(limit=6000, period=60, reserve=1000)
+
+    bucket.observe({"x-mbx-used-weight": "4800", "x-mbx-used-weight-1m": "4800"})
+
+    assert bucket.available < 250
+
+
+def test_observe_empty_usage() -> None:
+    bucket = WeightBucket(limit=6000, period=60)
+
+    bucket.observe({})
+
+    assert bucket.available > 5999
+
+
+def test_burst_spreads_requests() -> None:
+    scheduler = WeightScheduler(limit=600, period=1, burst=100)
+
+    assert scheduler.acquire(100) < 0.05
+    # The rest of the budget comes at 600 weight per second
+    assert 0.1 <= scheduler.acquire(100) < 0.3
+
+
+def test_headroom_is_left_to_higher_priorities() -> None:
+    scheduler = WeightScheduler(limit=1000, period=60, headroom=(0, 0, 500))
+    scheduler.observe({"x-mbx-used-weight-1m": "600"})
+
+    scheduler.acquire(300, Priority.HIGH)
+    waiting = threading.Thread(target=scheduler.acquire, args=(10, Priority.LOW), daemon=True)
+    waiting.start()
+    waiting.join(0.2)
+
+    assert waiting.is_alive()
+
+
+def test_waiters_are_served_by_priority() -> None:
+    scheduler = WeightScheduler(limit=100, period=0.5)
+    scheduler.acquire(100)
+    served = []
+
+    def acquire(priority: Priority) -> None:
+        scheduler.acquire(50, priority)
+        served.append(priority)
+
+    threads = [threading.Thread(target=acquire, args=(priority,))
+               for priority in (Priority.LOW, Priority.NORMAL, Priority.HIGH)]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)
+    for thread in threads:
+        thread.join(5)
+
+    assert served == [Priority.HIGH, Priority.NORMAL, Priority.LOW]
+
+
+def test_request_pauses_on_retry_after() -> None:
+    scheduler = WeightScheduler(limit=6000, period=60)
+    responses = [ClientError(429, -1003, "Too many requests", {"Retry-After": "0.2"}),
+                 {"limit_usage": {"x-mbx-used-weight-1m": "5990"}, "data": [1]}]
+
+    started = time.monotonic()
+    response = scheduler.request(2, Priority.HIGH, lambda: _respond(responses))
+
+    assert response["data"] == [1]
+    assert time.monotonic() - started >= 0.2
+    assert scheduler.available < 20
+
+
+def test_request_gives_up_after_retries() -> None:
+    scheduler = WeightScheduler(limit=6000, period=0.01, retries=1, backoff=0.01)
+    error = ClientError(418, -1003, "Banned", {})
+
+    with pytest.raises(ClientError):
+        scheduler.request(2, Priority.HIGH, lambda: _respond([error, error]))
+
+
+def test_retry_after() -> None:
+    assert retry_after(ClientError(429, -1003, "", {"Retry-After": "7"})) == 7
+    assert retry_after(ClientError(418, -1003, "", {})) == 0
+    assert retry_after(ClientError(400, -1100, "", {"Retry-After": "7"})) is None
+    assert retry_after(ServerError(503, "")) is None
+
+
+def test_depth_weight() -> None:
+    assert [depth_weight(limit) for limit in (100, 500, 1000, 5000)] == [5, 25, 50, 250]
+
+
+def _respond(responses: list):
+    response = responses.pop(0)
+    if isinstance(response, Exception):
+        raise response
+    return response
@@ -0,0 +1,76 @@
+from datetime import datetime, timezone
+
+import pytest
+from psycopg2._psycopg import connection, cursor as cursor_type
+
+from agg_trade.rollups import Rollups
+from application.db_writer import BatchWriter
+
+COLUMNS = ("time", "pair", "buy_sum", "sell_sum", "buy_recent_count", "sell_recent_count")
+
+
+def _row(minute: int, second: int, buy: float, sell: float, pair: str = "BTCUSDT") -> tuple:
+    return datetime(2024, 1, 1, 10, minute, second, tzinfo=timezone.utc), pair, buy, sell, 1, 2
+
+
+@pytest.fixture
+def agg_trade(connection_db: connection):
+    with connection_db.cursor() as cursor:  # type: cursor_type
+        cursor.execute("DROP TABLE IF EXISTS agg_trade, agg_trade_1m, agg_trade_15m, agg_trade_1h")
+        cursor.execute("""
+            CREATE TABLE agg_trade (
+                id BIGINT GENERATED BY DEFAULT AS IDENTITY PRIMARY KEY, time TIMESTAMPTZ NOT NULL,
+                pair VARCHAR(16) NOT NULL, buy_sum FLOAT, sell_sum FLOAT, buy_recent_qty FLOAT,
+                sell_recent_qty FLOAT, buy_recent_count INTEGER, sell_recent_count INTEGER
+            )""")
+    connection_db.commit()
+
+    yield connection_db
+
+    with connection_db.cursor() as cursor:  # type: cursor_type
+        cursor.execute("DROP TABLE IF EXISTS agg_trade, agg_trade_1m, agg_trade_15m, agg_trade_1h")
+    connection_db.commit()
+
+
+def _buckets(db_connection: connection, table: str) -> list[tuple]:
+    with db_connection.cursor() as cursor:  # type: cursor_type
+        cursor.execute(f"SELECT pair, extract(minute FROM time)::int, rows, buy_sum, sell_sum, buy_recent_count, "
+                       f"last_id FROM {table} ORDER BY pair, time")
+        return cursor.fetchall()
+
+
+def test_rollups_follow_the_writer(agg_trade: connection) -> None:
+    rollups = Rollups(COLUMNS)
+    rollups.create_tables(agg_trade)
+
+    with BatchWriter(agg_trade, "agg_trade", COLUMNS, flush_size=3, on_flush=rollups.apply) as writer:
+        writer.add(_row(0, 0, 1, 2))
+        writer.add(_row(0, 15, 3, 4))
+        writer.add(_row(1, 0, 5, 6))
+        writer.add(_row(16, 0, 7, 8))
+        writer.add(_row(0, 30, 1, 1, pair="ETHUSDT"))
+
+    assert _buckets(agg_trade, "agg_trade_1m") == [
+        ("BTCUSDT", 0, 2, 4.0, 6.0, 2, 2), ("BTCUSDT", 1, 1, 5.0, 6.0, 1, 3), ("BTCUSDT", 16, 1, 7.0, 8.0, 1, 4),
+        ("ETHUSDT", 0, 1, 1.0, 1.0, 1, 5),
+    ]
+    assert _buckets(agg_trade, "agg_trade_15m") == [
+        ("BTCUSDT", 0, 3, 9.0, 12.0, 3, 3), ("BTCUSDT", 15, 1, 7.0, 8.0, 1, 4), ("ETHUSDT", 0, 1, 1.0, 1.0, 1, 5),
+    ]
+    assert _buckets(agg_trade, "agg_trade_1h") == [("BTCUSDT", 0, 4, 16.0, 20.0, 4, 4),
+                                                   ("ETHUSDT", 0, 1, 1.0, 1.0, 1, 5)]
+
+
+def test_new_rollup_is_filled_from_agg_trade(agg_trade: connection) -> None:
+    with BatchWriter(agg_trade, "agg_trade", COLUMNS) as writer:
+        writer.add(_row(0, 0, 1, 2))
+        writer.add(_row(0, 45, 3, 4))
+
+    Rollups(COLUMNS, ["15m"]).create_tables(agg_trade)
+
+    assert _buckets(agg_trade, "agg_trade_15m") == [("BTCUSDT", 0, 2, 4.0, 6.0, 2, 2)]
+
+
+def test_unknown_level() -> None:
+    with pytest.raises(ValueError):
+        Rollups(COLUMNS, ["5m"])
@@ -0,0 +1,66 @@
+from datetime import date, datetime, timezone
+
+import pandas as pd
+from psycopg2._psycopg import connection, cursor as cursor_type
+
+from application.main import signal_time
+from application.schema import add_months, ensure_partitions, migrate_table, month_starts
+
+
+def test_month_starts() -> None:
+    assert month_starts(date(2023, 11, 15), date(2024, 1, 1)) == [
+        date(2023, 11, 1), date(2023, 12, 1), date(2024, 1, 1), date(2024, 2, 1)
+    ]
+    assert month_starts(date(2024, 3, 31), date(2024, 3, 1)) == [date(2024, 3, 1), date(2024, 4, 1)]
+
+
+def test_add_months() -> None:
+    assert add_months(date(2024, 12, 31), 1) == date(2025, 1, 1)
+    assert add_months(date(2024, 1, 15), -1) == date(2023, 12, 1)
+    assert add_months(date(2024, 5, 2), 0) == date(2024, 5, 1)
+
+
+def test_signal_time() -> None:
+    assert signal_time("2024-01-02 03:00:00") == datetime(2024, 1, 2, 3, tzinfo=timezone.utc)
+    assert signal_time(pd.Timestamp("2024-01-02 03:00:00"), exchange="MOEX") == datetime(2024, 1, 2, 0,
+                                                                                         tzinfo=timezone.utc)
+    assert signal_time(datetime(2024, 1, 2, 3, tzinfo=timezone.utc), exchange="MOEX").hour == 3
+
+
+def test_migrate_table(connection_db: connection) -> None:
+    with connection_db.cursor() as cursor:  # type: cursor_type
+        cursor.execute("DROP TABLE IF EXISTS agg_trade, agg_trade_legacy")
+        cursor.execute("""
+            CREATE TABLE agg_trade (
+                id SERIAL PRIMARY KEY, time VARCHAR(32), pair VARCHAR(16), buy_sum FLOAT, sell_sum FLOAT
+            )""")
+        cursor.execute("""
+            INSERT INTO agg_trade (time, pair, buy_sum, sell_sum) VALUES
+            ('2023-11-09 10:00:00', 'BTCUSDT', 1.5, 2.5),
+            ('2024-01-02 00:00:15', 'ETHUSDT', 3, 4),
+            (NULL, 'BTCUSDT', 5, 6)""")
+        connection_db.commit()
+
+    try:
+        assert migrate_table(connection_db, "agg_trade", chunk_size=1) == 2
+        assert migrate_table(connection_db, "agg_trade") == 0
+        ensure_partitions(connection_db, tables=["agg_trade"])
+
+        with connection_db.cursor() as cursor:  # type: cursor_type
+            cursor.execute("SELECT relkind FROM pg_class WHERE relname = 'agg_trade'")
+            assert cursor.fetchone()[0] == "p"
+            cursor.execute("SELECT tableoid::regclass::text, time, pair FROM agg_trade ORDER BY id")
+            assert cursor.fetchall() == [
+                ("agg_trade_2023_11", datetime(2023, 11, 9, 10, tzinfo=timezone.utc), "BTCUSDT"),
+                ("agg_trade_2024_01", datetime(2024, 1, 2, 0, 0, 15, tzinfo=timezone.utc), "ETHUSDT"),
+            ]
+
+            cursor.execute("INSERT INTO agg_trade (time, pair) VALUES (now(), 'BTCUSDT') RETURNING id")
+            assert cursor.fetchone()[0] == 4
+            cursor.execute("SELECT count(*) FROM agg_trade_legacy")
+            assert cursor.fetchone()[0] == 3
+        connection_db.rollback()
+    finally:
+        with connection_db.cursor() as cursor:  # type: cursor_type
+            cursor.execute("DROP TABLE IF EXISTS agg_trade, agg_trade_legacy")
+        connection_db.commit()
@@ -0,0 +1,41 @@
+from agg_trade.trade_cursor import AggTradeCursor
+
+
+class Exchange:
+    """aggTrades endpoint over trades with ids 0..count - 1, one per second."""
+
+    def __init__(self, count: int) -> None:
+        self.count = count
+        self.requests = []
+
+    def load_page(self, pair: str, from_id: int | None, limit: int) -> list:
+        self.requests.append(from_id)
+        ids = range(max(self.count - limit, 0), self.count) if from_id is None else \
+            range(from_id, min(from_id + limit, self.count))
+        return [{"a": i, "q": "1", "f": i, "l": i, "T": i * 1000, "m": i % 2 == 0} for i in ids]
+
+
+def test_every_trade_once() -> None:
+    exchange = Exchange(100)
+    cursor = AggTradeCursor(exchange.load_page, limit=10)
+
+    first = cursor.fetch("BTCUSDT", since=95_000)
+    exchange.count = 135
+    second = cursor.fetch("BTCUSDT", since=0)
+    third = cursor.fetch("BTCUSDT", since=0)
+
+    assert [trade["a"] for trade in first] == list(range(95, 100))
+    assert [trade["a"] for trade in second] == list(range(100, 135))
+    assert third == []
+    assert exchange.requests == [None, 100, 110, 120, 130, 135]
+
+
+def test_max_pages() -> None:
+    exchange = Exchange(10)
+    cursor = AggTradeCursor(exchange.load_page, limit=10, max_pages=2)
+    cursor.fetch("BTCUSDT", since=0)
+    exchange.count = 100
+
+    assert len(cursor.fetch("BTCUSDT", since=0)) == 20
+    assert len(cursor.fetch("BTCUSDT", since=0)) == 20
+    assert cursor.from_ids["BTCUSDT"] == 50
@@ -0,0 +1,33 @@
+import pytest
+
+from agg_trade.trade_stats import side_totals
+from agg_trades import agg_trade, groupby_totals, random_trades
+
+
+def test_empty() -> None:
+    assert side_totals([]) == (0.0, 0.0, 0, 0)
+
+
+def test_buys_only() -> None:
+    trades = [agg_trade("0.5", 10, 12, False), agg_trade("1.25", 13, 13, False)]
+
+    assert side_totals(trades) == (1.75, 0.0, 4, 0)
+
+
+def test_sells_only() -> None:
+    trades = [agg_trade("0.5", 10, 10, True), agg_trade("2", 11, 15, True)]
+
+    assert side_totals(trades) == (0.0, 2.5, 0, 6)
+
+
+@pytest.mark.parametrize("size", [1, 10, 1_000])
+def test_same_as_groupby(size: int) -> None:
+    trades = random_trades(size, seed=size)
+
+    buy_qty, sell_qty, buy_count, sell_count = side_totals(trades)
+    expected = groupby_totals(trades)
+
+    assert (buy_qty, sell_qty) == pytest.approx(expected[:2])
+    # Counts are l - f + 1 trades per aggregate, not the number of aggregates
+    assert (buy_count, sell_count) == expected[2:]
+    assert buy_count + sell_count == sum(trade["l"] - trade["f"] + 1 for trade in trades)
@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+from scipy import stats
+
+from application.vsa import range_deviation, rolling_linregress
+
+LOOKBACK = 14
+
+
+def _linregress_loop(norm_volume: np.ndarray, norm_range: np.ndarray) -> np.ndarray:
+    range_dev = np.full(len(norm_volume), np.nan)
+    for i in range(LOOKBACK * 2, len(norm_volume)):
+        window = slice(i - LOOKBACK + 1, i + 1)
+        slope, intercept, r_val, _, _ = stats.linregress(norm_volume[window], norm_range[window])
+        if slope <= 0.0 or r_val < 0.2:
+            range_dev[i] = 0.0
+            continue
+        range_dev[i] = norm_range[i] - (intercept + slope * norm_volume[i])
+
+    return range_dev
+
+
+@pytest.mark.parametrize("size", [10, 28, 29, 50, 300])
+def test_range_deviation_matches_linregress(size: int) -> None:
+    rng = np.random.default_rng(size)
+    norm_volume = rng.lognormal(0.0, 0.5, size)
+    norm_range = 0.6 * norm_volume + rng.normal(0.0, 0.4, size)
+    norm_volume[:LOOKBACK - 1] = np.nan
+    norm_range[:LOOKBACK] = np.nan
+
+    result = range_deviation(norm_volume, norm_range, LOOKBACK)
+
+    np.testing.assert_allclose(result, _linregress_loop(norm_volume, norm_range), rtol=1e-9, atol=1e-12)
+
+
+def test_rolling_linregress_matches_linregress() -> None:
+    rng = np.random.default_rng(0)
+    x = rng.random(40)
+    y = rng.random(40)
+
+    slope, intercept, r = rolling_linregress(x, y, LOOKBACK)
+
+    assert np.isnan(slope[:LOOKBACK - 1]).all()
+    expected = stats.linregress(x[-LOOKBACK:], y[-LOOKBACK:])
+    assert slope[-1] == pytest.approx(expected.slope)
+    assert intercept[-1] == pytest.approx(expected.intercept)
+    assert r[-1] == pytest.approx(expected.rvalue)
+
+
+def test_range_deviation_rows_are_independent() -> None:
+    rng = np.random.default_rng(1)
+    norm_volume = rng.random((3, 60))
+    norm_range = rng.random((3, 60))
+
+    result = range_deviation(norm_volume, norm_range, LOOKBACK)
+
+    for row in range(3):
+        np.testing.assert_allclose(result[row], range_deviation(norm_volume[row], norm_range[row], LOOKBACK))
+
+
+def test_range_deviation_constant_volume() -> None:
+    norm_range = np.random.default_rng(2).random(40)
+
+    result = range_deviation(np.ones(40), norm_range, LOOKBACK)
+
+    assert (result[LOOKBACK * 2:] == 0.0).all()